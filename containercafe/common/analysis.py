@@ -0,0 +1,275 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Judge sampled memory usage against a limit and tolerance for many
+        containers at once. Series are stacked into (containers x samples)
+        NumPy arrays, so peaks, sustained windows over a threshold,
+        time-to-OOM and tolerance violations are computed for the whole
+        fleet in a handful of array operations.
+
+    report = MemoryLimitCheck(limit_kb, tolerance_kb).run(
+        dict((name, sampler.series(name).memory) for name in names))
+
+"""
+
+import json
+
+import numpy
+
+
+class SeriesBatch(object):
+    """ Time series of several containers, padded to a common length.
+
+    times and values are (containers x samples) float arrays; padding and
+    unreadable samples are NaN in values, and padded times repeat the
+    series' last time (so a window can always be closed at it).
+    """
+
+    def __init__(self, names, times, values, lengths):
+        self.names = names
+        self.times = times
+        self.values = values
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def stack(cls, series):
+        """ Batch from {name: TimeSeries} (or (times, values) pairs) """
+        names = sorted(series)
+        columns = [cls._arrays(series[name]) for name in names]
+        lengths = numpy.array([len(values) for _, values in columns],
+                              dtype=numpy.intp)
+        width = max(lengths.max() if len(lengths) else 0, 1)
+
+        times = numpy.zeros((len(names), width))
+        values = numpy.full((len(names), width), numpy.nan)
+        for row, (row_times, row_values) in enumerate(columns):
+            count = len(row_values)
+            if count:
+                times[row, :count] = row_times
+                times[row, count:] = row_times[-1]
+                values[row, :count] = row_values
+        values[values < 0] = numpy.nan
+        return cls(names, times, values, lengths)
+
+    @classmethod
+    def _arrays(cls, series):
+        if isinstance(series, tuple):
+            times, values = series
+        else:
+            times, values = series.times, series.values
+        times = numpy.asarray(times, dtype=float)
+        values = numpy.asarray(values, dtype=float)
+        count = min(len(times), len(values))
+        return times[:count], values[:count]
+
+
+class LimitVerdict(object):
+    """ How one container's memory use compares to its limit """
+
+    def __init__(self, name, samples, peak, violations, over_seconds,
+                 windows, longest_window, time_to_oom, ok):
+        self.name = name
+        self.samples = samples
+        self.peak = peak
+        self.violations = violations
+        self.over_seconds = over_seconds
+        self.windows = windows
+        self.longest_window = longest_window
+        self.time_to_oom = time_to_oom
+        self.ok = ok
+
+    def __str__(self):
+        return str(self.to_dict)
+
+    @property
+    def to_dict(self):
+        return {"name": self.name,
+                "samples": self.samples,
+                "peak": self.peak,
+                "violations": self.violations,
+                "over_seconds": self.over_seconds,
+                "windows": self.windows,
+                "longest_window": self.longest_window,
+                "time_to_oom": self.time_to_oom,
+                "ok": self.ok}
+
+
+class LimitReport(object):
+    """ Verdicts of a MemoryLimitCheck, with fleet-wide statistics """
+
+    def __init__(self, verdicts, summary):
+        self.verdicts = verdicts
+        self.summary = summary
+
+    def __str__(self):
+        return json.dumps(self.to_dict, indent=2, sort_keys=True)
+
+    def __getitem__(self, name):
+        for verdict in self.verdicts:
+            if verdict.name == name:
+                return verdict
+        raise KeyError(name)
+
+    @property
+    def ok(self):
+        return all(verdict.ok for verdict in self.verdicts)
+
+    @property
+    def failed(self):
+        return [verdict for verdict in self.verdicts if not verdict.ok]
+
+    @property
+    def to_dict(self):
+        return {"summary": self.summary,
+                "verdicts": [verdict.to_dict for verdict in self.verdicts]}
+
+
+class MemoryLimitCheck(object):
+    """ Check memory series (bytes) against a limit and tolerance (KB).
+
+    violation:      a sample above limit + tolerance
+    window:         a run of samples above threshold (default: the limit)
+                    lasting at least sustain seconds
+    time_to_oom:    seconds until usage first reached limit - tolerance
+                    (the allocation is full: the OOM killer is next)
+
+    A container passes when it has no violations. Windows only fail it
+    when asked for, i.e. when threshold_kb or sustain is given: by default
+    going over the limit within the tolerance is fine.
+    """
+
+    KB = 1024
+
+    def __init__(self, limit_kb, tolerance_kb=0, threshold_kb=None,
+                 sustain=None):
+        self.limit = float(limit_kb) * self.KB
+        self.tolerance = float(tolerance_kb) * self.KB
+        self.threshold = (self.limit if threshold_kb is None
+                          else float(threshold_kb) * self.KB)
+        self.sustain = sustain or 0.0
+        self.judge_windows = threshold_kb is not None or sustain is not None
+
+    @classmethod
+    def from_config(cls, test_parameters, **kwargs):
+        """ Check for the configured virtualization memory limit """
+        return cls(limit_kb=test_parameters.virtualization_mem_limit_kb,
+                   tolerance_kb=(
+                       test_parameters.virtualization_mem_tolerance_kb),
+                   **kwargs)
+
+    def run(self, series):
+        """ LimitReport for {name: TimeSeries} (or a SeriesBatch) """
+        batch = (series if isinstance(series, SeriesBatch)
+                 else SeriesBatch.stack(series))
+        if not len(batch):
+            return LimitReport([], self._summary(batch, dict()))
+
+        values, times = batch.values, batch.times
+        valid = ~numpy.isnan(values)
+        with numpy.errstate(invalid='ignore'):
+            peak = numpy.where(valid, values, -numpy.inf).max(axis=1)
+            violating = values > self.limit + self.tolerance
+            over = values > self.threshold
+            full = values >= self.limit - self.tolerance
+
+        violations = violating.sum(axis=1)
+        starts, durations = self._windows(over, times)
+        sustained = durations >= self.sustain
+        rows = numpy.arange(len(batch))
+        windows = numpy.bincount(starts[0][sustained], minlength=len(batch))
+        longest = numpy.zeros(len(batch))
+        numpy.maximum.at(longest, starts[0], durations)
+        over_seconds = numpy.bincount(starts[0], weights=durations,
+                                      minlength=len(batch))
+
+        # First full sample (argmax finds the first True of each row)
+        oom_index = full.argmax(axis=1)
+        time_to_oom = numpy.where(
+            full.any(axis=1), times[rows, oom_index] - times[:, 0], numpy.nan)
+
+        ok = violations == 0
+        if self.judge_windows:
+            ok = ok & (windows == 0)
+        results = dict(peak=peak, violations=violations,
+                       over_seconds=over_seconds, windows=windows,
+                       longest=longest, time_to_oom=time_to_oom, ok=ok)
+        return LimitReport(self._verdicts(batch, results),
+                           self._summary(batch, results))
+
+    @classmethod
+    def _windows(cls, mask, times):
+        """ (rows, start columns) and durations of every run of True.
+
+        A run lasts from its first sample until the sample after it (or
+        the series' end), i.e. as long as usage was last seen above.
+        """
+        edges = numpy.diff(numpy.pad(
+            mask.astype(numpy.int8), ((0, 0), (1, 1)), 'constant'), axis=1)
+        starts = numpy.nonzero(edges == 1)
+        ends = numpy.nonzero(edges == -1)
+        last = times.shape[1] - 1
+        durations = (times[ends[0], numpy.minimum(ends[1], last)] -
+                     times[starts])
+        return starts, durations
+
+    def _verdicts(self, batch, results):
+        verdicts = list()
+        for row, name in enumerate(batch.names):
+            peak = results['peak'][row]
+            time_to_oom = results['time_to_oom'][row]
+            verdicts.append(LimitVerdict(
+                name=name, samples=int(batch.lengths[row]),
+                peak=None if numpy.isinf(peak) else float(peak),
+                violations=int(results['violations'][row]),
+                over_seconds=float(results['over_seconds'][row]),
+                windows=int(results['windows'][row]),
+                longest_window=float(results['longest'][row]),
+                time_to_oom=(None if numpy.isnan(time_to_oom)
+                             else float(time_to_oom)),
+                ok=bool(results['ok'][row])))
+        return verdicts
+
+    def _summary(self, batch, results):
+        summary = {"containers": len(batch),
+                   "samples": int(batch.lengths.sum()),
+                   "limit": self.limit,
+                   "tolerance": self.tolerance,
+                   "threshold": self.threshold,
+                   "passed": 0,
+                   "failed": 0}
+        if not results:
+            return summary
+
+        peaks = results['peak'][~numpy.isinf(results['peak'])]
+        oom = results['time_to_oom'][~numpy.isnan(results['time_to_oom'])]
+        summary.update({
+            "passed": int(results['ok'].sum()),
+            "failed": int((~results['ok']).sum()),
+            "violations": int(results['violations'].sum()),
+            "over_seconds": float(results['over_seconds'].sum()),
+            "reached_limit": int(len(oom))})
+        if len(peaks):
+            summary["peak"] = dict(zip(
+                ("min", "p50", "p95", "max"),
+                (float(value) for value in
+                 numpy.percentile(peaks, [0, 50, 95, 100]))))
+            summary["peak"]["mean"] = float(peaks.mean())
+        if len(oom):
+            summary["time_to_oom"] = {"min": float(oom.min()),
+                                      "mean": float(oom.mean())}
+        return summary
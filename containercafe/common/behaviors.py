@@ -14,6 +14,8 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+from .states import State
+
 
 class ContainerBehavior(object):
 
@@ -21,20 +23,83 @@ class ContainerBehavior(object):
         self.container_type = container_type
 
     def __enter__(self):
-        self.container_type.create()
-        self.container_type.wait(self.container_type.STOPPED)
-        self.container_type.start()
-        self.container_type.wait(self.container_type.RUNNING)
+        try:
+            self.container_type.create()
+            self.container_type.wait(self.container_type.STOPPED)
+            self.container_type.start()
+            self.container_type.wait(self.container_type.RUNNING)
+        except Exception:
+            # __exit__ won't be called: don't leak a half-built container
+            self._tear_down(failed=True)
+            raise
         return self.container_type
 
-    def __exit__(self, container_type):
-        if container_type is not None:
-            pass
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._tear_down(failed=exc_type is not None)
+
+    def _tear_down(self, failed=False):
+        """ Stop, destroy and clean up, whatever state the container is in.
+        When failed, teardown errors don't mask the original one (leftovers
+        are reclaimed by the sweeper). """
+        try:
+            try:
+                if self.container_type._state.value in (
+                        State.STARTED, State.RUNNING):
+                    self.container_type.stop()
+                    self.container_type.wait(self.container_type.STOPPED)
+            finally:
+                try:
+                    self.container_type.destroy()
+                finally:
+                    self.container_type.clean()
+        except Exception:
+            if not failed:
+                raise
+
+    @property
+    def get_context(self):
+        return self.container_type
+
+
+class ContainerFleetBehavior(object):
+    """ ContainerBehavior for many containers, driven by a ContainerFleet """
+
+    def __init__(self, fleet, names, preset_cfg=None, preset_cfgs=None):
+        self.fleet = fleet
+        self.names = names
+        self.preset_cfg = preset_cfg
+        self.preset_cfgs = preset_cfgs
+        self.results = None
+
+    def __enter__(self):
+        self.results = self.fleet.up(
+            self.names, preset_cfg=self.preset_cfg,
+            preset_cfgs=self.preset_cfgs)
+        return self.results
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.results is not None:
+            self.fleet.down(self.results.clients)
+
+    @property
+    def get_context(self):
+        return self.results
+
+
+class PooledContainerBehavior(object):
+    """ ContainerBehavior backed by a warm pool: no create/destroy per use """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.container_type = None
+
+    def __enter__(self):
+        self.container_type = self.pool.checkout()
+        return self.container_type
 
-        self.container_type.stop()
-        self.container_type.wait(self.container_type.STOPPED)
-        self.container_type.destroy()
-        self.container_type.clean()
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.checkin(self.container_type)
+        self.container_type = None
 
     @property
     def get_context(self):
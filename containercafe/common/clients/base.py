@@ -14,7 +14,8 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-import os
+from ..connectors.pool import PooledConnection
+from ..metrics import host_label
 from ..states import State
 
 
@@ -31,6 +32,13 @@ class BaseContainerClient(object):
         self._requires_destroy = False
         self.cmd_delay = 0
 
+        # The scheduler's slot for this container (set by the factory)
+        self.placement = None
+
+        # Opt-in ProbeCache: results of commands executed with pure=True
+        # are served from it until they expire or the container changes
+        self.probe_cache = None
+
     def _run(self, cmd):
         raise NotImplementedError
 
@@ -61,28 +69,51 @@ class BaseContainerClient(object):
     def clean(self):
         raise NotImplementedError
 
-    @classmethod
-    def write_cfg(cls, path, config, filename='config', open_func=open):
-        rc_file = os.path.join(path, filename)
-
-        with open_func(rc_file, 'w') as cfg_out:
-            for cfg_key in config:
-                value = config[cfg_key]
-
-                # Is the object iterable?
-                if not isinstance(value, str):
-                    if hasattr(value, '__contains__'):
-                        str_val = ', '.join(value)
-                    else:
-                        raise TypeError('Expected string or iterable value')
-                else:
-                    str_val = value
+    def _release_connection(self):
+        """ Hand a pooled connection back to its pool (no-op otherwise) """
+        if isinstance(self.connection, PooledConnection):
+            self.connection.close()
+        self._release_placement()
+
+    def _release_placement(self):
+        """ Free this container's slot on its host """
+        if self.placement is not None:
+            self.placement.release()
 
-                cfg_out.write('{} = {}\n'.format(cfg_key, str_val))
-        return rc_file
+    def _probe_target(self):
+        """ What cached probe results are keyed by, besides the command """
+        return host_label(self.connection), self.name
+
+    def _cached_probe(self, user_cmd, pure):
+        if pure and self.probe_cache is not None:
+            return self.probe_cache.get(self._probe_target(), user_cmd)
+        return None
+
+    def _store_probe(self, user_cmd, pure, result):
+        if pure and self.probe_cache is not None:
+            self.probe_cache.put(self._probe_target(), user_cmd, result)
+        return result
+
+    def _invalidate_probes(self):
+        """ The container changed: forget its cached probe results """
+        if self.probe_cache is not None:
+            self.probe_cache.invalidate(self._probe_target())
 
     @classmethod
-    def get_cfg(cls, rc_file, open_func=open):
-        with open_func(rc_file, "r") as cfg_file:
-            cfg = cfg_file.readlines()
-        return cfg
+    def render_cfg(cls, config):
+        """ Config file contents, one 'key = value' line per sorted key """
+        lines = list()
+        for cfg_key in sorted(config):
+            value = config[cfg_key]
+
+            # Is the object iterable?
+            if not isinstance(value, str):
+                if hasattr(value, '__contains__'):
+                    str_val = ', '.join(value)
+                else:
+                    raise TypeError('Expected string or iterable value')
+            else:
+                str_val = value
+
+            lines.append('{} = {}\n'.format(cfg_key, str_val))
+        return ''.join(lines)
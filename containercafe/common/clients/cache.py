@@ -0,0 +1,85 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Remember the results of read-only probe commands (uname -a, id,
+        lxc-info --version, ...) per target, so suites asking the same
+        question again don't pay another round trip. Clients only consult
+        it for commands run with pure=True.
+
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProbeCache(object):
+    """ LRU cache of successful command results, keyed by (target, cmd).
+
+    Entries expire ttl seconds after they were stored; past max_entries,
+    the least recently used entry is evicted. A target is whatever the
+    client uses to tell its host/container apart, e.g. (host, name).
+    """
+
+    def __init__(self, ttl=60.0, max_entries=256, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, target, cmd):
+        """ The cached result of cmd on target, or None """
+        key = (target, cmd)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or self.clock() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, target, cmd, result):
+        """ Remember result (only if the command succeeded) """
+        if getattr(result, 'returncode', 0) != 0:
+            return
+        key = (target, cmd)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (self.clock(), result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, target=None):
+        """ Forget target's results (everything when target is None) """
+        with self._lock:
+            if target is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == target]:
+                del self._entries[key]
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "hits": self.hits,
+                    "misses": self.misses}
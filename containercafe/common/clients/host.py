@@ -15,6 +15,7 @@ limitations under the License.
 """
 
 from .base import BaseContainerClient
+from ..metrics import host_label, timed
 from ..states import State
 
 
@@ -29,8 +30,21 @@ class HostContainerClient(BaseContainerClient):
         self._state = State(State.RUNNING)
         self._requires_destroy = clean
 
-    def execute(self, user_command, **kwargs):
-        return self.connection.execute(user_command, **kwargs)
-
+    @timed('execute')
+    def execute(self, user_command, pure=False, **kwargs):
+        """ pure: user_command only reads state, so its result may come
+        from (and go to) the probe cache """
+        cached = self._cached_probe(user_command, pure)
+        if cached is not None:
+            return cached
+        return self._store_probe(user_command, pure, self.connection.execute(
+            user_command, **kwargs))
+
+    @timed('clean')
     def clean(self):
         self.connection.close()
+        self._release_placement()
+
+    def _probe_target(self):
+        # Every client of a host runs its commands on the host itself
+        return host_label(self.connection), None
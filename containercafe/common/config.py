@@ -39,7 +39,20 @@ class ContainersSetupConfig(ConfigSectionInterface):
     @property
     def host_port(self):
         """Host port to connect to."""
-        return int(self.get('host_port'))
+        return int(self.get('host_port', 22))
+
+    @property
+    def container_hosts(self):
+        """Comma-separated ip[:port][@capacity] hosts to spread containers
+        across (default: host_ip)"""
+        return tuple(host.strip() for host in
+                     self.get("container_hosts", "").split(",")
+                     if host.strip())
+
+    @property
+    def placement_policy(self):
+        """least_loaded, round_robin or capacity_weighted"""
+        return self.get("placement_policy", "least_loaded")
 
     @property
     def container_ip(self):
@@ -96,10 +109,68 @@ class ContainersSetupConfig(ConfigSectionInterface):
         """Alternate container image to be used in compute tests."""
         return self.get("secondary_image")
 
+    @property
+    def ssh_pool_size(self):
+        """Max number of idle SSH connections kept open for reuse"""
+        return int(self.get("ssh_pool_size", 8))
+
+    @property
+    def ssh_pool_idle_ttl(self):
+        """Seconds an idle pooled SSH connection is kept before closing"""
+        return float(self.get("ssh_pool_idle_ttl", 300))
+
+    @property
+    def metrics_enabled(self):
+        """Time every command and lifecycle phase per host"""
+        return self.get_boolean("metrics_enabled", False)
+
+    @property
+    def metrics_dir(self):
+        """Directory the latency metrics are dumped to at the end of a run"""
+        return self.get("metrics_dir", ".")
+
+    @property
+    def probe_cache_ttl(self):
+        """Seconds results of pure (read-only) commands are reused; 0: off"""
+        return float(self.get("probe_cache_ttl", 0))
+
+    @property
+    def probe_cache_size(self):
+        """Max number of cached probe results (least recently used go)"""
+        return int(self.get("probe_cache_size", 256))
+
+    @property
+    def sweep_prefixes(self):
+        """Comma-separated container name prefixes BuildContainerClient.sweep
+        reclaims by default"""
+        return tuple(prefix.strip() for prefix in
+                     self.get("sweep_prefixes", "").split(",")
+                     if prefix.strip())
+
     @property
     def lxc_cmd_delay(self):
-        """LXC commands are slow to execute. Define delay between cmds"""
-        return float(self.get("lxc_cmd_delay"))
+        """Legacy: fixed delay between LXC cmds when not verifying completion"""
+        return float(self.get("lxc_cmd_delay", 0))
+
+    @property
+    def lxc_verify_completion(self):
+        """Poll for each LXC command's post-condition instead of delaying"""
+        return self.get_boolean("lxc_verify_completion", True)
+
+    @property
+    def lxc_poll_timeout(self):
+        """Max seconds to wait for an LXC command's post-condition"""
+        return float(self.get("lxc_poll_timeout", 60))
+
+    @property
+    def lxc_poll_interval(self):
+        """Initial seconds between post-condition polls (doubles each poll)"""
+        return float(self.get("lxc_poll_interval", 0.05))
+
+    @property
+    def lxc_state_ttl(self):
+        """Max age (seconds) of the host-wide lxc-ls state snapshot"""
+        return float(self.get("lxc_state_ttl", 2.0))
 
 
 class ContainerTestParameters(ConfigSectionInterface):
@@ -114,7 +185,7 @@ class ContainerTestParameters(ConfigSectionInterface):
     @property
     def virtualization_mem_tolerance_kb(self):
         """ Requested vs Allocated Memory Tolerance """
-        return int(self.get("virtualization_mem_tolerance_kb"))
+        return int(self.get("virtualization_mem_tolerance_kb", 0))
 
     @property
     def mkdir_depth(self):
@@ -126,7 +197,7 @@ class ContainerTestParameters(ConfigSectionInterface):
         """ Name of temporary directory to nest for file system testing """
         DELIMITER = '/'
         directory = self.get("temp_mkdir_dir")
-        if not directory.endswith(DELIMITER):
+        if directory is not None and not directory.endswith(DELIMITER):
             directory = '{0}{1}'.format(directory, DELIMITER)
         return directory
 
@@ -135,6 +206,11 @@ class ContainerTestParameters(ConfigSectionInterface):
         """ Maximum number of processes to fork child processes """
         return int(self.get("max_fork_procs"))
 
+    @property
+    def cgroup_sample_interval(self):
+        """ Seconds between cgroup usage samples (see lxc.sampler) """
+        return float(self.get("cgroup_sample_interval", 0.05))
+
     @property
     def host_pollution_username(self):
         """ Username to use for host pollution testing """
@@ -144,3 +220,101 @@ class ContainerTestParameters(ConfigSectionInterface):
     def debug(self):
         """ Get debug flag setting """
         return self.get_boolean('debug')
+
+
+class InvalidConfigValue(Exception):
+    def __init__(self, section, option, error, **kwargs):
+        super(InvalidConfigValue, self).__init__(**kwargs)
+        self.message = 'Invalid value for [{section}] {option}: {err}'.format(
+            section=section, option=option, err=error)
+
+    def __str__(self):
+        return self.message
+
+
+def _config_fields(config_cls):
+    """ Names of the properties a config section class exposes """
+    return tuple(sorted(name for name, attr in vars(config_cls).items()
+                        if isinstance(attr, property)))
+
+
+class ConfigSnapshot(object):
+    """ Immutable copy of a config section, parsed and validated once.
+
+    Every property of CONFIG_CLASS is read (and converted) when the
+    snapshot is loaded, so bad values fail the run up front instead of in
+    the middle of a test. Snapshots are plain slotted values: attribute
+    access is cheap and they pickle compactly for worker processes.
+    """
+
+    __slots__ = ()
+    CONFIG_CLASS = None
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{cls} is read-only'.format(
+            cls=self.__class__.__name__))
+
+    __delattr__ = __setattr__
+
+    def __reduce__(self):
+        return self.__class__, tuple(
+            getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self.__reduce__() == other.__reduce__())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{cls}({values})'.format(
+            cls=self.__class__.__name__,
+            values=', '.join('{0}={1!r}'.format(name, getattr(self, name))
+                             for name in self.__slots__))
+
+    @property
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    @classmethod
+    def load(cls, config=None):
+        """ Snapshot config (a fresh CONFIG_CLASS() when not given) """
+        if config is None:
+            config = cls.CONFIG_CLASS()
+        if isinstance(config, cls):
+            return config
+
+        values = list()
+        for name in cls.__slots__:
+            try:
+                values.append(getattr(config, name))
+            except (TypeError, ValueError) as err:
+                raise InvalidConfigValue(
+                    section=cls.CONFIG_CLASS.SECTION_NAME, option=name,
+                    error=err)
+        return cls(*values)
+
+    @classmethod
+    def get(cls):
+        """ The run's snapshot, loaded on first use """
+        snapshot = cls.__dict__.get('_loaded')
+        if snapshot is None:
+            snapshot = cls._loaded = cls.load()
+        return snapshot
+
+
+class ContainersSetupSnapshot(ConfigSnapshot):
+    """ Frozen ContainersSetupConfig """
+    __slots__ = _config_fields(ContainersSetupConfig)
+    CONFIG_CLASS = ContainersSetupConfig
+
+
+class ContainerTestParametersSnapshot(ConfigSnapshot):
+    """ Frozen ContainerTestParameters """
+    __slots__ = _config_fields(ContainerTestParameters)
+    CONFIG_CLASS = ContainerTestParameters
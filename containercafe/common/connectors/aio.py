@@ -0,0 +1,252 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: asyncio connectors (Python 3 only; import on demand). Each async
+        connection has a coroutine execute(cmd, timeout=None) returning a
+        CommandResult, so one event loop can drive many hosts/containers.
+
+"""
+
+import asyncio
+import functools
+import os
+import signal
+import socket
+import time
+
+from ..metrics import METRICS
+from .process import (
+    Command, CommandError, CommandResult, CommandTimeout, OutputBuffer)
+from ..waiters import WaitTimeout
+
+
+# Local executor
+# ----------------------------------------------------
+async def run_command(cmd, cwd=None, env=None, timeout=None,
+                      merge_stderr=True, max_memory=None):
+    """ Async Command.run_command: cmd is a shell string, or an argv list
+    run without a shell. Raises CommandTimeout/CommandError like it. """
+    pipes = dict(stdin=asyncio.subprocess.DEVNULL,
+                 stdout=asyncio.subprocess.PIPE,
+                 stderr=(asyncio.subprocess.STDOUT if merge_stderr
+                         else asyncio.subprocess.PIPE),
+                 cwd=cwd, env=env, start_new_session=True)
+    if isinstance(cmd, (list, tuple)):
+        proc = await asyncio.create_subprocess_exec(*cmd, **pipes)
+    else:
+        proc = await asyncio.create_subprocess_shell(cmd, **pipes)
+
+    output = OutputBuffer(max_memory)
+    stderr = None if merge_stderr else OutputBuffer(max_memory)
+    pumps = [_pump(proc.stdout, output)]
+    if stderr is not None:
+        pumps.append(_pump(proc.stderr, stderr))
+
+    async def _collect():
+        await asyncio.gather(*pumps)
+        await proc.wait()
+
+    try:
+        await asyncio.wait_for(_collect(), timeout)
+    except asyncio.TimeoutError:
+        _kill(proc)
+        await proc.wait()
+        raise CommandTimeout(CommandResult(proc.returncode, output, stderr))
+
+    result = CommandResult(proc.returncode, output, stderr=stderr)
+    if result.returncode:
+        raise CommandError(result)
+    return result
+
+
+async def _pump(stream, buffer):
+    while True:
+        data = await stream.read(Command.CHUNK_SIZE)
+        if not data:
+            return
+        buffer.write(data)
+
+
+def _kill(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+# Connections
+# ----------------------------------------------------
+def _text_result(result):
+    """ Connections hand back decoded output, like the SSH clients do """
+    return CommandResult(result.returncode, result.text)
+
+
+class AsyncLocalConnection(object):
+    """ Commands run as local child processes, any number at a time """
+
+    host = 'local'
+
+    def __init__(self, max_memory=None):
+        self.max_memory = max_memory
+        self.sync = _LocalConnection(max_memory)
+
+    async def execute(self, cmd, timeout=None, **kwargs):
+        try:
+            return _text_result(await run_command(
+                cmd, timeout=timeout, max_memory=self.max_memory))
+        except CommandTimeout:
+            raise
+        except CommandError as err:
+            return _text_result(err.result)
+
+    def close(self):
+        pass
+
+
+class _LocalConnection(object):
+    """ Blocking counterpart of AsyncLocalConnection """
+
+    host = 'local'
+
+    def __init__(self, max_memory=None):
+        self.max_memory = max_memory
+
+    def execute(self, cmd, timeout=None, **kwargs):
+        try:
+            return _text_result(Command.run_command(
+                cmd, timeout=timeout, max_memory=self.max_memory))
+        except CommandTimeout:
+            raise
+        except CommandError as err:
+            return _text_result(err.result)
+
+
+class AsyncSSHConnection(object):
+    """ Commands over a connection's SSH transport, one exec channel per
+    command, so any number can run concurrently on one transport.
+
+    Output is read as the event loop reports the channel readable. Opening
+    a channel is a blocking paramiko round trip: it runs in the executor.
+    """
+
+    def __init__(self, connection, executor=None):
+        self.sync = connection
+        self.host = getattr(connection, 'host', None)
+        self.executor = executor
+        self._transport = connection.ssh_connection.get_transport()
+
+    async def execute(self, cmd, timeout=None, **kwargs):
+        loop = asyncio.get_event_loop()
+        channel = await loop.run_in_executor(
+            self.executor, self._open_channel, cmd)
+        output = OutputBuffer()
+        eof = loop.create_future()
+
+        def _readable():
+            try:
+                data = channel.recv(Command.CHUNK_SIZE)
+            except socket.timeout:
+                return
+            if data:
+                output.write(data)
+            elif not eof.done():
+                eof.set_result(None)
+
+        fd = channel.fileno()
+        loop.add_reader(fd, _readable)
+        try:
+            await asyncio.wait_for(eof, timeout)
+        except asyncio.TimeoutError:
+            channel.close()
+            raise CommandTimeout(CommandResult(None, output))
+        finally:
+            loop.remove_reader(fd)
+
+        # The exit status usually arrives before EOF; else wait for it
+        if not channel.exit_status_ready():
+            await loop.run_in_executor(
+                self.executor, channel.recv_exit_status)
+        returncode = channel.recv_exit_status()
+        channel.close()
+        return _text_result(CommandResult(returncode, output))
+
+    def _open_channel(self, cmd):
+        channel = self._transport.open_session()
+        channel.set_combine_stderr(True)
+        channel.exec_command(cmd)
+        channel.setblocking(0)
+        return channel
+
+    def close(self):
+        pass
+
+
+class AsyncConnection(object):
+    """ Any blocking connection, driven from the executor. Its commands are
+    serialized: an interactive shell runs one command at a time. """
+
+    def __init__(self, connection, executor=None):
+        self.sync = connection
+        self.host = getattr(connection, 'host', None)
+        self.key = getattr(connection, 'key', None)
+        self.executor = executor
+        self._lock = None
+
+    async def execute(self, cmd, **kwargs):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor,
+                functools.partial(self.sync.execute, cmd=cmd, **kwargs))
+
+    def close(self):
+        close = getattr(self.sync, 'close', None)
+        if close is not None:
+            close()
+
+
+# Helpers
+# ----------------------------------------------------
+async def wait_for(condition, timeout, interval=0.05, max_interval=2.0,
+                   backoff=2.0, description='condition', clock=time.time):
+    """ waiters.wait_for for a coroutine condition """
+    deadline = clock() + timeout
+    delay = interval
+
+    while True:
+        value = await condition()
+        if value:
+            return value
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise WaitTimeout(description=description, timeout=timeout)
+
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_interval)
+
+
+def timed(phase):
+    """ metrics.timed for coroutine methods """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if not METRICS.enabled:
+                return await func(self, *args, **kwargs)
+            with METRICS.timer(phase, self.connection):
+                return await func(self, *args, **kwargs)
+        return wrapper
+    return decorator
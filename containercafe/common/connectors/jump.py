@@ -0,0 +1,162 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: SSH to hosts only reachable through another host (e.g. isolated
+        containers behind their VM). Each connection is a real SSH session
+        carried by a direct-tcpip channel over the jump host's transport,
+        so any number of them share one connection to the jump host.
+
+"""
+
+import socket
+import threading
+import time
+
+import paramiko
+
+from .pool import ssh_is_alive
+from .process import CommandResult, CommandTimeout, OutputBuffer
+
+
+class JumpConnectError(Exception):
+    def __init__(self, ip, port, via, error, **kwargs):
+        super(JumpConnectError, self).__init__(**kwargs)
+        self.error = error
+        self.message = ('Unable to reach {ip}:{port} through {via}: '
+                        '{error}'.format(ip=ip, port=port, via=via,
+                                         error=error))
+
+    def __str__(self):
+        return self.message
+
+
+class JumpHost(object):
+    """ A host whose SSH transport carries tunnels to the hosts behind it.
+
+    connect() must return a new connection to the jump host (anything with
+    an ssh_connection); it is called again if that connection dies.
+    close(connection) closes one (default: connection.close()).
+    """
+
+    # Source address reported to the jump host's sshd for each tunnel
+    ORIGIN = ('127.0.0.1', 0)
+
+    def __init__(self, connect, close=None, name=None):
+        self._connect = connect
+        self._close_connection = close or (lambda conn: conn.close())
+        self.name = name
+        self.connection = None
+        self.tunnels = 0
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return self.name or str(getattr(self.connection, 'host', 'jump host'))
+
+    @property
+    def transport(self):
+        """ The jump host's SSH transport, reconnecting if it has died """
+        with self._lock:
+            if self.connection is None or not ssh_is_alive(self.connection):
+                self._close()
+                self.connection = self._connect()
+            return self.connection.ssh_connection.get_transport()
+
+    def open_tunnel(self, ip, port=22):
+        """ A socket-like channel to ip:port, as seen from the jump host """
+        channel = self.transport.open_channel(
+            'direct-tcpip', (ip, port), self.ORIGIN)
+        with self._lock:
+            self.tunnels += 1
+        return channel
+
+    def connect(self, ip, port=22, username=None, password=None,
+                timeout=10):
+        """ JumpConnection logged into ip:port through this host """
+        connection = JumpConnection(jump_host=self, ip=ip, port=port)
+        connection.connect(username=username, password=password,
+                           timeout=timeout)
+        return connection
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self.connection is not None:
+            self._close_connection(self.connection)
+            self.connection = None
+
+
+class JumpConnection(object):
+    """ SSH connection to a host behind a JumpHost.
+
+    Every command runs on its own exec channel, so commands may run
+    concurrently and each returns its own exit code.
+    """
+
+    def __init__(self, jump_host, ip, port=22):
+        self.jump_host = jump_host
+        self.host = ip
+        self.port = port
+        self.ssh_connection = None
+
+    def connect(self, username, password=None, timeout=10):
+        tunnel = None
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            tunnel = self.jump_host.open_tunnel(self.host, self.port)
+            client.connect(self.host, port=self.port, username=username,
+                           password=password, sock=tunnel, timeout=timeout,
+                           allow_agent=False, look_for_keys=password is None)
+        except (paramiko.SSHException, socket.error) as err:
+            client.close()
+            if tunnel is not None:
+                tunnel.close()
+            raise JumpConnectError(ip=self.host, port=self.port,
+                                   via=self.jump_host, error=err)
+        self.ssh_connection = client
+
+    def execute(self, cmd, timeout=None, **kwargs):
+        """ Run cmd; returns a CommandResult (CommandTimeout if timeout
+        passes first). Prompt arguments are accepted and ignored. """
+        deadline = None if timeout is None else time.time() + timeout
+        channel = self.ssh_connection.get_transport().open_session()
+        output = OutputBuffer()
+        try:
+            channel.set_combine_stderr(True)
+            channel.exec_command(cmd)
+            while True:
+                if deadline is not None:
+                    channel.settimeout(max(deadline - time.time(), 0))
+                try:
+                    data = channel.recv(64 * 1024)
+                except socket.timeout:
+                    raise CommandTimeout(CommandResult(None, output))
+                if not data:
+                    break
+                output.write(data)
+            returncode = channel.recv_exit_status()
+        finally:
+            channel.close()
+
+        # Hand back decoded output, like the other SSH connections
+        result = CommandResult(returncode, output)
+        return CommandResult(result.returncode, result.text)
+
+    def close(self):
+        if self.ssh_connection is not None:
+            self.ssh_connection.close()
+            self.ssh_connection = None
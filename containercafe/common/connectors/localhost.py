@@ -14,14 +14,238 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-import commands
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+from .process import Command, CommandResult, CommandTimeout, OutputBuffer
+
+
+class SpawnedProcess(object):
+    """ The poll/wait/returncode part of Popen, for a posix_spawn child """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        return self._reap(os.WNOHANG)
+
+    def wait(self):
+        return self._reap(0)
+
+    def _reap(self, flags):
+        """ Exit code (-signal if killed), None while still running """
+        if self.returncode is None:
+            reaped, status = os.waitpid(self.pid, flags)
+            if reaped:
+                if os.WIFSIGNALED(status):
+                    self.returncode = -os.WTERMSIG(status)
+                else:
+                    self.returncode = os.WEXITSTATUS(status)
+        return self.returncode
+
+
+class LocalExecutor(object):
+    """ Run commands on this host without a shell where possible.
+
+    Commands are argv lists, or strings that are only split into one when
+    they use no shell syntax (anything else runs under /bin/sh -c).
+    Children are started with posix_spawn when available (else subprocess,
+    which uses vfork on recent Pythons), binary paths are resolved once,
+    and the environment is built once and reused for every command.
+    """
+
+    SHELL = '/bin/sh'
+
+    # Anything a plain argv can't express: pipes, redirection, expansion,
+    # quoting, globbing, variables, comments, subshells, multiple lines...
+    SHELL_SYNTAX = re.compile(r'[|&;<>()$`\\"\'*?\[\]#~=%{}\n]')
+
+    def __init__(self, env=None, cwd=None, use_posix_spawn=True):
+        self.cwd = cwd
+        self.use_posix_spawn = (use_posix_spawn and
+                                hasattr(os, 'posix_spawn'))
+        self._env = self._merge_env(env)
+        self._paths = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def env(self):
+        return self._env
+
+    @env.setter
+    def env(self, value):
+        self._env = self._merge_env(value)
+        with self._lock:
+            self._paths.clear()
+
+    def run(self, cmd, timeout=None, env=None, merge_stderr=True,
+            max_memory=None):
+        """ Run cmd (argv list or string) and collect its output.
+
+        Returns a CommandResult (whatever the exit code; 127 if the binary
+        doesn't exist). If timeout passes first, the command is killed and
+        CommandTimeout raised.
+        """
+        argv = self.argv(cmd)
+        run_env = self._env if env is None else self._merge_env(env)
+        path = self.which(argv[0], run_env)
+        if path is None and argv[0] != self.SHELL and \
+                not isinstance(cmd, (list, tuple)):
+            # Maybe a shell builtin (cd, export, ...): let the shell decide
+            argv = [self.SHELL, '-c', cmd]
+            path = self.which(self.SHELL, run_env)
+        if path is None:
+            return CommandResult(127, '{0}: command not found\n'.format(
+                argv[0]))
+
+        proc, stdout_fd, stderr_fd = self._spawn(
+            path, argv, run_env, merge_stderr)
+
+        deadline = None if timeout is None else time.time() + timeout
+        streams = {stdout_fd: ('stdout', OutputBuffer(max_memory))}
+        if stderr_fd is not None:
+            streams[stderr_fd] = ('stderr', OutputBuffer(max_memory))
+        buffers = dict(streams.values())
+
+        try:
+            finished = (Command._drain(streams, deadline) and
+                        Command._wait(proc, deadline))
+            if not finished:
+                Command._kill(proc)
+        finally:
+            for fd in streams:
+                os.close(fd)
+
+        result = CommandResult(proc.returncode, buffers['stdout'],
+                               stderr=buffers.get('stderr'))
+        if not finished:
+            raise CommandTimeout(result)
+        return result
+
+    def argv(self, cmd):
+        if isinstance(cmd, (list, tuple)):
+            return list(cmd)
+        if self.SHELL_SYNTAX.search(cmd) or not cmd.strip():
+            return [self.SHELL, '-c', cmd]
+        return shlex.split(cmd)
+
+    def which(self, name, env=None):
+        """ Absolute path of an executable, resolved once per PATH """
+        if os.sep in name:
+            return name if os.access(name, os.X_OK) else None
+
+        search_path = (env or self._env).get('PATH', os.defpath)
+        key = (name, search_path)
+        with self._lock:
+            if key in self._paths:
+                return self._paths[key]
+
+        found = None
+        for directory in search_path.split(os.pathsep):
+            candidate = os.path.join(directory or '.', name)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                found = candidate
+                break
+
+        # Only cache hits: a missing binary may be installed later
+        if found is not None:
+            with self._lock:
+                self._paths[key] = found
+        return found
+
+    # Spawning
+    # ----------------------------------------------------
+    def _spawn(self, path, argv, env, merge_stderr):
+        """ Start argv; returns (process, stdout fd, stderr fd or None),
+        the process being a Popen or a SpawnedProcess """
+        if self.use_posix_spawn and self.cwd is None:
+            return self._posix_spawn(path, argv, env, merge_stderr)
+        return self._popen(path, argv, env, merge_stderr)
+
+    def _posix_spawn(self, path, argv, env, merge_stderr):
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = (None, None) if merge_stderr else os.pipe()
+        actions = [
+            (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_DUP2, stdout_w, 1),
+            (os.POSIX_SPAWN_DUP2, stderr_w or stdout_w, 2)]
+        try:
+            # Its own session, so a timeout can kill the whole group
+            pid = os.posix_spawn(path, argv, env, file_actions=actions,
+                                 setsid=True)
+        except Exception:
+            for fd in (stdout_r, stderr_r):
+                if fd is not None:
+                    os.close(fd)
+            raise
+        finally:
+            for fd in (stdout_w, stderr_w):
+                if fd is not None:
+                    os.close(fd)
+        return SpawnedProcess(pid), stdout_r, stderr_r
+
+    def _popen(self, path, argv, env, merge_stderr):
+        kwargs = dict(stdin=open(os.devnull, 'rb'), stdout=subprocess.PIPE,
+                      stderr=(subprocess.STDOUT if merge_stderr
+                              else subprocess.PIPE),
+                      env=env, cwd=self.cwd, close_fds=True)
+        if sys.version_info >= (3, 2):
+            kwargs['start_new_session'] = True
+        else:
+            kwargs['preexec_fn'] = os.setsid
+        try:
+            proc = subprocess.Popen([path] + argv[1:], **kwargs)
+        finally:
+            kwargs['stdin'].close()
+
+        # Hand over the pipes as plain fds, like _posix_spawn's; the Popen
+        # still reaps the process
+        stdout_fd = os.dup(proc.stdout.fileno())
+        stderr_fd = None
+        proc.stdout.close()
+        if proc.stderr is not None:
+            stderr_fd = os.dup(proc.stderr.fileno())
+            proc.stderr.close()
+        return proc, stdout_fd, stderr_fd
+
+    @classmethod
+    def _merge_env(cls, env):
+        merged = dict(os.environ)
+        if env:
+            merged.update(env)
+        return merged
 
 
 class LocalHostClient(object):
     """ This is a client for the host of the container"""
 
-    def execute(self, command):
-        return commands.getoutput(cmd=command)
+    host = 'local'
+
+    def __init__(self, env=None, timeout=None):
+        self.executor = LocalExecutor(env=env)
+        self.timeout = timeout
+
+    def execute(self, cmd, timeout=None, **kwargs):
+        """ Run cmd; returns a CommandResult with decoded output, like the
+        other connections (so this can serve as a client connection) """
+        result = self.executor.run(
+            cmd, timeout=self.timeout if timeout is None else timeout)
+        return CommandResult(result.returncode, result.text)
 
     def status_execute(self, command):
-        return commands.getstatusoutput(cmd=command)
+        """ (exit code, output without its trailing newline) """
+        result = self.execute(command)
+        return result.returncode, self._strip(result.text)
+
+    def close(self):
+        pass
+
+    @classmethod
+    def _strip(cls, output):
+        return output[:-1] if output.endswith('\n') else output
@@ -0,0 +1,194 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Reuse established (SSH) connections across clients. Connections are
+        keyed by (ip, port, username); releasing a lease puts the connection
+        back on the idle list instead of closing it.
+
+"""
+
+import threading
+import time
+
+_NOT_SSH = object()
+
+
+class ConnectionReleased(Exception):
+    pass
+
+
+def ssh_is_alive(connection):
+    """ Default health check: is the underlying SSH transport active? """
+    ssh_connection = getattr(connection, 'ssh_connection', _NOT_SSH)
+    if ssh_connection is _NOT_SSH:
+        return True
+    if ssh_connection is None:
+        return False
+    transport = ssh_connection.get_transport()
+    return transport is not None and transport.is_active()
+
+
+class PooledConnection(object):
+    """ A lease on a pooled connection; close() returns it to the pool.
+
+    Attributes are read from the leased connection, but anything set on
+    the lease stays on the lease: it is gone with it, and never handed to
+    the connection's next client.
+    """
+
+    def __init__(self, pool, key, connection):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+
+    def __getattr__(self, item):
+        return getattr(self.connection, item)
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def connection(self):
+        """ The leased connection itself (ConnectionReleased once closed) """
+        connection = self.__dict__.get('_connection')
+        if connection is None:
+            raise ConnectionReleased(
+                'Connection {key} already released'.format(key=self._key))
+        return connection
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool.release(self._key, connection)
+
+
+def underlying(connection):
+    """ The connection a lease stands for (anything else is returned as is).
+
+    State that outlives a lease (caches, helpers bound to a connection)
+    must be kept on the underlying connection: the lease is closed when
+    its client is done, the connection is handed to the next client.
+    """
+    if isinstance(connection, PooledConnection):
+        return connection.connection
+    return connection
+
+
+class ConnectionPool(object):
+    """ Keyed pool of idle connections with health checks and an idle TTL """
+
+    def __init__(self, connect, max_size=8, idle_ttl=300.0,
+                 health_check=ssh_is_alive, close=None, clock=time.time):
+        """
+        connect(ip, port, username, password) opens a new connection and
+        close(connection) tears one down (defaults to connection.close()).
+        max_size caps the number of idle connections kept open.
+        """
+        self._connect = connect
+        self._close = close or (lambda connection: connection.close())
+        self._health_check = health_check
+        self._clock = clock
+        self._idle = dict()
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, ip, port, username, password=None):
+        key = (ip, port, username)
+
+        while True:
+            with self._lock:
+                expired = self._expire()
+                idle = self._idle.get(key)
+                connection = idle.pop()[0] if idle else None
+            self._discard(expired)
+
+            if connection is None:
+                break
+            if self._health_check(connection):
+                with self._lock:
+                    self.hits += 1
+                return PooledConnection(self, key, connection)
+            self._discard([connection])
+
+        with self._lock:
+            self.misses += 1
+        connection = self._connect(ip, port, username, password)
+        return PooledConnection(self, key, connection)
+
+    def release(self, key, connection, reuse=True):
+        if not reuse or not self._health_check(connection):
+            self._discard([connection], evicted=False)
+            return
+
+        with self._lock:
+            self._idle.setdefault(key, list()).append(
+                (connection, self._clock()))
+            overflow = self._overflow()
+        self._discard(overflow)
+
+    def stats(self):
+        with self._lock:
+            idle = sum(len(conns) for conns in self._idle.values())
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'idle': idle}
+
+    def close_all(self):
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn, _ in conns]
+            self._idle.clear()
+        self._discard(idle, evicted=False)
+
+    # Must be called with self._lock held
+    # ----------------------------------------------------
+    def _expire(self):
+        cutoff = self._clock() - self.idle_ttl
+        expired = list()
+        for key in list(self._idle):
+            conns = self._idle[key]
+            expired.extend(conn for conn, since in conns if since < cutoff)
+            self._idle[key] = [(conn, since) for conn, since in conns
+                               if since >= cutoff]
+            if not self._idle[key]:
+                del self._idle[key]
+        return expired
+
+    def _overflow(self):
+        """ Pop the least recently released connections beyond max_size """
+        ordered = sorted(
+            ((since, key, conn) for key, conns in self._idle.items()
+             for conn, since in conns), key=lambda entry: entry[0])
+        overflow = list()
+        for since, key, conn in ordered[:max(0, len(ordered) - self.max_size)]:
+            self._idle[key] = [entry for entry in self._idle[key]
+                               if entry[0] is not conn]
+            if not self._idle[key]:
+                del self._idle[key]
+            overflow.append(conn)
+        return overflow
+
+    def _discard(self, connections, evicted=True):
+        for connection in connections:
+            if evicted:
+                with self._lock:
+                    self.evictions += 1
+            try:
+                self._close(connection)
+            except Exception:
+                pass
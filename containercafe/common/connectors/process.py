@@ -14,14 +14,117 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import collections
+import errno
+import os
+import re
+import select
+import signal
 import subprocess
+import sys
+import tempfile
+import time
+
+# Popen arguments starting the child in a session of its own, so a timeout
+# can kill its whole process group. A preexec_fn would force fork+exec,
+# start_new_session keeps subprocess's vfork/posix_spawn fast path.
+if sys.version_info >= (3, 2):
+    NEW_SESSION = {'start_new_session': True}
+else:
+    NEW_SESSION = {'preexec_fn': os.setsid}
+
+
+class OutputBuffer(object):
+    """ Append-only byte buffer: the first max_memory bytes are kept in
+    memory, anything beyond that is spilled to an anonymous temp file. """
+
+    __slots__ = ('max_memory', '_memory', '_spill', '_size')
+
+    # Default in-memory threshold (bytes) before output spills to disk
+    MAX_MEMORY = 1024 * 1024
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, max_memory=None):
+        self.max_memory = self.MAX_MEMORY if max_memory is None else max_memory
+        self._memory = bytearray()
+        self._spill = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def spilled(self):
+        return self._spill is not None
+
+    def write(self, data):
+        self._size += len(data)
+        room = self.max_memory - len(self._memory)
+        if room > 0:
+            self._memory.extend(data[:room])
+            data = data[room:]
+        if data:
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile(prefix='containercafe.')
+            self._spill.seek(0, os.SEEK_END)
+            self._spill.write(data)
+
+    def getvalue(self):
+        return b''.join(self.iter_chunks())
+
+    def read(self, offset, length):
+        """ Up to length bytes starting at offset """
+        data = bytes(self._memory[offset:offset + length])
+        if self._spill is not None and len(data) < length:
+            self._spill.seek(max(0, offset - len(self._memory)))
+            data += self._spill.read(length - len(data))
+        return data
+
+    def iter_chunks(self):
+        if self._memory:
+            yield bytes(self._memory)
+        if self._spill is not None:
+            self._spill.seek(0)
+            while True:
+                chunk = self._spill.read(self.READ_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def iter_lines(self):
+        """ Yield lines (without line endings) one chunk at a time """
+        pending = b''
+        for chunk in self.iter_chunks():
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line
+        if pending:
+            yield pending
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
 
 
 class CommandResult(object):
+    """ Result of a command. Output may be a str/bytes value or an
+    OutputBuffer; buffered output is only read back (and decoded) when
+    asked for, and head/tail/grep stream it line by line. """
+
+    __slots__ = ('returncode', 'encoding', '_output_data', '_stderr_data',
+                 '_views')
 
-    def __init__(self, returncode, output):
+    # Bytes (or characters) kept from each end of the output by preview
+    PREVIEW_SIZE = 2048
+
+    def __init__(self, returncode, output, stderr=None, encoding='utf-8'):
         self.returncode = returncode
-        self.output = output
+        self.encoding = encoding
+        self._output_data = output
+        self._stderr_data = stderr
+        self._views = dict()
 
     def __str__(self):
         return str(self.to_dict)
@@ -29,16 +132,117 @@ class CommandResult(object):
     @property
     def to_dict(self):
         return {"returncode": self.returncode,
-                "output": self.output}
+                "size": self.size,
+                "output": self.preview}
+
+    @property
+    def output(self):
+        return self._raw(self._output_data)
+
+    @output.setter
+    def output(self, value):
+        self._output_data = value
+        self._views.clear()
+
+    @property
+    def stderr(self):
+        return self._raw(self._stderr_data)
+
+    @stderr.setter
+    def stderr(self, value):
+        self._stderr_data = value
+
+    @property
+    def size(self):
+        """ Number of bytes (or characters) of output """
+        return len(self._output_data or '')
+
+    @property
+    def text(self):
+        """ Output decoded to text """
+        return self._view('text', lambda: self._decode(self.output))
 
     @property
     def _output(self):
-        return self.output.replace('\n', '')
+        return self._view('_output', lambda: self.text.replace('\n', ''))
 
     @property
     def _content(self):
         return self.output
 
+    @property
+    def preview(self):
+        """ Output text, with the middle left out when it is longer than
+        twice PREVIEW_SIZE; only the two ends are read back. """
+        size = self.size
+        if size <= 2 * self.PREVIEW_SIZE:
+            return self.text
+        return '{0}\n... [{1} bytes not shown] ...\n{2}'.format(
+            self._decode(self._slice(0, self.PREVIEW_SIZE)),
+            size - 2 * self.PREVIEW_SIZE,
+            self._decode(self._slice(size - self.PREVIEW_SIZE,
+                                     self.PREVIEW_SIZE)))
+
+    def head(self, lines=10):
+        """ First lines of output, without reading the rest """
+        head = list()
+        for line in self._iter_lines():
+            if len(head) == lines:
+                break
+            head.append(line)
+        return head
+
+    def tail(self, lines=10):
+        """ Last lines of output, holding at most that many in memory """
+        return list(collections.deque(self._iter_lines(), maxlen=lines))
+
+    def grep(self, pattern, flags=0):
+        """ Output lines matching the regex pattern """
+        regex = re.compile(pattern, flags)
+        return [line for line in self._iter_lines() if regex.search(line)]
+
+    def close(self):
+        """ Release any temp file backing the output """
+        for data in (self._output_data, self._stderr_data):
+            if isinstance(data, OutputBuffer):
+                data.close()
+
+    def _slice(self, offset, length):
+        data = self._output_data
+        if isinstance(data, OutputBuffer):
+            return data.read(offset, length)
+        return data[offset:offset + length]
+
+    def _iter_lines(self):
+        data = self._output_data
+        if isinstance(data, OutputBuffer):
+            lines = data.iter_lines()
+        else:
+            lines = (data or '').splitlines()
+        for line in lines:
+            yield self._decode(line)
+
+    def _view(self, name, build):
+        """ Build a derived view; cache it unless output is on disk """
+        if name in self._views:
+            return self._views[name]
+        value = build()
+        data = self._output_data
+        if not (isinstance(data, OutputBuffer) and data.spilled):
+            self._views[name] = value
+        return value
+
+    def _decode(self, value):
+        if isinstance(value, (bytes, bytearray)):
+            return value.decode(self.encoding, 'replace')
+        return value
+
+    @classmethod
+    def _raw(cls, data):
+        if isinstance(data, OutputBuffer):
+            return data.getvalue()
+        return data
+
 _SIMPLE_SUCCESS_CMD_RESULT = CommandResult(0, '')
 
 
@@ -48,25 +252,130 @@ class CommandError(Exception):
         self.result = result
 
 
+class CommandTimeout(CommandError):
+    pass
+
+
 class Command(object):
 
+    # Bytes requested per read(); large reads keep multi-MB outputs cheap
+    CHUNK_SIZE = 64 * 1024
+
     @classmethod
-    def run_command(cls, cmd, cwd=None, env=None):
-        output = bytearray()
+    def run_command(cls, cmd, cwd=None, env=None, timeout=None,
+                    merge_stderr=True, on_chunk=None, max_memory=None):
+        """ Run cmd through the shell and collect its output.
+
+        stdout and stderr are read in large chunks as soon as data is ready,
+        so output without newlines can't stall the loop and nothing buffered
+        at exit is lost. With merge_stderr=False, stderr is returned
+        separately in result.stderr. on_chunk(stream, data) is called for
+        every chunk read ('stdout' or 'stderr'). If timeout (seconds) passes
+        first, the command's whole process group is killed and CommandTimeout
+        is raised. Output beyond max_memory bytes is spilled to a temp file.
+        """
         proc = subprocess.Popen(cmd, cwd=cwd, shell=True,
                                 stdin=subprocess.PIPE,
                                 stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT,
-                                env=env, close_fds=True)
+                                stderr=(subprocess.STDOUT if merge_stderr
+                                        else subprocess.PIPE),
+                                env=env, close_fds=True, **NEW_SESSION)
+        proc.stdin.close()
 
-        while proc.poll() is None:
-            line = proc.stdout.readline()
-            if line is None:
-                break
-            output.extend(line)
+        deadline = None if timeout is None else time.time() + timeout
+        streams = {proc.stdout.fileno(): ('stdout', OutputBuffer(max_memory))}
+        if not merge_stderr:
+            streams[proc.stderr.fileno()] = (
+                'stderr', OutputBuffer(max_memory))
+        buffers = dict(streams.values())
 
-        result = CommandResult(proc.returncode, output)
+        try:
+            finished = (cls._drain(streams, deadline, on_chunk) and
+                        cls._wait(proc, deadline))
+            if not finished:
+                cls._kill(proc)
+        finally:
+            proc.stdout.close()
+            if proc.stderr is not None:
+                proc.stderr.close()
+
+        result = CommandResult(proc.returncode, buffers['stdout'],
+                               stderr=buffers.get('stderr'))
+        if not finished:
+            raise CommandTimeout(result)
         if result.returncode and result.returncode != 0:
             raise CommandError(result)
 
         return result
+
+    @classmethod
+    def _drain(cls, streams, deadline=None, on_chunk=None):
+        """ Read {fd: (name, buffer)} streams until EOF on all of them.
+
+        Returns False if the deadline passed first.
+        """
+        streams = dict(streams)
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            for fd in streams:
+                poller.register(fd, select.POLLIN | select.POLLPRI)
+
+            def _ready(wait):
+                return [fd for fd, _ in poller.poll(
+                    None if wait is None else wait * 1000)]
+        else:
+            poller = None
+
+            def _ready(wait):
+                return select.select(list(streams), [], [], wait)[0]
+
+        while streams:
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    return False
+
+            try:
+                ready = _ready(wait)
+            except (select.error, OSError) as err:
+                if err.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd in ready:
+                data = os.read(fd, cls.CHUNK_SIZE)
+                name, buf = streams[fd]
+                if not data:
+                    del streams[fd]
+                    if poller is not None:
+                        poller.unregister(fd)
+                    continue
+                buf.write(data)
+                if on_chunk is not None:
+                    on_chunk(name, data)
+        return True
+
+    @classmethod
+    def _wait(cls, proc, deadline=None):
+        """ Reap proc; returns False if the deadline passed first. """
+        if deadline is None:
+            proc.wait()
+            return True
+
+        delay = 0.001
+        while proc.poll() is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        return True
+
+    @classmethod
+    def _kill(cls, proc):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        proc.wait()
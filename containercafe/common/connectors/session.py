@@ -0,0 +1,275 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Run commands over a long-lived shell. Each command is followed by
+        a unique end marker carrying its exit code, so a command is complete
+        as soon as its marker arrives - no prompt matching, no timeouts.
+
+"""
+
+import codecs
+import os
+import re
+import select
+import subprocess
+import time
+import uuid
+
+from .process import CommandResult, OutputBuffer
+
+
+class SessionClosed(Exception):
+    def __init__(self, output=None, **kwargs):
+        super(SessionClosed, self).__init__(**kwargs)
+        self.output = output
+        self.message = 'Shell session ended before the command completed'
+
+    def __str__(self):
+        return self.message
+
+
+class SessionTimeout(SessionClosed):
+    def __init__(self, output=None, **kwargs):
+        super(SessionTimeout, self).__init__(output=output, **kwargs)
+        self.message = 'Timed out waiting for the command to complete'
+
+
+# Channels: a bidirectional byte stream to a shell
+# ----------------------------------------------------
+class ProcessChannel(object):
+    """ Shell running as a local child process """
+
+    def __init__(self, cmd):
+        self.proc = subprocess.Popen(cmd, shell=True,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT,
+                                     close_fds=True)
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def send(self, data):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def recv(self, timeout=None):
+        """ Return available bytes, b'' at EOF, or None on timeout """
+        fd = self.proc.stdout.fileno()
+        if not select.select([fd], [], [], timeout)[0]:
+            return None
+        return os.read(fd, 64 * 1024)
+
+    def close(self):
+        if self.alive:
+            self.proc.kill()
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+
+
+class SSHChannel(object):
+    """ Shell running as an exec request (or interactive shell) on an SSH
+    transport; many channels can share one transport. """
+
+    def __init__(self, transport, cmd=None, channel=None):
+        self.channel = channel or transport.open_session()
+        if channel is None:
+            self.channel.set_combine_stderr(True)
+            if cmd is None:
+                self.channel.invoke_shell()
+            else:
+                self.channel.exec_command(cmd)
+
+    @property
+    def alive(self):
+        return not (self.channel.closed or self.channel.exit_status_ready())
+
+    def send(self, data):
+        self.channel.sendall(data)
+
+    def recv(self, timeout=None):
+        """ Return available bytes, b'' at EOF, or None on timeout """
+        self.channel.settimeout(timeout)
+        try:
+            return self.channel.recv(64 * 1024)
+        except Exception:
+            return None if not self.channel.closed else b''
+
+    def close(self):
+        self.channel.close()
+
+
+def open_channel(connection, cmd):
+    """ Start cmd next to connection: over its SSH transport if it has one,
+    else as a local process. """
+    ssh_connection = getattr(connection, 'ssh_connection', None)
+    if hasattr(ssh_connection, 'get_transport'):
+        return SSHChannel(ssh_connection.get_transport(), cmd=cmd)
+    return ProcessChannel(cmd)
+
+
+# Session
+# ----------------------------------------------------
+class SentinelSession(object):
+    """ Sentinel-delimited command execution over a persistent shell.
+
+    open_channel() returns a new channel to a shell; it is called again
+    (reconnect) whenever the previous shell has died. init_cmd, if given,
+    is run on every new shell before anything else (its output, e.g. a
+    login banner, is discarded).
+    """
+
+    # Quiet an interactive (pty) shell: no echo, no CR before each newline,
+    # no prompts and no readline bracketed-paste escapes, so a command's
+    # output is exactly what it printed
+    INTERACTIVE_INIT = ("stty -echo -onlcr 2>/dev/null; "
+                        "bind 'set enable-bracketed-paste off' 2>/dev/null; "
+                        "unset PROMPT_COMMAND; PS1=''; PS2=''")
+    INIT_TIMEOUT = 30
+
+    def __init__(self, open_channel, encoding='utf-8', init_cmd=None):
+        self._open_channel = open_channel
+        self._channel = None
+        self._token = uuid.uuid4().hex
+        self._serial = 0
+        self._opened = False
+        self.encoding = encoding
+        self.init_cmd = init_cmd
+        self.reconnects = 0
+
+    @property
+    def connected(self):
+        return self._channel is not None and self._channel.alive
+
+    def execute(self, cmd, timeout=None, **kwargs):
+        """ Run cmd; returns its CommandResult as soon as it completes.
+
+        Other execute_shell_command arguments (prompt) are accepted for
+        compatibility and ignored: completion is signalled by the marker.
+        """
+        if not self.connected:
+            self._reconnect()
+        return self._execute(cmd, timeout)
+
+    def initialise(self, timeout=INIT_TIMEOUT):
+        """ Run init_cmd on the current shell (e.g. one just logged into);
+        returns its exit code """
+        if self.init_cmd is None:
+            return 0
+        return self._execute(self.init_cmd, timeout).returncode
+
+    def send_line(self, line):
+        """ Type a line into the shell, e.g. an answer to a prompt """
+        if not self.connected:
+            self._reconnect()
+        self._channel.send('{0}\n'.format(line).encode(self.encoding))
+
+    def expect(self, pattern, timeout=None):
+        """ Read until pattern (a regex) shows up; returns the output up to
+        the end of the match. Raises SessionTimeout if it doesn't. """
+        match, output = self._read(re.compile(pattern), timeout)
+        return output[:match.end()]
+
+    def close(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+    @classmethod
+    def _format(cls, cmd, marker):
+        # The marker is printed on a line of its own, after the output; the
+        # echoed format string (if the shell echoes) never matches: '%d'.
+        return "{cmd}\nprintf '\\n{marker}:%d\\n' $?\n".format(
+            cmd=cmd, marker=marker)
+
+    def _execute(self, cmd, timeout):
+        self._serial += 1
+        marker = '__cc_{token}_{serial}__'.format(
+            token=self._token, serial=self._serial)
+        self._channel.send(self._format(cmd, marker).encode(self.encoding))
+        return self._read_until(marker, timeout)
+
+    def _read_until(self, marker, timeout=None):
+        """ Read a command's output up to its marker line.
+
+        The output goes to an OutputBuffer (spilled to disk beyond its
+        memory limit). Only the last bytes, which may be the start of the
+        marker line, are held back and searched again, so reading stays
+        linear in the size of the output.
+        """
+        pattern = re.compile(br'\r?\n' + re.escape(marker.encode('ascii')) +
+                             br':(-?\d+)\r?\n')
+        hold = len(marker) + 32     # Longer than any marker line
+        deadline = None if timeout is None else time.time() + timeout
+        output = OutputBuffer()
+        pending = b''
+
+        def _read_so_far():
+            return CommandResult(
+                None, output.getvalue() + pending, encoding=self.encoding).text
+
+        while True:
+            match = pattern.search(pending)
+            if match:
+                output.write(pending[:match.start()])
+                return CommandResult(int(match.group(1)), output,
+                                     encoding=self.encoding)
+            if len(pending) > hold:
+                output.write(pending[:-hold])
+                pending = pending[-hold:]
+            pending += self._recv(deadline, _read_so_far)
+
+    def _read(self, pattern, timeout=None):
+        """ Read until pattern matches: (match, output read so far). The
+        whole output is searched again on every read: for short exchanges
+        (prompts) only, commands use _read_until(). """
+        deadline = None if timeout is None else time.time() + timeout
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        output = ''
+
+        while True:
+            match = pattern.search(output)
+            if match:
+                return match, output
+            output += decoder.decode(self._recv(deadline, lambda: output))
+
+    def _recv(self, deadline, read_so_far):
+        """ The next bytes from the shell (b'' if none yet). read_so_far()
+        is the output for the exception if the shell times out or ends. """
+        wait = None
+        if deadline is not None:
+            wait = deadline - time.time()
+            if wait <= 0:
+                # The shell is still busy: start afresh next time
+                self.close()
+                raise SessionTimeout(output=read_so_far())
+
+        data = self._channel.recv(wait)
+        if data is None:
+            return b''
+        if not data:
+            self.close()
+            raise SessionClosed(output=read_so_far())
+        return data
+
+    def _reconnect(self):
+        if self._opened:
+            self.reconnects += 1
+        self.close()
+        self._channel = self._open_channel()
+        self._opened = True
+        self.initialise()
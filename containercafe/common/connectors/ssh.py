@@ -0,0 +1,66 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Open SSH connections (the registry's 'ssh' connector) whose
+        commands run in a persistent interactive shell, for the factory's
+        connection pool and for command line tools that don't go through
+        the factory.
+
+"""
+
+from ..metrics import METRICS
+from ..registry import CONNECTORS
+from .session import SentinelSession, open_channel
+
+
+class UnableToConnect(Exception):
+    def __init__(self, ip, port, user, pswd, error=None):
+        super(UnableToConnect, self).__init__()
+        self.error = error
+        self.message = ('Unable to reach/connect to {ip}:{port} as '
+                        '{user}/{pswd}'.format(ip=ip, port=port, user=user,
+                                               pswd=pswd))
+        if error is not None:
+            self.message = '{msg}: {error}'.format(msg=self.message,
+                                                   error=error)
+
+    def __str__(self):
+        return self.message
+
+
+def open_ssh(ip, port, username, password, connectors=CONNECTORS):
+    """ Connected SSH client; usable as a ConnectionPool connect function """
+    # Create a common alias between clients: client.execute = reference to
+    # function used for executing command based on the type of connection.
+    connection = connectors.load('ssh')(ip)
+    with METRICS.timer('ssh_connect', connection):
+        connection.connect(username=username, password=password, port=port)
+    if connection.ssh_connection is None:
+        raise UnableToConnect(ip=ip, port=port, user=username, pswd=password)
+
+    # Commands run in a persistent interactive shell, each followed by an
+    # end marker carrying its exit code: execute returns as soon as the
+    # command completes instead of matching a prompt or timing out.
+    connection.shell_session = SentinelSession(
+        open_channel=lambda: open_channel(connection, None),
+        init_cmd=SentinelSession.INTERACTIVE_INIT)
+    connection.execute = connection.shell_session.execute
+    return connection
+
+
+def close_ssh(connection):
+    """ Close a connection made by open_ssh """
+    connection.shell_session.close()
+    connection.close()
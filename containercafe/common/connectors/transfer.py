@@ -0,0 +1,262 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Ship any number of files to a connection's host in a single round
+        trip. Files are packed into one base64-encoded tar stream, unpacked
+        into a staging directory on the host, verified against their
+        sha256 digests and then renamed into place, so a reader never sees
+        a partially written file. Digests of files already shipped are
+        remembered per connection so unchanged files are not re-sent.
+        Large payloads are appended to the staging directory in bounded
+        chunks first (one round trip each), so no command line grows
+        past the host's argument or terminal line limits.
+
+"""
+
+import base64
+import hashlib
+import io
+import posixpath
+import tarfile
+import uuid
+
+from .pool import underlying
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+
+class TransferError(Exception):
+    def __init__(self, result, paths, **kwargs):
+        super(TransferError, self).__init__(**kwargs)
+        self.result = result
+        self.message = 'Unable to transfer {paths} to host'.format(
+            paths=', '.join(paths))
+
+    def __str__(self):
+        return self.message
+
+
+class FileTransfer(object):
+    """ Batched, atomic, checksum-verified file uploads over a connection """
+
+    # Base64 characters per command (well below the 128KB limit on one
+    # argument), sent in lines short enough for a terminal's line buffer
+    CHUNK_SIZE = 48 * 1024
+    LINE_SIZE = 76
+    STAGE_DIR = '/tmp/containercafe.{token}.upload'
+    EOF_MARKER = 'CC_EOF'   # Can't appear in base64
+
+    def __init__(self, connection, use_sftp=False):
+        self.connection = connection
+        self.use_sftp = use_sftp and self._sftp_client() is not None
+        self._remote_digests = dict()
+
+    def put_files(self, files):
+        """ Upload local files; files is a {remote_path: local_path} dict.
+
+        Returns the list of remote paths that actually had to be sent.
+        """
+        contents = dict()
+        for remote_path, local_path in files.items():
+            with open(local_path, 'rb') as local_file:
+                contents[remote_path] = local_file.read()
+        return self.put_data(contents)
+
+    def put_data(self, contents, force=False):
+        """ Upload in-memory data; contents is a {remote_path: bytes} dict.
+
+        Returns the list of remote paths that actually had to be sent. With
+        force, everything is sent, even files remembered as already there
+        (for files others may have removed from the host).
+        """
+        pending = self._pending(contents, force)
+        if not pending:
+            return list()
+
+        if self.use_sftp:
+            self._put_sftp(pending)
+        else:
+            self._put_shell(pending)
+        return self._remember(pending)
+
+    def shell_upload(self, contents, force=False):
+        """ (cmds, pending) for callers running the upload themselves (e.g.
+        on an async connection): cmds are to be run in order, stopping at
+        the first failure, and are empty when there is nothing to send.
+        Once the last one succeeded, hand pending to sent(). """
+        pending = self._pending(contents, force)
+        if not pending:
+            return list(), pending
+        return self._shell_cmds(pending), pending
+
+    def sent(self, pending):
+        """ Remember the files of a shell_upload() as sent """
+        return self._remember(pending)
+
+    def sync_digests(self, remote_paths):
+        """ Learn (in one round trip) which files the host already has """
+        cmd = 'sha256sum {paths} 2>/dev/null'.format(
+            paths=' '.join(quote(path) for path in remote_paths))
+        result = self.connection.execute(cmd=cmd)
+        for line in result.text.splitlines():
+            digest, _, path = line.partition('  ')
+            if path:
+                self._remote_digests[path] = digest
+
+    def forget(self, prefix):
+        """ Drop remembered digests for remote paths under prefix """
+        for remote_path in list(self._remote_digests):
+            if remote_path.startswith(prefix):
+                del self._remote_digests[remote_path]
+
+    def _pending(self, contents, force=False):
+        """ [(remote_path, bytes, digest)] of the contents not yet sent """
+        pending = list()
+        for remote_path in sorted(contents):
+            data = contents[remote_path]
+            if not isinstance(data, bytes):
+                data = data.encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            if force or self._remote_digests.get(remote_path) != digest:
+                pending.append((remote_path, data, digest))
+        return pending
+
+    def _remember(self, pending):
+        for remote_path, _, digest in pending:
+            self._remote_digests[remote_path] = digest
+        return [remote_path for remote_path, _, _ in pending]
+
+    # Transports
+    # ----------------------------------------------------
+    def _put_shell(self, pending):
+        for cmd in self._shell_cmds(pending):
+            result = self.connection.execute(cmd=cmd)
+            if result.returncode != 0:
+                raise TransferError(
+                    result=result, paths=[path for path, _, _ in pending])
+
+    def _shell_cmds(self, pending):
+        """ Shell commands appending the payload to a staging directory, the
+        last of which also unpacks, verifies and renames into place. Any
+        failing command removes the staging directory. """
+        token = uuid.uuid4().hex
+        stage = quote(self.STAGE_DIR.format(token=token))
+        payload = self._pack(pending)
+        chunks = [payload[start:start + self.CHUNK_SIZE]
+                  for start in range(0, len(payload), self.CHUNK_SIZE)]
+
+        cmds = list()
+        for chunk in chunks[:-1]:
+            cmds.append('sh -c {script}'.format(script=quote('\n'.join([
+                'stage={stage}'.format(stage=stage),
+                self._append(chunk, 'mkdir -p -m 700 "$stage" && {cat} || '
+                                    '{{ rm -rf "$stage"; exit 1; }}')]))))
+        cmds.append(self._shell_cmd(pending, stage, token, chunks[-1]))
+        return cmds
+
+    def _append(self, chunk, line='{cat}'):
+        """ Append a base64 chunk to the staged payload. line is the command
+        line running {cat}; the chunk follows it as a here-document of
+        short lines. """
+        lines = [chunk[start:start + self.LINE_SIZE]
+                 for start in range(0, len(chunk), self.LINE_SIZE)]
+        cat = "cat >> \"$stage/payload\" <<'{eof}'".format(
+            eof=self.EOF_MARKER)
+        return '\n'.join([line.format(cat=cat)] + lines + [self.EOF_MARKER])
+
+    def _shell_cmd(self, pending, stage, token, chunk):
+        """ The last command: unpack, verify, then rename into place """
+        steps = ['set -e',
+                 'stage={stage}'.format(stage=stage),
+                 'trap \'rm -rf "$stage"\' EXIT',
+                 'mkdir -p -m 700 "$stage"',
+                 self._append(chunk),
+                 'base64 -d < "$stage/payload" | tar -x -C "$stage"',
+                 'cd "$stage"',
+                 'printf "%s\\n" {sums} | sha256sum -c --status'.format(
+                     sums=' '.join(
+                         quote('{digest}  {index}'.format(
+                             digest=digest, index=index))
+                         for index, (_, _, digest) in enumerate(pending)))]
+
+        for index, (remote_path, _, _) in enumerate(pending):
+            staged = '{path}.{token}.tmp'.format(path=remote_path, token=token)
+            steps.append('mkdir -p {dir}'.format(
+                dir=quote(posixpath.dirname(remote_path) or '.')))
+            steps.append('cp {index} {staged}'.format(
+                index=index, staged=quote(staged)))
+            steps.append('mv -f {staged} {path}'.format(
+                staged=quote(staged), path=quote(remote_path)))
+
+        return 'sh -c {script}'.format(script=quote('\n'.join(steps)))
+
+    def _put_sftp(self, pending):
+        """ Upload to a temp name per file and rename it into place """
+        dirs = sorted(set(posixpath.dirname(path) or '.'
+                          for path, _, _ in pending))
+        self.connection.execute(cmd='mkdir -p {dirs}'.format(
+            dirs=' '.join(quote(path) for path in dirs)))
+
+        token = uuid.uuid4().hex
+        sftp = self._sftp_client().open_sftp()
+        try:
+            for remote_path, data, _ in pending:
+                staged = '{path}.{token}.tmp'.format(
+                    path=remote_path, token=token)
+                attrs = sftp.putfo(io.BytesIO(data), staged)
+                if attrs.st_size != len(data):
+                    sftp.remove(staged)
+                    raise TransferError(result=attrs, paths=[remote_path])
+                sftp.posix_rename(staged, remote_path)
+        finally:
+            sftp.close()
+
+    def _sftp_client(self):
+        ssh_connection = getattr(self.connection, 'ssh_connection', None)
+        if hasattr(ssh_connection, 'open_sftp'):
+            return ssh_connection
+        return None
+
+    @classmethod
+    def _pack(cls, pending):
+        """ Build the base64 tar payload (members are named by index) """
+        buf = io.BytesIO()
+        archive = tarfile.open(fileobj=buf, mode='w')
+        try:
+            for index, (_, data, _) in enumerate(pending):
+                info = tarfile.TarInfo(name=str(index))
+                info.size = len(data)
+                info.mode = 0o644
+                archive.addfile(info, io.BytesIO(data))
+        finally:
+            archive.close()
+        return base64.b64encode(buf.getvalue()).decode('ascii')
+
+
+def transfer_for(connection):
+    """ Return the FileTransfer bound to connection (created on first use).
+
+    For a pooled lease, that is the transfer of the leased connection, so
+    it stays usable (and its digests valid) for the connection's next lease.
+    """
+    connection = underlying(connection)
+    transfer = getattr(connection, 'transfer', None)
+    if not isinstance(transfer, FileTransfer):
+        transfer = FileTransfer(connection)
+        connection.transfer = transfer
+    return transfer
@@ -19,12 +19,21 @@ Purpose: Given a container technology (LXC, libContainer) and a connection type
 
 """
 
-# Containers
+import atexit
+import logging
+
+# Containers (backends are imported from the registry when first used)
+from ..clients.cache import ProbeCache
 from ..clients.host import HostContainerClient
-from ...lxc.client import LxcContainer
+from ..registry import CONNECTORS, CONTAINER_TYPES
 
 # Connections
-from cafe.engine.ssh.client import BaseSSHClient
+from ..connectors.pool import ConnectionPool
+from ..connectors.ssh import UnableToConnect, close_ssh, open_ssh
+from ..metrics import METRICS
+from .scheduler import HostScheduler
+
+LOG = logging.getLogger(__name__)
 
 
 class UnknownContainerType(Exception):
@@ -48,14 +57,6 @@ class UnknownClientAPI(Exception):
         self.message = 'Unrecognized client API: {api}'.format(api=api_name)
 
 
-class UnableToConnect(Exception):
-    def __init__(self, ip, port, user, pswd):
-        super(UnableToConnect, self).__init__()
-        self.message = ('Unable to reach/connect to {ip}:{port} as '
-                        '{user}/{pswd}'.format(ip=ip, port=port, user=user,
-                                               pswd=pswd))
-
-
 class BuildContainerClient(object):
 
     # Set to TRUE if the container cannot be reached externally
@@ -70,31 +71,49 @@ class BuildContainerClient(object):
     HOST_TO_CONTAINER = 'host_to_container'  # ssh to host
     CONTAINER = 'container'                  # ssh to container
 
-    # ContainerType and ConnectionType class registrations
-    CONTAINER_TYPES = [LXC]
-    CONTAINER_CLASS = {HOST: {LXC: HostContainerClient},
-                       HOST_TO_CONTAINER: {LXC: LxcContainer},
-                       LOCAL: {LXC: HostContainerClient},
-                       CONTAINER: {LXC: HostContainerClient}}
+    # ContainerType and ConnectionType class registrations: clients of
+    # HOST_TO_CONTAINER targets by container type (lxc, plus any installed
+    # under the containercafe.container_types entry point); every other
+    # target is driven through the host client
+    CONTAINER_TYPES = CONTAINER_TYPES
+    CONNECTORS = CONNECTORS
+    CONTAINER_TARGETS = [HOST_TO_CONTAINER]
 
     # Miscellaneous Constants
     TARGET_TYPES = [HOST, HOST_TO_CONTAINER, LOCAL, CONTAINER]
     RC_FILE = 'rc_file'
 
+    # SSH connections shared by every factory, keyed by (ip, port, user)
+    CONNECTION_POOL = None
+
+    # Placement of containers across the container hosts (shared as well)
+    SCHEDULER = None
+
+    # Results of pure (read-only) commands, shared by every client
+    PROBE_CACHE = None
+
+    # Hosts tunnelled through to reach isolated containers, keyed by
+    # (ip, port, user); every tunnel to a host shares its one connection
+    JUMP_HOSTS = dict()
+
     def __init__(self, container_type, test_ref_point,
                  test_config, container_config, container_name,
                  rc_file=None, username=None, password=None,
                  port=None, clean=True):
         self.container_name = container_name
         self.container_type = container_type
-        self.container_config = container_config
+
+        # Parse/validate the config once; fields are plain attributes after
+        self.container_config = self.load_config(container_config)
         self.test_ref_point = test_ref_point    # HOST OR CONTAINER
         self.test_config = test_config
         self.rc_file = rc_file
         self.username = username
         self.password = password
         self.port = port or self.container_config.host_port
+        self._port_override = port
         self.clean = clean
+        self._enable_metrics(self.container_config)
 
         self.type_ = 'host'
         if not self.ISOLATED_CONTAINER:
@@ -109,14 +128,21 @@ class BuildContainerClient(object):
             self.password = getattr(
                 self.container_config, '{0}_password'.format(self.type_))
 
+        self.target_ip = getattr(
+            self.container_config, '{0}_ip'.format(self.type_))
+
     def get_client(self, container_type=None, test_ref_point=None,
                    clean=None, container_name=None, username=None,
-                   password=None, port=None):
+                   password=None, port=None, on_host_of=None):
+        """ on_host_of: a client placed by the scheduler; host-side clients
+        then connect to the host it was placed on (e.g. to inspect the host
+        running that test's container) instead of host_ip. """
 
         # Use values provided or use factory defaults
         container_type = container_type or self.container_type
         test_ref_point = test_ref_point or self.test_ref_point
         container_name = container_name or self.container_name
+        requested_port = port or self._port_override
         port = port or self.port
         username = username or self.username
         password = password or self.password
@@ -132,53 +158,71 @@ class BuildContainerClient(object):
                                     types_list=self.TARGET_TYPES)
 
         # Get the corresponding container and connection type
-        cntnr_cls = self.CONTAINER_CLASS[self.test_ref_point][container_type]
-        target_type_ip = getattr(self.container_config, '{0}_ip'.format(
-            self.type_))
-
-        # Verify connection_info is correct...
-        if True:
-            print ""
-            print "CONTAINER_TYPE:", container_type
-            print "REFERENCE TYPE:", test_ref_point
-            print "CONTAINER CLASS: ", cntnr_cls
-            print "TYPE_:", self.type_
-            print "CONN TARGET: {user}@{ip}:{port} --> '{pswd}'".format(
-                ip=target_type_ip, port=port, user=username, pswd=password)
-            print ""
-
-        # Create a common alias between clients: client.execute = reference to
-        # function used for executing command based on the type of connection.
-        connection = BaseSSHClient(target_type_ip)
-        connection.connect(username=username, password=password, port=port)
-        if connection.ssh_connection is None:
-            raise UnableToConnect(ip=target_type_ip, port=port, user=username,
-                                  pswd=password)
-        connection.start_shell()
-        connection.execute = connection.execute_shell_command
-        connection.close = connection.end_shell
-
-        # For now, if connecting to the container, connect to the VM (host),
-        # then ssh from the host to the container. Eventually, this will not
-        # be needed, when the container is publicly reachable (not isolated
-        # within a private VM)
-        if (self.test_ref_point == self.CONTAINER and
-                self.ISOLATED_CONTAINER):
-            connected = self._connect_to_container_through_host(
-                connection=connection)
-            if not connected:
-                return None
+        cntnr_cls = self.container_class(self.test_ref_point, container_type)
+        target_type_ip = self.target_ip
+
+        # Containers live on the host: let the scheduler pick which one.
+        # Host-side clients aren't containers: they don't take a slot, and
+        # only follow a container's placement when asked to.
+        placement = None
+        host = None
+        if self.test_ref_point == self.HOST_TO_CONTAINER:
+            placement = self.get_scheduler(self.container_config).place()
+            host = placement.host
+        elif self.type_ == self.HOST and on_host_of is not None:
+            host_placement = getattr(on_host_of, 'placement', None)
+            host = host_placement.host if host_placement else None
+        if host is not None:
+            target_type_ip = host.ip
+            port = requested_port or host.port
+
+        LOG.debug('%s client (%s) for %s, type %s: %s@%s:%s',
+                  container_type, cntnr_cls.__name__, test_ref_point,
+                  self.type_, username, target_type_ip, port)
+
+        connection = None
+        try:
+            # For now, if connecting to the container, tunnel to it through
+            # the VM (host). Eventually, this will not be needed, when the
+            # container is publicly reachable (not isolated within a
+            # private VM)
+            if (self.test_ref_point == self.CONTAINER and
+                    self.ISOLATED_CONTAINER):
+                connection = self._connect_to_container_through_host(
+                    ip=target_type_ip, port=port, username=username,
+                    password=password)
+            else:
+                # Lease a connection (reusing an idle one to the same target
+                # when possible); closing it returns it to the pool.
+                connection = self.get_connection_pool(
+                    self.container_config).acquire(
+                        ip=target_type_ip, port=port, username=username,
+                        password=password)
+        finally:
+            if connection is None and placement is not None:
+                placement.release()
 
         # Instantiate the container client
         container_client = cntnr_cls(name=container_name,
                                      connection=connection,
                                      clean=clean, **kwargs)
+        container_client.placement = placement
+        container_client.probe_cache = self.get_probe_cache(
+            self.container_config)
 
         # LXC directives are slow to execute. They return, but the cmd may not
-        # have fully executed on the host yet, so a delay can be introduced
+        # have fully executed on the host yet. Either poll the host until each
+        # command's post-condition holds, or (legacy) introduce a fixed delay
         # between command executions.
-        if isinstance(container_client, LxcContainer):
+        if isinstance(container_client, self.CONTAINER_TYPES.load(self.LXC)):
             container_client.cmd_delay = self.container_config.lxc_cmd_delay
+            container_client.verify_completion = (
+                self.container_config.lxc_verify_completion)
+            container_client.poll_timeout = (
+                self.container_config.lxc_poll_timeout)
+            container_client.poll_interval = (
+                self.container_config.lxc_poll_interval)
+            container_client.state_ttl = self.container_config.lxc_state_ttl
 
         # Store the client's test_reference_point: some tests require to be
         # executed from a specific container-context
@@ -186,29 +230,141 @@ class BuildContainerClient(object):
 
         return container_client
 
-    def _connect_to_container_through_host(self, connection):
+    @classmethod
+    def load_config(cls, container_config=None):
+        """ ContainersSetupSnapshot of container_config. The config module
+        is only imported here: it pulls in cafe (and setuptools with it),
+        which is slow to import. """
+        from ..config import ContainersSetupSnapshot
+        return ContainersSetupSnapshot.load(container_config)
+
+    @classmethod
+    def container_class(cls, test_ref_point, container_type):
+        """ Client class for a target and container type """
+        if test_ref_point in cls.CONTAINER_TARGETS:
+            return cls.CONTAINER_TYPES.load(container_type)
+        return HostContainerClient
+
+    @classmethod
+    def get_connection_pool(cls, container_config):
+        if cls.CONNECTION_POOL is None:
+            cls.CONNECTION_POOL = ConnectionPool(
+                connect=cls._open_connection, close=cls._close_connection,
+                max_size=container_config.ssh_pool_size,
+                idle_ttl=container_config.ssh_pool_idle_ttl)
+        return cls.CONNECTION_POOL
+
+    @classmethod
+    def get_scheduler(cls, container_config):
+        if cls.SCHEDULER is None:
+            cls.SCHEDULER = HostScheduler.from_config(container_config)
+        return cls.SCHEDULER
+
+    @classmethod
+    def get_probe_cache(cls, container_config):
+        # Opt-in: no cache unless probe_cache_ttl is set
+        if cls.PROBE_CACHE is None and container_config.probe_cache_ttl > 0:
+            cls.PROBE_CACHE = ProbeCache(
+                ttl=container_config.probe_cache_ttl,
+                max_entries=container_config.probe_cache_size)
+        return cls.PROBE_CACHE
+
+    @classmethod
+    def _enable_metrics(cls, container_config):
+        # Turn on latency instrumentation (once) and dump it at exit
+        if container_config.metrics_enabled and not METRICS.enabled:
+            METRICS.enabled = True
+            atexit.register(METRICS.dump, container_config.metrics_dir)
+
+    @classmethod
+    def sweep(cls, container_config=None, prefixes=None):
+        """ Tear down leftover containers whose names start with one of
+        prefixes (default: the configured sweep_prefixes), and their config
+        workspaces, on every container host.
+
+        Nothing is swept implicitly: call this from a suite's setUpClass
+        and/or tearDownClass, with prefixes only that suite's containers
+        use. A host that can't be swept is logged and skipped. Returns the
+        SweepReports of the hosts swept.
+        """
+        container_config = cls.load_config(container_config)
+        prefixes = tuple(prefixes or container_config.sweep_prefixes)
+        if not prefixes:
+            return list()
+
+        from ...lxc.sweeper import ContainerSweeper
+
+        reports = list()
+        for host in cls.get_scheduler(container_config).hosts:
+            sweeper = ContainerSweeper(
+                connect=cls._host_connector(container_config, host),
+                max_workers=container_config.ssh_pool_size)
+            try:
+                report = sweeper.sweep(*prefixes)
+            except Exception:
+                LOG.exception('Unable to sweep %s:%s', host.ip, host.port)
+                continue
+            if not report.ok:
+                LOG.warning('Containers left on %s:%s: %s',
+                            host.ip, host.port, report.failed)
+            reports.append(report)
+        return reports
+
+    @classmethod
+    def _host_connector(cls, container_config, host):
+        """ Function leasing a pooled connection to a container host """
+        pool = cls.get_connection_pool(container_config)
+
+        def connect():
+            return pool.acquire(host.ip, host.port,
+                                container_config.host_username,
+                                container_config.host_password)
+        return connect
+
+    @classmethod
+    def _open_connection(cls, ip, port, username, password):
+        return open_ssh(ip=ip, port=port, username=username,
+                        password=password, connectors=cls.CONNECTORS)
+
+    @classmethod
+    def _close_connection(cls, connection):
+        close_ssh(connection)
+
+    def _connect_to_container_through_host(self, ip, port, username,
+                                           password):
+        """ Connection to the container, tunnelled through its host
+        (UnableToConnect if it can't be reached) """
+        from ..connectors.jump import JumpConnectError
         wait_for = 10  # Seconds
-        success = None
-
-        container_ip = self.container_config.container_ip
-        container_user = self.container_config.container_username
-        container_pswd = self.container_config.container_password
-
-        ssh_cmd = 'ssh {user}@{ip}'.format(user=container_user,
-                                           ip=container_ip)
-        login = connection.execute_shell_command(cmd=ssh_cmd, prompt=':',
-                                                 timeout=wait_for)
-        if login.stderr is not None:
-            print "SSH TO CONTAINER ERR:", login.stderr
-            success = False
-
-        auth = connection.execute_shell_command(cmd=container_pswd,
-                                                timeout=wait_for)
-        if auth.stderr is not None:
-            print "AUTHENTICATE TO CONTAINER ERR:", login.stderr
-            success = False
-
-        if success is None:
-            success = True
-
-        return success
+
+        jump_host = self.get_jump_host(ip, port, username, password)
+        try:
+            return jump_host.connect(
+                ip=self.container_config.container_ip,
+                username=self.container_config.container_username,
+                password=self.container_config.container_password,
+                timeout=wait_for)
+        except (JumpConnectError, UnableToConnect) as err:
+            raise UnableToConnect(
+                ip=self.container_config.container_ip, port=22,
+                user=self.container_config.container_username,
+                pswd=self.container_config.container_password, error=err)
+
+    @classmethod
+    def get_jump_host(cls, ip, port, username, password):
+        key = (ip, port, username)
+        jump_host = cls.JUMP_HOSTS.get(key)
+        if jump_host is None:
+            if not cls.JUMP_HOSTS:
+                atexit.register(cls._close_jump_hosts)
+            jump_host = cls.JUMP_HOSTS[key] = cls.CONNECTORS.load('jump')(
+                connect=lambda: cls._open_connection(
+                    ip=ip, port=port, username=username, password=password),
+                close=cls._close_connection,
+                name='{ip}:{port}'.format(ip=ip, port=port))
+        return jump_host
+
+    @classmethod
+    def _close_jump_hosts(cls):
+        for jump_host in cls.JUMP_HOSTS.values():
+            jump_host.close()
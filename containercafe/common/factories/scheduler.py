@@ -0,0 +1,198 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Spread containers across several container hosts. The scheduler
+        counts the live containers it placed on each host; a placement is
+        released when its client is cleaned up.
+
+"""
+
+import threading
+
+
+class UnknownPlacementPolicy(Exception):
+    def __init__(self, policy, policies, **kwargs):
+        super(UnknownPlacementPolicy, self).__init__(**kwargs)
+        self.message = ('Unrecognized placement policy: {policy} '
+                        '[{policies}]'.format(policy=policy,
+                                              policies=', '.join(policies)))
+
+    def __str__(self):
+        return self.message
+
+
+class InvalidHostSpec(Exception):
+    def __init__(self, spec, **kwargs):
+        super(InvalidHostSpec, self).__init__(**kwargs)
+        self.message = ('Invalid container host "{spec}" (expected '
+                        'ip[:port][@capacity])'.format(spec=spec))
+
+    def __str__(self):
+        return self.message
+
+
+class NoHostAvailable(Exception):
+    def __init__(self, hosts, **kwargs):
+        super(NoHostAvailable, self).__init__(**kwargs)
+        self.message = 'Every container host is at capacity: {hosts}'.format(
+            hosts=', '.join(str(host) for host in hosts))
+
+    def __str__(self):
+        return self.message
+
+
+class ContainerHost(object):
+    """ A host containers can be placed on; capacity None is unbounded """
+
+    def __init__(self, ip, port=22, capacity=None):
+        self.ip = ip
+        self.port = port
+        self.capacity = capacity
+        self.live = 0
+        self.placed = 0
+
+    def __str__(self):
+        return '{ip}:{port} ({live}/{capacity})'.format(
+            ip=self.ip, port=self.port, live=self.live,
+            capacity='-' if self.capacity is None else self.capacity)
+
+    @property
+    def label(self):
+        return '{ip}:{port}'.format(ip=self.ip, port=self.port)
+
+    @property
+    def full(self):
+        return self.capacity is not None and self.live >= self.capacity
+
+    @property
+    def to_dict(self):
+        return {"ip": self.ip,
+                "port": self.port,
+                "capacity": self.capacity,
+                "live": self.live,
+                "placed": self.placed}
+
+    @classmethod
+    def parse(cls, spec, default_port=22):
+        """ ContainerHost from 'ip[:port][@capacity]' """
+        address, _, capacity = spec.strip().partition('@')
+        ip, _, port = address.partition(':')
+        try:
+            port = int(port) if port else default_port
+            capacity = int(capacity) if capacity else None
+        except ValueError:
+            raise InvalidHostSpec(spec=spec)
+        if not ip or (capacity is not None and capacity < 1):
+            raise InvalidHostSpec(spec=spec)
+        return cls(ip=ip, port=port, capacity=capacity)
+
+
+class Placement(object):
+    """ One container's slot on a host; release() frees it (once) """
+
+    def __init__(self, scheduler, host):
+        self.scheduler = scheduler
+        self.host = host
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.scheduler.release(self.host)
+
+
+class HostScheduler(object):
+    """ Choose the host for each new container.
+
+    least_loaded:      fewest live containers
+    round_robin:       each host in turn, whatever its load
+    capacity_weighted: lowest live/capacity ratio after placing, so hosts
+                       fill in proportion to their capacity (a host
+                       without a capacity weighs 1)
+
+    Full hosts are skipped by every policy; ties go to the host that was
+    least recently chosen.
+    """
+
+    LEAST_LOADED = 'least_loaded'
+    ROUND_ROBIN = 'round_robin'
+    CAPACITY_WEIGHTED = 'capacity_weighted'
+    POLICIES = [LEAST_LOADED, ROUND_ROBIN, CAPACITY_WEIGHTED]
+
+    def __init__(self, hosts, policy=LEAST_LOADED):
+        if policy not in self.POLICIES:
+            raise UnknownPlacementPolicy(policy=policy,
+                                         policies=self.POLICIES)
+        if not hosts:
+            raise ValueError('HostScheduler needs at least one host')
+        self.hosts = list(hosts)
+        self.policy = policy
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def place(self):
+        """ Reserve a slot on the policy's host; returns its Placement """
+        with self._lock:
+            host = getattr(self, '_' + self.policy)()
+            if host is None:
+                raise NoHostAvailable(hosts=self.hosts)
+            self._next = (self.hosts.index(host) + 1) % len(self.hosts)
+            host.live += 1
+            host.placed += 1
+        return Placement(self, host)
+
+    def release(self, host):
+        with self._lock:
+            host.live = max(host.live - 1, 0)
+
+    @property
+    def counts(self):
+        """ {host label: live containers} """
+        with self._lock:
+            return dict((host.label, host.live) for host in self.hosts)
+
+    # Policies: pick a host (or None), with self._lock held
+    # ----------------------------------------------------
+    def _rotation(self):
+        """ Hosts with room, least recently chosen first """
+        rotated = self.hosts[self._next:] + self.hosts[:self._next]
+        return [host for host in rotated if not host.full]
+
+    def _least_loaded(self):
+        candidates = self._rotation()
+        if not candidates:
+            return None
+        return min(candidates, key=lambda host: host.live)
+
+    def _round_robin(self):
+        candidates = self._rotation()
+        return candidates[0] if candidates else None
+
+    def _capacity_weighted(self):
+        candidates = self._rotation()
+        if not candidates:
+            return None
+        return min(candidates, key=lambda host: (
+            (host.live + 1) / float(host.capacity or 1)))
+
+    @classmethod
+    def from_config(cls, container_config):
+        """ Scheduler over the configured container_hosts (or host_ip) """
+        specs = container_config.container_hosts or (
+            '{ip}:{port}'.format(ip=container_config.host_ip,
+                                 port=container_config.host_port),)
+        hosts = [ContainerHost.parse(spec, container_config.host_port)
+                 for spec in specs]
+        return cls(hosts=hosts, policy=container_config.placement_policy)
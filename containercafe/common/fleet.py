@@ -0,0 +1,193 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Drive the lifecycles of many containers concurrently. Work is
+        grouped per host; each host gets at most per_host_limit workers and
+        the whole fleet at most max_workers, so a slow container (or host)
+        only holds up its own worker.
+
+"""
+
+import threading
+import time
+from collections import deque
+
+from .states import State
+
+
+class LifecycleError(Exception):
+    def __init__(self, name, step, result, **kwargs):
+        super(LifecycleError, self).__init__(**kwargs)
+        self.result = result
+        self.message = 'Container {name}: {step} failed ({result})'.format(
+            name=name, step=step, result=result)
+
+    def __str__(self):
+        return self.message
+
+
+class FleetResult(object):
+    """ Outcome of one container's fleet operation """
+
+    def __init__(self, name, client=None, error=None, elapsed=0.0):
+        self.name = name
+        self.client = client
+        self.error = error
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return str(self.to_dict)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def to_dict(self):
+        return {"name": self.name,
+                "ok": self.ok,
+                "error": str(self.error) if self.error else None,
+                "elapsed": self.elapsed}
+
+
+class FleetResults(list):
+    """ FleetResults, in the order the containers were requested """
+
+    @property
+    def succeeded(self):
+        return [result for result in self if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self if not result.ok]
+
+    @property
+    def clients(self):
+        return [result.client for result in self if result.client is not None]
+
+
+def run_step(client, step, *args):
+    """ Call a lifecycle method, raising LifecycleError on a non-zero rc """
+    result = getattr(client, step)(*args)
+    if getattr(result, 'returncode', 0):
+        raise LifecycleError(name=client.name, step=step, result=result)
+    return result
+
+
+def connection_host(client):
+    """ Default host key: the (ip, port) of a pooled connection, or host """
+    connection = client.connection
+    key = getattr(connection, 'key', None)
+    if isinstance(key, tuple):
+        return key[:2]
+    return getattr(connection, 'host', None)
+
+
+class ContainerFleet(object):
+    """ Run many container lifecycles concurrently with bounded parallelism
+
+    client_factory(name, preset_cfg) must return a client with its own
+    connection: an interactive shell can only run one command at a time, so
+    clients on the same host should lease separate connections from the
+    pool (per_host_limit therefore also bounds connections per host).
+    """
+
+    def __init__(self, client_factory, max_workers=32, per_host_limit=8,
+                 host_key=connection_host):
+        self.client_factory = client_factory
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.host_key = host_key
+
+    def up(self, names, preset_cfg=None, preset_cfgs=None):
+        """ Create and start a container per name; preset_cfgs maps a name
+        to its preset config, preset_cfg is used for the rest. """
+        preset_cfgs = preset_cfgs or dict()
+        results = FleetResults()
+        for name in names:
+            try:
+                client = self.client_factory(
+                    name, preset_cfgs.get(name, preset_cfg))
+                results.append(FleetResult(name=name, client=client))
+            except Exception as err:
+                results.append(FleetResult(name=name, error=err))
+
+        return self._run(self.bring_up, results)
+
+    def down(self, clients):
+        """ Stop, destroy and clean up the given clients """
+        results = FleetResults(
+            FleetResult(name=client.name, client=client) for client in clients)
+        return self._run(self.tear_down, results)
+
+    def map(self, func, clients):
+        """ Call func(client) for every client, in parallel """
+        results = FleetResults(
+            FleetResult(name=client.name, client=client) for client in clients)
+        return self._run(func, results)
+
+    @classmethod
+    def bring_up(cls, client):
+        run_step(client, 'create')
+        run_step(client, 'wait', client.STOPPED)
+        run_step(client, 'start')
+        run_step(client, 'wait', client.RUNNING)
+
+    @classmethod
+    def tear_down(cls, client):
+        try:
+            if client._state.value in (State.STARTED, State.RUNNING):
+                run_step(client, 'stop')
+                run_step(client, 'wait', client.STOPPED)
+        finally:
+            run_step(client, 'destroy')
+            client.clean()
+
+    def _run(self, func, results):
+        """ Apply func to each result's client, grouped per host """
+        queues = dict()
+        for result in results:
+            if result.ok:
+                queues.setdefault(
+                    self.host_key(result.client), deque()).append(result)
+
+        fleet_slots = threading.BoundedSemaphore(self.max_workers)
+
+        def _worker(queue):
+            while True:
+                try:
+                    result = queue.popleft()
+                except IndexError:
+                    return
+
+                with fleet_slots:
+                    started = time.time()
+                    try:
+                        func(result.client)
+                    except Exception as err:
+                        result.error = err
+                    result.elapsed = time.time() - started
+
+        workers = list()
+        for queue in queues.values():
+            for _ in range(min(self.per_host_limit, len(queue))):
+                worker = threading.Thread(target=_worker, args=(queue,))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+        return results
@@ -0,0 +1,208 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Per-host latency of every command and lifecycle phase, kept in
+        fixed-bucket histograms and exported as JSON or Prometheus text.
+        Instrumentation is off by default; when off, an instrumented call
+        costs one attribute check.
+
+"""
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Histogram(object):
+    """ Fixed-bucket histogram of durations (seconds) """
+
+    __slots__ = ('counts', 'count', 'total', 'low', 'high')
+
+    # Upper bounds of the buckets; anything larger lands in the last bucket
+    BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+              0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.low = None
+        self.high = None
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.low is None or seconds < self.low:
+            self.low = seconds
+        if self.high is None or seconds > self.high:
+            self.high = seconds
+
+    def quantile(self, q):
+        """ Estimate the q-quantile by interpolating within its bucket
+        (clamped to the smallest/largest value observed) """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = max(self.BOUNDS[index - 1] if index else 0.0,
+                            self.low)
+                upper = min(self.BOUNDS[index] if index < len(self.BOUNDS)
+                            else self.high, self.high)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.high
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    __slots__ = ('metrics', 'phase', 'host', 'started')
+
+    def __init__(self, metrics, phase, host):
+        self.metrics = metrics
+        self.phase = phase
+        self.host = host
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.phase, self.host, time.time() - self.started)
+        return False
+
+
+class Metrics(object):
+    """ Registry of per-(host, phase) latency histograms """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+    PROMETHEUS_NAME = 'containercafe_phase_seconds'
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, phase, host, seconds):
+        key = (str(host), phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, phase, connection):
+        """ Context manager timing its body against the connection's host
+        (a no-op when disabled) """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, phase, host_label(connection))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def summary(self):
+        """ {host: {phase: {count, sum, p50, p95, p99}}} """
+        with self._lock:
+            items = sorted(self._histograms.items())
+
+        summary = dict()
+        for (host, phase), histogram in items:
+            stats = {'count': histogram.count, 'sum': histogram.total}
+            for q in self.QUANTILES:
+                stats['p{0:g}'.format(q * 100)] = histogram.quantile(q)
+            summary.setdefault(host, dict())[phase] = stats
+        return summary
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """ Prometheus text exposition format (one summary per host/phase) """
+        name = self.PROMETHEUS_NAME
+        lines = ['# HELP {name} containercafe command/phase latency'.format(
+                 name=name),
+                 '# TYPE {name} summary'.format(name=name)]
+
+        for host, phases in sorted(self.summary().items()):
+            for phase, stats in sorted(phases.items()):
+                labels = 'host="{host}",phase="{phase}"'.format(
+                    host=self._escape(host), phase=self._escape(phase))
+                for q in self.QUANTILES:
+                    lines.append('{name}{{{labels},quantile="{q:g}"}} '
+                                 '{value:.6f}'.format(
+                                     name=name, labels=labels, q=q,
+                                     value=stats['p{0:g}'.format(q * 100)]))
+                lines.append('{name}_sum{{{labels}}} {value:.6f}'.format(
+                    name=name, labels=labels, value=stats['sum']))
+                lines.append('{name}_count{{{labels}}} {value}'.format(
+                    name=name, labels=labels, value=stats['count']))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, directory, basename='containercafe_metrics'):
+        """ Write <basename>.json and <basename>.prom into directory """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, basename)
+        with open(path + '.json', 'w') as json_out:
+            json_out.write(self.to_json())
+        with open(path + '.prom', 'w') as prom_out:
+            prom_out.write(self.to_prometheus())
+        return path
+
+    @classmethod
+    def _escape(cls, value):
+        return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+# Process-wide registry used by the clients
+METRICS = Metrics()
+
+
+def host_label(connection):
+    """ Host a connection points at: pooled key, SSH host, else 'local' """
+    key = getattr(connection, 'key', None)
+    if isinstance(key, tuple):
+        return '{0}:{1}'.format(*key[:2])
+    return getattr(connection, 'host', None) or 'local'
+
+
+def timed(phase):
+    """ Time a client method as phase, labelled with the client's host """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not METRICS.enabled:
+                return func(self, *args, **kwargs)
+            with _Timer(METRICS, phase, host_label(self.connection)):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
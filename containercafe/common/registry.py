@@ -0,0 +1,140 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Named plugins (container types, connectors) that are only
+        imported when first used. Besides the built-in ones, plugins are
+        discovered through setuptools entry points, so a package can add a
+        backend without touching the factory:
+
+    entry_points={'containercafe.container_types': [
+        'mytype = mypackage.client:MyContainerClient']}
+
+"""
+
+import importlib
+import threading
+
+CONTAINER_TYPES_GROUP = 'containercafe.container_types'
+CONNECTORS_GROUP = 'containercafe.connectors'
+
+
+class UnknownPlugin(Exception):
+    def __init__(self, group, name, names, **kwargs):
+        super(UnknownPlugin, self).__init__(**kwargs)
+        self.message = 'Unrecognized {group} plugin: {name} [{names}]'.format(
+            group=group, name=name, names=', '.join(names))
+
+    def __str__(self):
+        return self.message
+
+
+def import_target(target):
+    """ The object a 'package.module:attr.attr' reference names """
+    module_name, _, attrs = target.partition(':')
+    obj = importlib.import_module(module_name)
+    for attr in filter(None, attrs.split('.')):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def entry_points(group):
+    """ {name: 'module:attr'} of the installed entry points in group """
+    try:
+        from importlib import metadata
+    except ImportError:
+        # Python 2: setuptools (slow to import: only done on demand)
+        import pkg_resources
+        return dict(
+            (point.name, '{module}:{attrs}'.format(
+                module=point.module_name, attrs='.'.join(point.attrs)))
+            for point in pkg_resources.iter_entry_points(group))
+
+    points = metadata.entry_points()
+    if hasattr(points, 'select'):
+        points = points.select(group=group)
+    else:
+        points = points.get(group, ())
+    return dict((point.name, point.value) for point in points)
+
+
+class Registry(object):
+    """ Plugins of one entry point group, by name.
+
+    A plugin is registered as a 'module:attr' reference (imported on first
+    load) or as the object itself. Installed entry points are only looked
+    up when a name isn't registered, or when every name is asked for;
+    registered names win over discovered ones.
+    """
+
+    def __init__(self, group, builtins=None):
+        self.group = group
+        self._targets = dict(builtins or dict())
+        self._loaded = dict()
+        self._discovered = False
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        if name not in self._targets:
+            self._discover()
+        return name in self._targets
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def register(self, name, target):
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def names(self):
+        self._discover()
+        return sorted(self._targets)
+
+    def load(self, name):
+        """ The plugin registered as name, imported if need be """
+        loaded = self._loaded.get(name)
+        if loaded is not None:
+            return loaded
+
+        if name not in self:
+            raise UnknownPlugin(group=self.group, name=name,
+                                names=self.names())
+        target = self._targets[name]
+        if isinstance(target, str):
+            target = import_target(target)
+        with self._lock:
+            self._loaded[name] = target
+        return target
+
+    def _discover(self):
+        if self._discovered:
+            return
+        discovered = entry_points(self.group)
+        with self._lock:
+            for name, target in discovered.items():
+                self._targets.setdefault(name, target)
+            self._discovered = True
+
+
+# Container clients, by container type (the factory's HOST_TO_CONTAINER
+# clients; the other targets use the host client)
+CONTAINER_TYPES = Registry(CONTAINER_TYPES_GROUP, builtins={
+    'lxc': 'containercafe.lxc.client:LxcClient'})
+
+# Connection classes, by connection type
+CONNECTORS = Registry(CONNECTORS_GROUP, builtins={
+    'ssh': 'cafe.engine.ssh.client:BaseSSHClient',
+    'jump': 'containercafe.common.connectors.jump:JumpHost',
+    'local': 'containercafe.common.connectors.localhost:LocalHostClient'})
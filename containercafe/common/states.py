@@ -35,8 +35,10 @@ class State(object):
     def __str__(self):
         return 'State({})'.format(self.value)
 
+    STATES = (INITIAL, CREATED, STARTED, RUNNING, STOPPED, DESTROYED)
+
     def set_state(self, state):
-        if hasattr(self, state):
+        if state in self.STATES:
             self.value = state
         else:
             raise UnrecognizedState
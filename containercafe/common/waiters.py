@@ -0,0 +1,52 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+
+class WaitTimeout(Exception):
+    def __init__(self, description, timeout, **kwargs):
+        super(WaitTimeout, self).__init__(**kwargs)
+        self.message = 'Timed out after {timeout}s waiting for {desc}'.format(
+            timeout=timeout, desc=description)
+
+    def __str__(self):
+        return self.message
+
+
+def wait_for(condition, timeout, interval=0.05, max_interval=2.0,
+             backoff=2.0, description='condition', sleep=time.sleep,
+             clock=time.time):
+    """ Poll condition() until it returns a truthy value or time runs out.
+
+    The delay between polls starts at interval and grows by backoff up to
+    max_interval. The last poll never sleeps past the deadline. Returns the
+    truthy value produced by condition().
+    """
+    deadline = clock() + timeout
+    delay = interval
+
+    while True:
+        value = condition()
+        if value:
+            return value
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise WaitTimeout(description=description, timeout=timeout)
+
+        sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_interval)
@@ -0,0 +1,355 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: LxcClient with coroutine lifecycle methods (Python 3 only; import
+        on demand). The connection must be one of the async connections in
+        common.connectors.aio; many clients can then be driven concurrently
+        from a single event loop, e.g. with asyncio.gather().
+
+"""
+
+import asyncio
+import functools
+import time
+import uuid
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from ..common.connectors.aio import timed, wait_for
+from ..common.connectors.process import _SIMPLE_SUCCESS_CMD_RESULT
+from ..common.connectors.session import SentinelSession, open_channel
+from ..common.connectors.transfer import TransferError, transfer_for
+from ..common.metrics import METRICS
+from ..common.states import State
+from .client import LXCError, LxcClient
+from .hoststate import state_cache_for
+from .seccomp import policy_cache_for
+
+# Pending/in-flight lxc-ls refresh per HostStateCache: {started, task}
+_REFRESHES = dict()
+
+
+class AsyncLxcClient(LxcClient):
+    """ LxcClient whose lifecycle methods are coroutines """
+
+    async def _run(self, cmd, prompt=None, timeout=None, expect=None):
+        args = {'cmd': cmd}
+        if prompt is not None:
+            args['prompt'] = prompt
+        if timeout is not None:
+            args['timeout'] = int(timeout)
+
+        with METRICS.timer('command', self.connection):
+            output = await self.connection.execute(**args)
+
+        if expect is not None:
+            self._invalidate_probes()
+
+        self._verified_state = None
+        self._last_command = time.time()
+        if not self.verify_completion:
+            with METRICS.timer('cmd_delay', self.connection):
+                await asyncio.sleep(self.cmd_delay)
+        elif expect is not None and output.returncode == 0:
+            await self._verify(expect)
+        return output
+
+    @timed('verify')
+    async def _verify(self, expect):
+        condition = self.POST_CONDITIONS[expect]
+        observed = dict()
+
+        async def _holds():
+            observed['state'] = await self._query_state(since=time.time())
+            return condition(observed['state'])
+
+        description = 'LXC container {name} to be {expect}'.format(
+            name=self.name, expect=expect)
+        await wait_for(_holds, timeout=self.poll_timeout,
+                       interval=self.poll_interval,
+                       max_interval=self.poll_max_interval,
+                       description=description)
+        self._verified_state = observed['state']
+
+    async def _query_state(self, max_age=None, since=None):
+        cache = state_cache_for(self.connection)
+        if cache.stale(max_age, since):
+            await self._refresh_states(cache, since)
+        if cache.available:
+            return cache.cached_state(self.name)
+        return await self._info_state()
+
+    async def _refresh_states(self, cache, since):
+        """ Join the host's pending lxc-ls refresh (or one started after
+        since), else schedule one. A refresh is sent on the next loop
+        iteration, so every client polling until then shares it. """
+        refresh = _REFRESHES.get(id(cache))
+        if refresh is None or refresh['task'].done() or (
+                refresh['started'] is not None and since is not None and
+                refresh['started'] < since):
+            refresh = {'started': None}
+            refresh['task'] = asyncio.ensure_future(
+                self._refresh(cache, refresh))
+            _REFRESHES[id(cache)] = refresh
+        await asyncio.shield(refresh['task'])
+
+    async def _refresh(self, cache, refresh):
+        try:
+            await asyncio.sleep(0)
+            refresh['started'] = time.time()
+            result = await self.connection.execute(cmd=cache.LS_CMD)
+            cache.store(refresh['started'], result)
+        finally:
+            if _REFRESHES.get(id(cache)) is refresh:
+                del _REFRESHES[id(cache)]
+
+    async def _info_state(self):
+        exec_target = '{cmd} -n {name} -s'.format(
+            cmd=self.INFO_CMD, name=self.name)
+        return self._parse_info(
+            await self.connection.execute(cmd=exec_target))
+
+    async def reconcile(self):
+        return self._apply_host_state(await self._query_state(
+            max_age=self.state_ttl, since=self._last_command))
+
+    async def _check_state(self, *valid_states):
+        if self._state.value not in valid_states:
+            await self.reconcile()
+        if self._state.value not in valid_states:
+            err_msg = 'LXC State {state} is not valid.'.format(
+                state=self._state)
+            raise LXCError(err_msg)
+
+    @timed('create')
+    async def create(self):
+        cmd = self.CREATE_CMD
+        await self._check_state(State.INITIAL)
+        await self._generate_rcfile()
+
+        exec_target = '{cmd} -n {name} -f {rc_file}'.format(
+            name=self.name, rc_file=self.rc_file, cmd=cmd)
+
+        result = await self._run(cmd=exec_target, expect=self.EXISTS)
+        if result.returncode == 0:
+            self._requires_destroy = True
+            self._state.set_state(State.CREATED)
+        return result
+
+    @timed('start')
+    async def start(self):
+        cmd = self.START_CMD
+        await self._check_state(State.INITIAL, State.CREATED, State.STOPPED)
+        await self._generate_rcfile()
+
+        exec_target = '{cmd} -n {name} -f {rc_file}'.format(
+            name=self.name, rc_file=self.rc_file, cmd=cmd)
+
+        result = await self._run(cmd=exec_target, expect=self.RUNNING)
+        if result.returncode == 0:
+            self._state.value = State.STARTED
+            if self._verified_state == self.RUNNING:
+                self._state.value = State.RUNNING
+        return result
+
+    @timed('execute')
+    async def execute(self, user_cmd, pure=False, **kwargs):
+        cached = self._cached_probe(user_cmd, pure)
+        if cached is not None:
+            return cached
+
+        cmd = self.EXECUTE_CMD
+        await self._check_state(State.INITIAL, State.CREATED, State.STOPPED)
+        await self._generate_rcfile()
+
+        exec_target = self._format_cmd(
+            lxc_cmd=cmd, user_cmd=user_cmd, name=self.name,
+            rc_file=self.rc_file)
+        return self._store_probe(user_cmd, pure,
+                                 await self._run(cmd=exec_target, **kwargs))
+
+    @timed('execute_many')
+    async def execute_many(self, user_cmds, stop_on_failure=False,
+                           **kwargs):
+        cmd = self.EXECUTE_CMD
+        await self._check_state(State.INITIAL, State.CREATED, State.STOPPED)
+        await self._generate_rcfile()
+
+        sentinel = 'containercafe-{token}'.format(token=uuid.uuid4().hex)
+        script = self._format_batch(user_cmds, sentinel, stop_on_failure)
+        exec_target = self._format_cmd(
+            lxc_cmd=cmd, user_cmd='/bin/sh -c {script}'.format(
+                script=quote(script)),
+            name=self.name, rc_file=self.rc_file)
+
+        result = await self._run(cmd=exec_target, **kwargs)
+        return self._split_batch(result.text, sentinel)
+
+    async def attach(self, shell='/bin/sh'):
+        """ Persistent lxc-attach shell into the running container. The
+        session is blocking: it runs over the connection's sync side. """
+        await self._check_state(State.STARTED, State.RUNNING)
+        if self._attach_session is None:
+            connection = self.connection.sync
+            exec_target = '{cmd} -n {name} -- {shell}'.format(
+                cmd=self.ATTACH_CMD, name=self.name, shell=shell)
+            self._attach_session = SentinelSession(
+                open_channel=lambda: open_channel(connection, exec_target))
+        return self._attach_session
+
+    @timed('attach_execute')
+    async def attach_execute(self, user_cmd, timeout=None):
+        """ Run a command through the persistent attach session """
+        session = await self.attach()
+        return await asyncio.get_event_loop().run_in_executor(
+            None, functools.partial(session.execute, user_cmd,
+                                    timeout=timeout))
+
+    @timed('wait')
+    async def wait(self, states):
+        cmd = self.WAIT_CMD
+        await self._check_state(State.CREATED, State.STARTED, State.RUNNING,
+                                State.STOPPED)
+
+        if self.verify_completion and self._verified_state == states:
+            return _SIMPLE_SUCCESS_CMD_RESULT
+
+        exec_target = '{cmd} -n {name} -s {state}'.format(
+            name=self.name, state=states, cmd=cmd)
+        return await self._run(cmd=exec_target)
+
+    @timed('stop')
+    async def stop(self):
+        cmd = self.STOP_CMD
+        await self._check_state(State.STARTED, State.RUNNING)
+        exec_target = '{cmd} -n {name}'.format(name=self.name, cmd=cmd)
+
+        self._close_attach_session()
+
+        result = await self._run(cmd=exec_target, expect=self.STOPPED)
+        if result.returncode == 0:
+            self._state.value = State.STOPPED
+        return result
+
+    @timed('destroy')
+    async def destroy(self):
+        cmd = self.DESTROY_CMD
+        result = _SIMPLE_SUCCESS_CMD_RESULT
+
+        if self._requires_destroy:
+            await self._check_state(State.CREATED, State.STOPPED)
+            exec_target = '{cmd} -n {name}'.format(name=self.name, cmd=cmd)
+
+            result = await self._run(cmd=exec_target, expect=self.GONE)
+            if result.returncode == 0:
+                self._requires_destroy = False
+                self._state.set_state(State.DESTROYED)
+        return result
+
+    @timed('snapshot')
+    async def snapshot(self):
+        cmd = self.SNAPSHOT_CMD
+        await self._check_state(State.CREATED, State.STOPPED)
+        exec_target = '{cmd} -n {name}'.format(name=self.name, cmd=cmd)
+        return await self._run(cmd=exec_target)
+
+    @timed('restore')
+    async def restore(self, snapshot='snap0'):
+        cmd = self.SNAPSHOT_CMD
+        await self._check_state(State.CREATED, State.STOPPED)
+        exec_target = '{cmd} -n {name} -r {snapshot}'.format(
+            name=self.name, cmd=cmd, snapshot=snapshot)
+        return await self._run(cmd=exec_target, expect=self.STOPPED)
+
+    @timed('clean')
+    async def clean(self):
+        self._close_attach_session()
+        if self.clean_container:
+            await self.destroy()
+            await self._remove_tmpdir()
+        self._release_connection()
+
+    async def _remove_tmpdir(self):
+        if self._tmpdir is None:
+            return
+        await self.connection.execute(cmd='rm -rf {path}'.format(
+            path=quote(self._tmpdir)))
+        transfer_for(self.connection).forget(self._tmpdir)
+        self._tmpdir = None
+        self._config_dirty = True
+
+    @timed('rcfile_upload')
+    async def _generate_rcfile(self):
+        # Policies are shared per host and rarely written: the (blocking)
+        # policy cache runs in the executor, over the blocking connection
+        seccomp = None
+        if len(self._syscall_whitelist) > 0:
+            seccomp = await asyncio.get_event_loop().run_in_executor(
+                None, policy_cache_for(self.connection).policy,
+                self.connection.sync, self._syscall_whitelist)
+
+        if not self._render_rcfile(seccomp):
+            return
+
+        transfer = transfer_for(self.connection)
+        cmds, pending = transfer.shell_upload(
+            {self.rc_file: self._rc_content})
+        for cmd in cmds:
+            result = await self.connection.execute(cmd=cmd)
+            if result.returncode != 0:
+                self._config_dirty = True
+                raise TransferError(result=result, paths=[self.rc_file])
+        if pending:
+            transfer.sent(pending)
+
+
+class AsyncContainerBehavior(object):
+    """ ContainerBehavior for an AsyncLxcClient: async with ... as client """
+
+    def __init__(self, container_type):
+        self.container_type = container_type
+
+    async def __aenter__(self):
+        try:
+            await self.container_type.create()
+            await self.container_type.wait(self.container_type.STOPPED)
+            await self.container_type.start()
+            await self.container_type.wait(self.container_type.RUNNING)
+        except Exception:
+            await self._tear_down(failed=True)
+            raise
+        return self.container_type
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._tear_down(failed=exc_type is not None)
+
+    async def _tear_down(self, failed=False):
+        client = self.container_type
+        try:
+            try:
+                if client._state.value in (State.STARTED, State.RUNNING):
+                    await client.stop()
+                    await client.wait(client.STOPPED)
+            finally:
+                try:
+                    await client.destroy()
+                finally:
+                    await client.clean()
+        except Exception:
+            if not failed:
+                raise
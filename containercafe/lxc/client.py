@@ -15,14 +15,27 @@ limitations under the License.
 """
 
 import copy
-import os
-import shutil
-import tempfile
+import posixpath
+import re
+import time
+import uuid
 from time import sleep
 
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
 from ..common.clients.base import BaseContainerClient
-from ..common.connectors.process import _SIMPLE_SUCCESS_CMD_RESULT
+from ..common.connectors.process import (
+    CommandResult, _SIMPLE_SUCCESS_CMD_RESULT)
+from ..common.connectors.session import SentinelSession, open_channel
+from ..common.connectors.transfer import transfer_for
+from ..common.metrics import METRICS, timed
 from ..common.states import State
+from ..common.waiters import wait_for
+from .hoststate import state_cache_for
+from .seccomp import normalise, policy_cache_for, render_policy
 
 
 class LXCError(Exception):
@@ -37,19 +50,67 @@ class LxcClient(BaseContainerClient):
     WAIT_CMD = 'lxc-wait'
     STOP_CMD = 'lxc-stop'
     DESTROY_CMD = 'lxc-destroy'
+    INFO_CMD = 'lxc-info'
+    SNAPSHOT_CMD = 'lxc-snapshot'
+    ATTACH_CMD = 'lxc-attach'
+
+    # Where each client's config files live on the host
+    TMPDIR_ROOT = '/tmp'
 
     STOPPED = 'STOPPED'
     RUNNING = 'RUNNING'
 
+    # Post-conditions a lifecycle command can ask _run() to verify
+    EXISTS = 'EXISTS'
+    GONE = 'GONE'
+    POST_CONDITIONS = {
+        EXISTS: lambda state: state is not None,
+        RUNNING: lambda state: state == LxcClient.RUNNING,
+        STOPPED: lambda state: state == LxcClient.STOPPED,
+        GONE: lambda state: state is None}
+
+    # Local state implied by the host's view of the container
+    HOST_STATES = {
+        'STARTING': State.STARTED,
+        RUNNING: State.RUNNING,
+        STOPPED: State.STOPPED}
+
     def __init__(self, name, preset_cfg=None, connection=None, clean=True):
         super(LxcClient, self).__init__(name=name, connection=connection)
         self._syscall_whitelist = list()
         self._config = self._init_config(preset_cfg)
-        self._tmpdir_path = self._init_tmpdir()
+        self._tmpdir = None
+        self._verified_state = None
+        self._attach_session = None
         self.clean_container = clean
 
-    def _run(self, cmd, prompt=None, timeout=None):
-        """ Execute a specific command within the container. """
+        # When verifying completion, each lifecycle command polls the host
+        # for its post-condition (with exponential backoff) instead of
+        # sleeping cmd_delay. The delay is only used in legacy mode.
+        self.verify_completion = True
+        self.poll_timeout = 60.0
+        self.poll_interval = 0.05
+        self.poll_max_interval = 2.0
+
+        # The local state is reconciled against a host-wide lxc-ls snapshot
+        # (shared by every client on the host) no older than state_ttl and
+        # taken after this client's last command.
+        self.state_ttl = 2.0
+        self._last_command = None
+
+        # The rcfile is rendered in memory and shipped only when the config
+        # (or the seccomp policy it references) changed since last time.
+        self._config_dirty = True
+        self._rendered_seccomp = None
+        self._rc_content = None
+
+    def _run(self, cmd, prompt=None, timeout=None, expect=None):
+        """ Execute a specific command within the container.
+
+        expect names the post-condition (EXISTS, RUNNING, STOPPED, GONE) the
+        command should leave behind. In verification mode the call returns as
+        soon as the host reports it; otherwise cmd_delay is slept.
+        """
 
         # Target sets the style of connection (API, host, container)
         args = {'cmd': cmd}
@@ -59,14 +120,104 @@ class LxcClient(BaseContainerClient):
             args['timeout'] = int(timeout)
 
         try:
-            output = self.connection.execute(**args)
+            with METRICS.timer('command', self.connection):
+                output = self.connection.execute(**args)
         except Exception as err:
             raise err
 
-        sleep(self.cmd_delay)
+        # A lifecycle command changed the container under any cached probes
+        if expect is not None:
+            self._invalidate_probes()
+
+        self._verified_state = None
+        self._last_command = time.time()
+        if not self.verify_completion:
+            with METRICS.timer('cmd_delay', self.connection):
+                sleep(self.cmd_delay)
+        elif expect is not None and output.returncode == 0:
+            self._verify(expect)
         return output
 
+    @timed('verify')
+    def _verify(self, expect):
+        """ Poll the host until the expected post-condition holds. """
+        condition = self.POST_CONDITIONS[expect]
+        observed = dict()
+
+        def _holds():
+            observed['state'] = self._query_state(since=time.time())
+            return condition(observed['state'])
+
+        wait_for(_holds, timeout=self.poll_timeout,
+                 interval=self.poll_interval,
+                 max_interval=self.poll_max_interval,
+                 description='LXC container {name} to be {expect}'.format(
+                     name=self.name, expect=expect))
+        self._verified_state = observed['state']
+
+    def _query_state(self, max_age=None, since=None):
+        """ Return the host's view of the container state (None if absent) """
+        states = state_cache_for(self.connection).states(
+            self.connection, max_age=max_age, since=since)
+        if states is not None:
+            return states.get(self.name)
+        return self._info_state()
+
+    def _info_state(self):
+        """ Ask the host about this container alone """
+        exec_target = '{cmd} -n {name} -s'.format(
+            cmd=self.INFO_CMD, name=self.name)
+        return self._parse_info(self.connection.execute(cmd=exec_target))
+
+    @classmethod
+    def _parse_info(cls, result):
+        if result.returncode != 0:
+            return None
+
+        # Output is of the form "State:          RUNNING"
+        for line in result.text.splitlines():
+            key, _, value = line.partition(':')
+            if key.strip().lower() == 'state':
+                return value.strip().upper()
+        return None
+
+    def reconcile(self):
+        """ Align the local state with the host's """
+        return self._apply_host_state(self._query_state(
+            max_age=self.state_ttl, since=self._last_command))
+
+    def _apply_host_state(self, state):
+        previous = self._state.value
+        self._reconcile_state(state)
+        if self._state.value != previous:
+            # Changed behind our back: any cached probe results are stale
+            self._invalidate_probes()
+        return self._state
+
+    def _reconcile_state(self, state):
+        if state is None:
+            if self._requires_destroy or self._state.value != State.INITIAL:
+                self._state.value = State.DESTROYED
+            self._requires_destroy = False
+        elif state in self.HOST_STATES:
+            self._requires_destroy = True
+            # Keep the local state if it agrees (e.g. CREATED is STOPPED)
+            if self._host_state(self._state.value) != state:
+                self._state.value = self.HOST_STATES[state]
+
+    @classmethod
+    def _host_state(cls, value):
+        """ The host state a local state corresponds to """
+        if value in (State.CREATED, State.STOPPED):
+            return cls.STOPPED
+        if value in (State.STARTED, State.RUNNING):
+            return cls.RUNNING
+        return None
+
     def _check_state(self, *valid_states):
+        if self._state.value not in valid_states:
+            # The local state is only a guess: check it against the host's
+            self.reconcile()
         if self._state.value not in valid_states:
             err_msg = 'LXC State {state} is not valid.'.format(
                 state=self._state)
@@ -74,7 +225,18 @@ class LxcClient(BaseContainerClient):
 
     def set_option(self, option, *values):
         self._config[option] = values
+        self._config_dirty = True
+        self._invalidate_probes()
+
+    def reset_config(self, preset_cfg=None):
+        """ Drop set_option() changes and whitelisted syscalls: back to the
+        preset config (rendered again on the next lifecycle command) """
+        self._config = self._init_config(preset_cfg)
+        del self._syscall_whitelist[:]
+        self._config_dirty = True
+        self._invalidate_probes()
 
+    @timed('create')
     def create(self):
         cmd = self.CREATE_CMD
         self._check_state(State.INITIAL)
@@ -83,12 +245,13 @@ class LxcClient(BaseContainerClient):
         exec_target = '{cmd} -n {name} -f {rc_file}'.format(
             name=self.name, rc_file=self.rc_file, cmd=cmd)
 
-        result = self._run(cmd=exec_target)
+        result = self._run(cmd=exec_target, expect=self.EXISTS)
         if result.returncode == 0:
             self._requires_destroy = True
             self._state.set_state(State.CREATED)
         return result
 
+    @timed('start')
     def start(self):
         cmd = self.START_CMD
         self._check_state(State.INITIAL, State.CREATED, State.STOPPED)
@@ -97,13 +260,22 @@ class LxcClient(BaseContainerClient):
         exec_target = '{cmd} -n {name} -f {rc_file}'.format(
             name=self.name, rc_file=self.rc_file, cmd=cmd)
 
-        result = self._run(cmd=exec_target)
+        result = self._run(cmd=exec_target, expect=self.RUNNING)
         if result.returncode == 0:
             self._state.value = State.STARTED
+            if self._verified_state == self.RUNNING:
+                self._state.value = State.RUNNING
 
         return result
 
-    def execute(self, user_cmd, **kwargs):
+    @timed('execute')
+    def execute(self, user_cmd, pure=False, **kwargs):
+        """ Run user_cmd in the container. pure: it only reads state, so
+        its result may come from (and go to) the probe cache. """
+        cached = self._cached_probe(user_cmd, pure)
+        if cached is not None:
+            return cached
+
         cmd = self.EXECUTE_CMD
         self._check_state(State.INITIAL, State.CREATED, State.STOPPED)
         self._generate_rcfile()
@@ -114,26 +286,78 @@ class LxcClient(BaseContainerClient):
             rc_file=self.rc_file)
 
         # Run the command and capture the result
-        return self._run(cmd=exec_target, **kwargs)
+        return self._store_probe(user_cmd, pure,
+                                 self._run(cmd=exec_target, **kwargs))
+
+    @timed('execute_many')
+    def execute_many(self, user_cmds, stop_on_failure=False, **kwargs):
+        """ Run several commands in a single lxc-execute invocation.
+
+        Returns a CommandResult per command that ran, in order. With
+        stop_on_failure, commands after the first failing one are skipped
+        (so fewer results than commands may be returned).
+        """
+        cmd = self.EXECUTE_CMD
+        self._check_state(State.INITIAL, State.CREATED, State.STOPPED)
+        self._generate_rcfile()
+
+        sentinel = 'containercafe-{token}'.format(token=uuid.uuid4().hex)
+        script = self._format_batch(user_cmds, sentinel, stop_on_failure)
+        exec_target = self._format_cmd(
+            lxc_cmd=cmd, user_cmd='/bin/sh -c {script}'.format(
+                script=quote(script)),
+            name=self.name, rc_file=self.rc_file)
+
+        result = self._run(cmd=exec_target, **kwargs)
+        return self._split_batch(result.text, sentinel)
+
+    def attach(self, shell='/bin/sh'):
+        """ Persistent lxc-attach shell into the running container.
 
+        Commands sent through the returned session reuse the same attached
+        shell; it is re-attached automatically if the shell dies, and closed
+        by stop() and clean().
+        """
+        self._check_state(State.STARTED, State.RUNNING)
+        if self._attach_session is None:
+            exec_target = '{cmd} -n {name} -- {shell}'.format(
+                cmd=self.ATTACH_CMD, name=self.name, shell=shell)
+            self._attach_session = SentinelSession(
+                open_channel=lambda: open_channel(self.connection, exec_target))
+        return self._attach_session
+
+    @timed('attach_execute')
+    def attach_execute(self, user_cmd, timeout=None):
+        """ Run a command through the persistent attach session """
+        return self.attach().execute(user_cmd, timeout=timeout)
+
+    @timed('wait')
     def wait(self, states):
         cmd = self.WAIT_CMD
-        self._check_state(State.STARTED, State.RUNNING)
+        self._check_state(State.CREATED, State.STARTED, State.RUNNING,
+                          State.STOPPED)
+
+        # The previous command already confirmed this state on the host
+        if self.verify_completion and self._verified_state == states:
+            return _SIMPLE_SUCCESS_CMD_RESULT
 
         exec_target = '{cmd} -n {name} -s {state}'.format(
             name=self.name, state=states, cmd=cmd)
         return self._run(cmd=exec_target)
 
+    @timed('stop')
     def stop(self):
         cmd = self.STOP_CMD
         self._check_state(State.STARTED, State.RUNNING)
         exec_target = '{cmd} -n {name}'.format(name=self.name, cmd=cmd)
 
-        result = self._run(cmd=exec_target)
+        self._close_attach_session()
+        result = self._run(cmd=exec_target, expect=self.STOPPED)
         if result.returncode == 0:
             self._state.value = State.STOPPED
         return result
 
+    @timed('destroy')
     def destroy(self):
         cmd = self.DESTROY_CMD
         result = _SIMPLE_SUCCESS_CMD_RESULT
@@ -143,20 +367,44 @@ class LxcClient(BaseContainerClient):
             self._check_state(State.CREATED, State.STOPPED)
             exec_target = '{cmd} -n {name}'.format(name=self.name, cmd=cmd)
 
-            result = self._run(cmd=exec_target)
+            result = self._run(cmd=exec_target, expect=self.GONE)
             if result.returncode == 0:
                 self._requires_destroy = False
                 self._state.set_state(State.DESTROYED)
         return result
 
+    @timed('snapshot')
+    def snapshot(self):
+        """ Snapshot the (stopped) container's rootfs """
+        cmd = self.SNAPSHOT_CMD
+        self._check_state(State.CREATED, State.STOPPED)
+        exec_target = '{cmd} -n {name}'.format(name=self.name, cmd=cmd)
+        return self._run(cmd=exec_target)
+
+    @timed('restore')
+    def restore(self, snapshot='snap0'):
+        """ Roll the (stopped) container's rootfs back to a snapshot """
+        cmd = self.SNAPSHOT_CMD
+        self._check_state(State.CREATED, State.STOPPED)
+        exec_target = '{cmd} -n {name} -r {snapshot}'.format(
+            name=self.name, cmd=cmd, snapshot=snapshot)
+        return self._run(cmd=exec_target, expect=self.STOPPED)
+
+    @timed('clean')
     def clean(self):
+        self._close_attach_session()
         if self.clean_container:
             self.destroy()
-            if os.path.exists(self._tmpdir_path):
-                shutil.rmtree(self._tmpdir_path)
+            self._remove_tmpdir()
+        self._release_connection()
 
     # LXC Container Specific Routines
     # ----------------------------------------------------
+    def _close_attach_session(self):
+        if self._attach_session is not None:
+            self._attach_session.close()
+            self._attach_session = None
+
     def _init_config(self, preset_cfg):
         """ Initialize the configuration for LXC. """
         # Set our defaults
@@ -169,54 +417,97 @@ class LxcClient(BaseContainerClient):
             config.update(preset_cfg)
         return config
 
+    @property
+    def _tmpdir_path(self):
+        """ Host directory for this client's config files, named on first
+        use; it is created on the host by the first upload. """
+        if self._tmpdir is None:
+            self._tmpdir = self._init_tmpdir()
+        return self._tmpdir
+
     def _init_tmpdir(self):
-        """ Setup the temp directory for storing local config files. """
-        return tempfile.mkdtemp(
-            prefix='{}.'.format(self.name), suffix='.lxc-sectest')
+        """ Name the temp directory for storing config files. """
+        return posixpath.join(
+            self.TMPDIR_ROOT, '{name}.{token}.lxc-sectest'.format(
+                name=self.name, token=uuid.uuid4().hex[:8]))
+
+    def _remove_tmpdir(self):
+        if self._tmpdir is None:
+            return
+        self.connection.execute(cmd='rm -rf {path}'.format(
+            path=quote(self._tmpdir)))
+        transfer_for(self.connection).forget(self._tmpdir)
+        self._tmpdir = None
+        self._config_dirty = True
 
     @classmethod
     def _format_cmd(cls, lxc_cmd, user_cmd, name, rc_file=None):
         return '{lxc_cmd} -n {name} -f {rc_file} -- {user_cmd}'.format(
             lxc_cmd=lxc_cmd, name=name, rc_file=rc_file, user_cmd=user_cmd)
 
-    def _generate_rcfile(self):
-        # Is there a config already? Yeah? Blast it.
-        if self.rc_file is not None and os.path.exists(self.rc_file):
-            os.remove(self.rc_file)
+    @classmethod
+    def _format_batch(cls, user_cmds, sentinel, stop_on_failure=False):
+        """ Shell script running each command in a subshell, followed by
+        a sentinel line carrying its exit code. """
+        steps = list()
+        for user_cmd in user_cmds:
+            steps.append('( {user_cmd} ); rc=$?'.format(user_cmd=user_cmd))
+            steps.append("printf '\\n{sentinel}:%d\\n' $rc".format(
+                sentinel=sentinel))
+            if stop_on_failure:
+                steps.append('[ $rc -eq 0 ] || exit $rc')
+        return '; '.join(steps)
 
-        # Make a shallow copy to set our built in command params
-        actual_cfg = copy.copy(self._config)
+    @classmethod
+    def _split_batch(cls, output, sentinel):
+        """ Split batched output on its sentinels into CommandResults """
+        parts = re.split(r'\r?\n{sentinel}:(-?\d+)\r?\n'.format(
+            sentinel=re.escape(sentinel)), output)
 
-        # Set seccomp cfg var if there are values in the syscall whitelist
+        # parts = [output_1, rc_1, output_2, rc_2, ..., trailing output]
+        return [CommandResult(int(returncode), cmd_output)
+                for cmd_output, returncode in zip(parts[0:-1:2], parts[1::2])]
+
+    @timed('rcfile_upload')
+    def _generate_rcfile(self):
+        # Point seccomp at the host's shared copy of the whitelist policy
+        seccomp = None
         if len(self._syscall_whitelist) > 0:
-            actual_cfg['lxc.seccomp'] = self._write_seccomp_policy(
-                self._tmpdir_path, self._syscall_whitelist)
+            seccomp = policy_cache_for(self.connection).policy(
+                self.connection, self._syscall_whitelist)
+
+        if self._render_rcfile(seccomp):
+            try:
+                transfer_for(self.connection).put_data(
+                    {self.rc_file: self._rc_content})
+            except Exception:
+                self._config_dirty = True
+                raise
+
+    def _render_rcfile(self, seccomp):
+        """ Render the rcfile in memory; False if nothing changed since the
+        last upload (so it can be reused) """
+        if not self._config_dirty and seccomp == self._rendered_seccomp:
+            return False
 
-        # Write the LXC configuration (writes locally)
-        self.rc_file = self.write_cfg(self._tmpdir_path, actual_cfg)
+        # Make a shallow copy to set our built in command params
+        actual_cfg = copy.copy(self._config)
+        if seccomp is not None:
+            actual_cfg['lxc.seccomp'] = seccomp
 
-        # Write file remotely
-        cfg_file = self.get_cfg(self.rc_file)
-        self.connection.execute('mkdir -p {temp_dir}'.format(
-            temp_dir=self._tmpdir_path))
-        self.connection.execute('echo "{cfg_file}" >> {remote_file}'.format(
-            cfg_file=cfg_file, remote_file=self.rc_file))
+        self._rc_content = self.render_cfg(actual_cfg)
+        self.rc_file = posixpath.join(self._tmpdir_path, 'config')
+        self._config_dirty = False
+        self._rendered_seccomp = seccomp
+        return True
 
     def _show_rcfiles(self):
         rc_files = ''
-        for root, dirs, files in os.walk(self._tmpdir_path):
-            for name in files:
-                with open(os.path.join(root, name), 'r') as rc_file:
-                    rc_files = ('{output}LXC {name}:\n{content}'.format(
-                        output=rc_files, name=name, content=rc_file.read()))
+        if self._rc_content is not None:
+            rc_files = 'LXC config:\n{content}'.format(
+                content=self._rc_content)
+        if len(self._syscall_whitelist) > 0:
+            rc_files = '{output}LXC syscall_whitelist:\n{content}'.format(
+                output=rc_files,
+                content=render_policy(normalise(self._syscall_whitelist)))
         return rc_files
-
-    @classmethod
-    def _write_seccomp_policy(cls, path, syscall_whitelist,
-                              filename='syscall_whitelist'):
-        whitelist_file = os.path.join(path, filename)
-        with open(whitelist_file, 'w') as cfg_out:
-            cfg_out.write('1\nwhitelist\n0\n')
-            for syscall in syscall_whitelist:
-                cfg_out.write('{sys_call}\n'.format(sys_call=syscall))
-        return whitelist_file
@@ -0,0 +1,128 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: The state of every container on a host, from one lxc-ls query
+        shared by all the clients on that host.
+
+"""
+
+import threading
+import time
+
+from ..common.metrics import host_label
+
+
+class HostStateCache(object):
+    """ {container name: LXC state} for one host.
+
+    A snapshot is refreshed when a caller needs one newer than it: either
+    younger than max_age seconds or taken after a given time. Concurrent
+    callers share a single refresh.
+    """
+
+    LS_CMD = 'lxc-ls --fancy --fancy-format name,state'
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.refreshes = 0
+
+        # False once lxc-ls has failed (e.g. no --fancy support): callers
+        # then fall back to asking about each container.
+        self.available = True
+        self._states = None
+        self._taken = None
+        self._lock = threading.Lock()
+
+    def states(self, connection, max_age=None, since=None):
+        """ Snapshot of the host's containers (None if lxc-ls failed),
+        refreshed over connection when stale """
+        with self._lock:
+            if self.available and self._stale(max_age, since):
+                self._refresh(connection)
+            return self._states
+
+    def state_of(self, connection, name, max_age=None, since=None):
+        """ LXC state of a container (None if absent or unknown) """
+        states = self.states(connection, max_age=max_age, since=since)
+        return None if states is None else states.get(name)
+
+    def invalidate(self):
+        """ Make the next caller refresh the snapshot """
+        with self._lock:
+            self._taken = None
+
+    def stale(self, max_age=None, since=None):
+        """ Would states() refresh the snapshot? """
+        with self._lock:
+            return self.available and self._stale(max_age, since)
+
+    def cached_state(self, name):
+        """ State of a container in the current snapshot (no refresh) """
+        with self._lock:
+            return None if self._states is None else self._states.get(name)
+
+    def store(self, taken, result):
+        """ Keep the result of an lxc-ls (LS_CMD) run elsewhere, started at
+        taken (e.g. by an async client) """
+        with self._lock:
+            self._store(taken, result)
+
+    def _stale(self, max_age, since):
+        if self._taken is None:
+            return True
+        if since is not None and self._taken < since:
+            return True
+        return max_age is not None and self.clock() - self._taken > max_age
+
+    def _refresh(self, connection):
+        taken = self.clock()
+        self._store(taken, connection.execute(cmd=self.LS_CMD))
+
+    def _store(self, taken, result):
+        """ Keep the lxc-ls result of a refresh started at taken """
+        self.refreshes += 1
+        self._taken = taken
+        if result.returncode == 0:
+            self._states = self._parse(result.text)
+        else:
+            self.available = False
+            self._states = None
+
+    @classmethod
+    def _parse(cls, output):
+        # NAME    STATE
+        # web01   RUNNING
+        states = dict()
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) < 2 or fields[0] == 'NAME' or \
+                    set(fields[0]) == set('-'):
+                continue
+            states[fields[0]] = fields[1].upper()
+        return states
+
+
+_STATE_CACHES = dict()
+_STATE_CACHES_LOCK = threading.Lock()
+
+
+def state_cache_for(connection, **kwargs):
+    """ The HostStateCache of the host connection points at """
+    host = host_label(connection)
+    with _STATE_CACHES_LOCK:
+        cache = _STATE_CACHES.get(host)
+        if cache is None:
+            cache = _STATE_CACHES[host] = HostStateCache(**kwargs)
+        return cache
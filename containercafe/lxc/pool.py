@@ -0,0 +1,249 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Keep pre-created, running containers around so tests don't pay for
+        lxc-create/start/stop/destroy every time. Returned containers are
+        reset (snapshot restore or overlay wipe) by a background thread that
+        also tops the pool back up to its high-water mark.
+
+"""
+
+import threading
+import uuid
+from collections import deque
+
+from ..common.fleet import ContainerFleet, run_step
+
+
+class ResetError(Exception):
+    def __init__(self, name, result, **kwargs):
+        super(ResetError, self).__init__(**kwargs)
+        self.result = result
+        self.message = 'Unable to reset container {name}'.format(name=name)
+
+    def __str__(self):
+        return self.message
+
+
+class SnapshotReset(object):
+    """ Snapshot the rootfs when warming; restore it on every reset """
+
+    def __init__(self, snapshot='snap0'):
+        self.snapshot = snapshot
+
+    def prepare(self, client):
+        run_step(client, 'snapshot')
+
+    def reset(self, client):
+        run_step(client, 'stop')
+        run_step(client, 'wait', client.STOPPED)
+        run_step(client, 'restore', self.snapshot)
+        run_step(client, 'start')
+        run_step(client, 'wait', client.RUNNING)
+
+
+class OverlayReset(object):
+    """ Discard the overlay upper layer of an overlayfs-backed container """
+
+    def __init__(self, upper_dir='/var/lib/lxc/{name}/delta0'):
+        self.upper_dir = upper_dir
+
+    def prepare(self, client):
+        pass
+
+    def reset(self, client):
+        run_step(client, 'stop')
+        run_step(client, 'wait', client.STOPPED)
+        result = client.connection.execute(
+            cmd='find {upper} -mindepth 1 -delete'.format(
+                upper=self.upper_dir.format(name=client.name)))
+        if result.returncode != 0:
+            raise ResetError(client.name, result)
+        run_step(client, 'start')
+        run_step(client, 'wait', client.RUNNING)
+
+
+class WarmContainerPool(object):
+    """ Pre-created, pre-started containers for one preset config
+
+    client_factory(name, preset_cfg) builds a client (with its own
+    connection). checkout() hands out a running container, building one on
+    the spot if none is warm; checkin() queues it for reset (rootfs and
+    config, including options set and syscalls whitelisted). Containers
+    whose reset fails are torn down and dropped from the pool.
+    """
+
+    def __init__(self, client_factory, preset_cfg=None, high_water=2,
+                 reset=None, name_prefix='warm', retry_delay=1.0):
+        self.client_factory = client_factory
+        self.preset_cfg = preset_cfg
+        self.high_water = high_water
+        self.reset = reset or SnapshotReset()
+        self.name_prefix = '{prefix}-{token}'.format(
+            prefix=name_prefix, token=uuid.uuid4().hex[:8])
+        self.retry_delay = retry_delay
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self.last_error = None
+
+        self._serial = 0
+        self._idle = deque()
+        self._dirty = deque()
+        self._warming = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._refill = threading.Thread(target=self._refill_loop)
+        self._refill.daemon = True
+        self._refill.start()
+
+    def checkout(self):
+        with self._cond:
+            client = self._idle.popleft() if self._idle else None
+            if client is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._cond.notify()
+
+        if client is None:
+            client = self._warm()
+        return client
+
+    def checkin(self, client):
+        with self._cond:
+            self._dirty.append(client)
+            self._cond.notify()
+
+    def close(self):
+        """ Stop refilling and tear down every pooled container """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._refill.join()
+
+        clients = list(self._idle) + list(self._dirty)
+        self._idle.clear()
+        self._dirty.clear()
+        ContainerFleet(client_factory=self.client_factory).down(clients)
+
+    def stats(self):
+        with self._cond:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'dropped': self.dropped, 'idle': len(self._idle),
+                    'dirty': len(self._dirty)}
+
+    def _refill_loop(self):
+        while True:
+            with self._cond:
+                while (not self._closed and not self._dirty and
+                       len(self._idle) + self._warming >= self.high_water):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                dirty = self._dirty.popleft() if self._dirty else None
+                if dirty is None:
+                    self._warming += 1
+
+            if dirty is not None:
+                self._recycle(dirty)
+                continue
+
+            try:
+                client = self._warm()
+            except Exception as err:
+                client = None
+                self.last_error = err
+
+            with self._cond:
+                self._warming -= 1
+                if client is not None:
+                    self._idle.append(client)
+                elif not self._closed:
+                    self._cond.wait(self.retry_delay)
+
+    def _recycle(self, client):
+        try:
+            # What the last test configured must not reach the next one: the
+            # restart in reset() renders the preset config again
+            client.reset_config(self.preset_cfg)
+            self.reset.reset(client)
+        except Exception as err:
+            self.last_error = err
+            self._drop(client)
+            return
+
+        with self._cond:
+            self._idle.append(client)
+            self._cond.notify()
+
+    def _warm(self):
+        with self._cond:
+            self._serial += 1
+            name = '{prefix}-{serial}'.format(
+                prefix=self.name_prefix, serial=self._serial)
+
+        client = self.client_factory(name, self.preset_cfg)
+        try:
+            run_step(client, 'create')
+            run_step(client, 'wait', client.STOPPED)
+            self.reset.prepare(client)
+            run_step(client, 'start')
+            run_step(client, 'wait', client.RUNNING)
+        except Exception:
+            self._drop(client)
+            raise
+        return client
+
+    def _drop(self, client):
+        with self._cond:
+            self.dropped += 1
+        try:
+            ContainerFleet.tear_down(client)
+        except Exception:
+            pass
+
+
+class WarmContainerPools(object):
+    """ One WarmContainerPool per preset config """
+
+    def __init__(self, client_factory, **pool_kwargs):
+        self.client_factory = client_factory
+        self.pool_kwargs = pool_kwargs
+        self._pools = dict()
+        self._lock = threading.Lock()
+
+    def get(self, preset_cfg=None):
+        key = self._key(preset_cfg)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = WarmContainerPool(
+                    client_factory=self.client_factory,
+                    preset_cfg=preset_cfg, **self.pool_kwargs)
+            return self._pools[key]
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), dict()
+        for pool in pools:
+            pool.close()
+
+    @classmethod
+    def _key(cls, preset_cfg):
+        if not preset_cfg:
+            return ()
+        return tuple(sorted(
+            (option, value if isinstance(value, str) else tuple(value))
+            for option, value in preset_cfg.items()))
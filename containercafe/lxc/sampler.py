@@ -0,0 +1,309 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Sample what containers actually consume - memory (current and
+        peak), process count and CPU time - from their cgroups. One shell
+        loop on the host reads every container's cgroup files with shell
+        builtins only (no process per read) and streams a line per
+        container per tick back over a single channel.
+
+    with CgroupSampler.from_config(
+            test_parameters, connection, ['web01', 'web02']) as sampler:
+        ... run the workload ...
+    sampler.series('web01').memory.max()
+
+"""
+
+import array
+import codecs
+import threading
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from ..common.connectors.session import open_channel
+
+
+class TimeSeries(object):
+    """ Samples of one metric: seconds since the sampler's first tick and
+    the values read then (-1 where the cgroup file was unreadable). """
+
+    def __init__(self, times, values):
+        self._times = times
+        self._values = values
+
+    def __len__(self):
+        # Appended concurrently with the times: only count complete samples
+        return min(len(self._times), len(self._values))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._times[index], self._values[index]
+
+    def __repr__(self):
+        return 'TimeSeries({count} samples, last={last})'.format(
+            count=len(self), last=self.last())
+
+    @property
+    def times(self):
+        return self._times[:len(self)]
+
+    @property
+    def values(self):
+        return self._values[:len(self)]
+
+    def valid(self):
+        return [value for value in self.values if value >= 0]
+
+    def last(self, default=None):
+        values = self.valid()
+        return values[-1] if values else default
+
+    def max(self, default=None):
+        values = self.valid()
+        return max(values) if values else default
+
+    def min(self, default=None):
+        values = self.valid()
+        return min(values) if values else default
+
+    def mean(self, default=None):
+        values = self.valid()
+        return sum(values) / float(len(values)) if values else default
+
+    def since(self, start):
+        """ The samples taken at or after start seconds """
+        times = self.times
+        first = len(times)
+        for index, taken in enumerate(times):
+            if taken >= start:
+                first = index
+                break
+        return TimeSeries(times[first:], self.values[first:])
+
+    def rate(self):
+        """ Per-second change between consecutive samples (for counters
+        such as cpu) """
+        pairs = [(taken, value) for taken, value in self if value >= 0]
+        times = array.array('d')
+        rates = array.array('d')
+        for (before, old), (after, new) in zip(pairs, pairs[1:]):
+            if after > before:
+                times.append(after)
+                rates.append((new - old) / (after - before))
+        return TimeSeries(times, rates)
+
+
+class ContainerSeries(object):
+    """ The time series of one container """
+
+    METRICS = ('memory', 'memory_peak', 'pids', 'cpu_usec')
+
+    def __init__(self, name):
+        self.name = name
+        self.times = array.array('d')
+        self._values = dict(
+            (metric, array.array('l')) for metric in self.METRICS)
+
+        # memory, memory_peak: bytes; pids: tasks; cpu_usec: CPU time used
+        for metric in self.METRICS:
+            setattr(self, metric, TimeSeries(self.times, self._values[metric]))
+
+    def __len__(self):
+        return len(self.times)
+
+    def _append(self, taken, values):
+        for metric, value in zip(self.METRICS, values):
+            self._values[metric].append(value)
+        self.times.append(taken)
+
+
+class CgroupSampler(object):
+    """ Stream cgroup usage of many containers from their host.
+
+    The loop runs next to connection: over its SSH transport, or as a
+    local shell for local connections. Containers are looked up on every
+    tick, so they can be sampled before they start (their samples begin
+    when their cgroup appears). cgroup v1 and v2 (unified) hosts are both
+    supported.
+    """
+
+    INTERVAL = 0.05
+    CGROUP_ROOT = '/sys/fs/cgroup'
+
+    # Container cgroup directories, relative to the v2 root or a v1
+    # controller's mount; the first that exists is used
+    CGROUP_DIRS = ('lxc.payload.{name}', 'lxc.payload/{name}', 'lxc/{name}')
+
+    SCRIPT = r'''
+root={root}
+interval={interval}
+v2=0
+[ -f "$root/cgroup.controllers" ] && v2=1
+
+val() {{ v=-1; {{ read v _ < "$1"; }} 2>/dev/null; }}
+find_dir() {{
+    d=
+    for rel in "$@"; do
+        [ -d "$base/$rel" ] && {{ d=$base/$rel; return 0; }}
+    done
+    return 1
+}}
+
+sample() {{
+    index=$1; shift
+    mem=-1 peak=-1 pids=-1 cpu=-1
+    if [ $v2 = 1 ]; then
+        base=$root; find_dir "$@" || return
+        val $d/memory.current; mem=$v
+        val $d/memory.peak; peak=$v
+        val $d/pids.current; pids=$v
+        {{ while read key value; do
+            [ "$key" = usage_usec ] && cpu=$value
+        done < $d/cpu.stat; }} 2>/dev/null
+    else
+        base=$root/memory; find_dir "$@" || return
+        val $d/memory.usage_in_bytes; mem=$v
+        val $d/memory.max_usage_in_bytes; peak=$v
+        base=$root/pids
+        find_dir "$@" && {{ val $d/pids.current; pids=$v; }}
+        base=$root/cpuacct
+        find_dir "$@" && {{ val $d/cpuacct.usage; [ $v -ge 0 ] &&
+            cpu=$((v / 1000)); }}
+    fi
+    echo "$now $index $mem $peak $pids $cpu"
+}}
+
+while :; do
+    read now _ < /proc/uptime
+{samples}
+    sleep $interval
+done
+'''
+
+    def __init__(self, connection, names, interval=None, cgroup_root=None):
+        self.connection = connection
+        self.names = list(names)
+        self.interval = self.INTERVAL if interval is None else interval
+        self.cgroup_root = cgroup_root or self.CGROUP_ROOT
+        self.ticks = 0
+        self.errors = list()
+        self._series = dict((name, ContainerSeries(name))
+                            for name in self.names)
+        self._start = None
+        self._last_tick = None
+        self._channel = None
+        self._reader = None
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_config(cls, test_parameters, connection, names, **kwargs):
+        """ Sampler ticking every [container_test_info]
+        cgroup_sample_interval seconds """
+        return cls(connection, names,
+                   interval=test_parameters.cgroup_sample_interval, **kwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._reader is not None and self._reader.is_alive()
+
+    def series(self, name):
+        """ ContainerSeries of a sampled container """
+        return self._series[name]
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._channel = open_channel(
+            self.connection, '/bin/sh -c {script}'.format(
+                script=quote(self.script())))
+        self._reader = threading.Thread(target=self._read, name='sampler')
+        self._reader.daemon = True
+        self._reader.start()
+
+    def stop(self, timeout=5.0):
+        """ End the host loop; the samples taken so far are kept """
+        if self._reader is None:
+            return
+        self._stopping.set()
+        self._channel.close()
+        self._reader.join(timeout)
+        self._reader = None
+        self._channel = None
+
+    def script(self):
+        """ The host-side sampling loop """
+        samples = '\n'.join(
+            '    sample {index} {dirs}'.format(
+                index=index, dirs=' '.join(
+                    quote(template.format(name=name))
+                    for template in self.CGROUP_DIRS))
+            for index, name in enumerate(self.names))
+        return self.SCRIPT.format(
+            root=quote(self.cgroup_root.rstrip('/') or '/'),
+            interval=quote('{0:g}'.format(self.interval)),
+            samples=samples)
+
+    def _read(self):
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        pending = ''
+        while not self._stopping.is_set():
+            try:
+                data = self._channel.recv(self.interval * 4 + 1)
+            except (IOError, OSError, ValueError):
+                # The channel was closed under us by stop()
+                break
+            if data is None:
+                continue
+            if not data:
+                break
+            pending += decoder.decode(data)
+            lines = pending.split('\n')
+            pending = lines.pop()
+            for line in lines:
+                self._record(line)
+
+    def _record(self, line):
+        """ Store one '<uptime> <index> <mem> <peak> <pids> <cpu>' line """
+        fields = line.split()
+        try:
+            taken = float(fields[0])
+            series = self._series[self.names[int(fields[1])]]
+            values = [int(field) for field in fields[2:6]]
+        except (IndexError, ValueError):
+            # Anything else the shell printed (e.g. an error)
+            if line.strip():
+                self.errors.append(line.strip())
+            return
+        if len(values) < len(ContainerSeries.METRICS):
+            self.errors.append(line.strip())
+            return
+
+        if self._start is None:
+            self._start = taken
+        if self._last_tick is None or taken > self._last_tick:
+            self.ticks += 1
+            self._last_tick = taken
+        series._append(taken - self._start, values)
@@ -0,0 +1,158 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Seccomp whitelist policies, content-addressed per host. A policy is
+        named by the hash of its normalised (deduplicated, sorted) syscall
+        list and written once to a shared directory on the host; containers
+        reference it by path via lxc.seccomp.
+
+"""
+
+import hashlib
+import posixpath
+import threading
+from collections import OrderedDict
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from ..common.connectors.transfer import transfer_for
+from ..common.metrics import host_label
+
+
+class UnknownSyscalls(Exception):
+    def __init__(self, syscalls, **kwargs):
+        super(UnknownSyscalls, self).__init__(**kwargs)
+        self.syscalls = syscalls
+        self.message = 'Syscalls unknown to the host: {names}'.format(
+            names=', '.join(syscalls))
+
+    def __str__(self):
+        return self.message
+
+
+def normalise(syscall_whitelist):
+    return sorted(set(syscall.strip() for syscall in syscall_whitelist
+                      if syscall.strip()))
+
+
+def render_policy(syscall_whitelist):
+    """ LXC seccomp whitelist policy file contents """
+    return '1\nwhitelist\n0\n' + ''.join(
+        '{sys_call}\n'.format(sys_call=syscall)
+        for syscall in syscall_whitelist)
+
+
+class SeccompPolicyCache(object):
+    """ Seccomp policies written to one host, evicted LRU by count/size """
+
+    POLICY_DIR = '/var/tmp/containercafe/seccomp'
+
+    # Prints one syscall name per line: from auditd's table if installed,
+    # else from the kernel headers.
+    SYSCALL_TABLE_CMD = (
+        "{ ausyscall --dump 2>/dev/null | awk 'NR > 1 {print $2}'; "
+        "cat /usr/include/asm/unistd_64.h "
+        "/usr/include/x86_64-linux-gnu/asm/unistd_64.h 2>/dev/null | "
+        "awk '/^#define __NR_/ {sub(\"__NR_\", \"\", $2); print $2}'; }")
+
+    def __init__(self, policy_dir=None, max_entries=64,
+                 max_bytes=1024 * 1024, validate=True):
+        self.policy_dir = policy_dir or self.POLICY_DIR
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.validate = validate
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._syscall_table = None
+        self._lock = threading.Lock()
+
+    def policy(self, connection, syscall_whitelist):
+        """ Remote path of the policy for syscall_whitelist, written over
+        connection if the host doesn't have it yet """
+        syscalls = normalise(syscall_whitelist)
+        if self.validate:
+            self._check_syscalls(connection, syscalls)
+
+        content = render_policy(syscalls)
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        path = posixpath.join(self.policy_dir, '{0}.seccomp'.format(digest))
+
+        with self._lock:
+            if digest in self._entries:
+                # Refresh LRU position
+                self._entries[digest] = self._entries.pop(digest)
+                return path
+
+            # This cache (not the connection's transfer) knows what is on
+            # the host: another connection may have evicted the file
+            transfer_for(connection).put_data({path: content}, force=True)
+            self._entries[digest] = (path, len(content))
+            self._bytes += len(content)
+            evicted = self._evict()
+
+        if evicted:
+            self._remove(connection, evicted)
+        return path
+
+    @property
+    def total_bytes(self):
+        """ Size of the policies on the host (kept up to date under the
+        lock by policy() and _evict()) """
+        return self._bytes
+
+    def _evict(self):
+        """ Pop least recently used entries over the limits (lock held) """
+        evicted = list()
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or
+                self._bytes > self.max_bytes):
+            _, (path, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            evicted.append(path)
+        return evicted
+
+    def _remove(self, connection, paths):
+        connection.execute(cmd='rm -f {paths}'.format(
+            paths=' '.join(quote(path) for path in paths)))
+
+    def _check_syscalls(self, connection, syscalls):
+        if self._syscall_table is None:
+            result = connection.execute(cmd=self.SYSCALL_TABLE_CMD)
+            self._syscall_table = frozenset(
+                result.text.split()) if result.returncode == 0 else ()
+
+        # An empty table means the host can't tell us: skip validation
+        unknown = [syscall for syscall in syscalls
+                   if self._syscall_table and
+                   syscall not in self._syscall_table]
+        if unknown:
+            raise UnknownSyscalls(unknown)
+
+
+_POLICY_CACHES = dict()
+_POLICY_CACHES_LOCK = threading.Lock()
+
+
+def policy_cache_for(connection, **kwargs):
+    """ The SeccompPolicyCache of the host connection points at """
+    host = host_label(connection)
+    with _POLICY_CACHES_LOCK:
+        cache = _POLICY_CACHES.get(host)
+        if cache is None:
+            cache = _POLICY_CACHES[host] = SeccompPolicyCache(**kwargs)
+        return cache
@@ -0,0 +1,194 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Reclaim what crashed runs leave behind on a host: containers whose
+        name starts with a run/name prefix, and their *.lxc-sectest config
+        workspaces. Containers are found with one host query and torn down
+        in parallel.
+
+    containercafe-sweep --host <ip> --username <user> [--password <pw>]
+                        [--port 22] [--workers 8] <prefix> [<prefix> ...]
+
+"""
+
+import argparse
+import json
+import time
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from ..common.fleet import ContainerFleet, LifecycleError
+from ..common.states import State
+from .client import LxcClient
+from .hoststate import state_cache_for
+
+
+class SweepReport(object):
+    """ What a sweep found and reclaimed """
+
+    def __init__(self, prefixes):
+        self.prefixes = prefixes
+        self.containers = dict()
+        self.destroyed = list()
+        self.failed = dict()
+        self.workspaces = list()
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return json.dumps(self.to_dict, indent=2, sort_keys=True)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    @property
+    def to_dict(self):
+        return {"prefixes": self.prefixes,
+                "containers": self.containers,
+                "destroyed": self.destroyed,
+                "failed": self.failed,
+                "workspaces": self.workspaces,
+                "elapsed": self.elapsed}
+
+
+class ContainerSweeper(object):
+    """ Stop and destroy leaked containers on one host.
+
+    connect() must return a new connection to the host each time it is
+    called: containers are torn down in parallel, one connection each.
+    """
+
+    WORKSPACE_GLOB = '*.lxc-sectest'
+
+    def __init__(self, connect, max_workers=8,
+                 tmpdir_root=LxcClient.TMPDIR_ROOT):
+        self.connect = connect
+        self.max_workers = max_workers
+        self.tmpdir_root = tmpdir_root
+
+    def find(self, *prefixes):
+        """ {name: LXC state} of the host's containers matching a prefix """
+        connection = self.connect()
+        try:
+            states = state_cache_for(connection).states(
+                connection, since=time.time())
+        finally:
+            self._release(connection)
+
+        if states is None:
+            return dict()
+        return dict((name, state) for name, state in states.items()
+                    if name.startswith(prefixes))
+
+    def sweep(self, *prefixes):
+        """ Tear down matching containers and remove their workspaces """
+        started = time.time()
+        report = SweepReport(list(prefixes))
+        report.containers = self.find(*prefixes)
+
+        if report.containers:
+            fleet = ContainerFleet(
+                client_factory=self._client, max_workers=self.max_workers,
+                per_host_limit=self.max_workers)
+            clients = [self._client(name) for name in report.containers]
+            for result in fleet.map(self._tear_down, clients):
+                if result.ok:
+                    report.destroyed.append(result.name)
+                else:
+                    report.failed[result.name] = str(result.error)
+
+        report.workspaces = self.remove_workspaces(*prefixes)
+        report.elapsed = time.time() - started
+        return report
+
+    def remove_workspaces(self, *prefixes):
+        """ Remove matching config workspaces; returns the removed paths """
+        patterns = ' '.join(
+            '{prefix}{glob}'.format(
+                prefix=quote('{root}/{prefix}'.format(
+                    root=self.tmpdir_root.rstrip('/'), prefix=prefix)),
+                glob=self.WORKSPACE_GLOB)
+            for prefix in prefixes)
+        cmd = ('for ws in {patterns}; do [ -e "$ws" ] && rm -rf "$ws" && '
+               'echo "$ws"; done; true').format(patterns=patterns)
+
+        connection = self.connect()
+        try:
+            result = connection.execute(cmd=cmd)
+        finally:
+            self._release(connection)
+        return result.text.split()
+
+    def _client(self, name, preset_cfg=None):
+        client = LxcClient(name=name, connection=self.connect())
+        client.clean_container = True
+        return client
+
+    @classmethod
+    def _tear_down(cls, client):
+        # The state snapshot taken by find() tells the client what it has
+        try:
+            client.reconcile()
+        finally:
+            ContainerFleet.tear_down(client)
+        if client._state.value != State.DESTROYED:
+            raise LifecycleError(
+                name=client.name, step='sweep',
+                result='host state {state}'.format(
+                    state=client._query_state(since=time.time())))
+
+    @classmethod
+    def _release(cls, connection):
+        close = getattr(connection, 'close', None)
+        if close is not None:
+            close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Stop and destroy leaked containers on an LXC host')
+    parser.add_argument('prefixes', nargs='+',
+                        help='container name (or run) prefixes to sweep')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    # The SSH client comes with cafe: only needed when run as a command
+    from ..common.connectors.pool import ConnectionPool
+    from ..common.connectors.ssh import close_ssh, open_ssh
+
+    pool = ConnectionPool(connect=open_ssh, close=close_ssh,
+                          max_size=args.workers)
+    sweeper = ContainerSweeper(
+        connect=lambda: pool.acquire(
+            args.host, args.port, args.username, args.password),
+        max_workers=args.workers)
+    try:
+        report = sweeper.sweep(*args.prefixes)
+    finally:
+        pool.close_all()
+
+    print(report)
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Bring up and tear down N containers on a simulated host with a
+        thread-per-container ContainerFleet and with AsyncLxcClients on a
+        single event loop (Python 3 only).
+
+    python -m metatests.benchmarks.aio [--sizes 10 100 1000]
+                                       [--latency 0.01] [--concurrency 64]
+
+"""
+
+import argparse
+import asyncio
+import time
+
+from containercafe.common.fleet import ContainerFleet
+from containercafe.lxc.aio import AsyncContainerBehavior, AsyncLxcClient
+from containercafe.lxc.client import LxcClient
+
+from .simulated_host import (
+    SimulatedConnection, SimulatedLxcHost, SimulatedSetupConfig)
+
+
+class AsyncSimulatedConnection(object):
+    """ Async connection to a SimulatedLxcHost: latency doesn't block """
+
+    def __init__(self, host):
+        self.simulated_host = host
+        self.host = host.name
+        self.sync = SimulatedConnection(host)
+
+    async def execute(self, cmd, **kwargs):
+        delay = self.simulated_host.delay(cmd)
+        if delay:
+            await asyncio.sleep(delay)
+        return self.simulated_host.apply(cmd, delay)
+
+    def close(self):
+        pass
+
+
+def bench_threads(host, names, concurrency):
+    def _client(name, preset_cfg=None):
+        client = LxcClient(name=name, connection=host.connect())
+        client.poll_interval = SimulatedSetupConfig.lxc_poll_interval
+        return client
+
+    fleet = ContainerFleet(client_factory=_client, max_workers=concurrency,
+                           per_host_limit=concurrency)
+    results = fleet.up(names)
+    fleet.down(results.clients)
+    return len(results.succeeded)
+
+
+def bench_asyncio(host, names, concurrency):
+    connection = AsyncSimulatedConnection(host)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _lifecycle(name):
+        client = AsyncLxcClient(name=name, connection=connection)
+        client.poll_interval = SimulatedSetupConfig.lxc_poll_interval
+        async with slots:
+            async with AsyncContainerBehavior(client):
+                pass
+        return True
+
+    async def _all():
+        return await asyncio.gather(*[_lifecycle(name) for name in names])
+
+    loop = asyncio.new_event_loop()
+    try:
+        return sum(loop.run_until_complete(_all()))
+    finally:
+        loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Threads vs asyncio against a simulated LXC host')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='simulated seconds per host command')
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    print('{0:<10}{1:>7}{2:>10}{3:>12}{4:>14}'.format(
+        'driver', 'N', 'ok', 'seconds', 'containers/s'))
+    for count in args.sizes:
+        for driver, bench in (('threads', bench_threads),
+                              ('asyncio', bench_asyncio)):
+            host = SimulatedLxcHost(
+                name='{0}-{1}'.format(driver, count), latency=args.latency)
+            names = ['bench-{0}'.format(index) for index in range(count)]
+            started = time.time()
+            ok = bench(host, names, args.concurrency)
+            elapsed = time.time() - started
+            print('{0:<10}{1:>7}{2:>10}{3:>12.3f}{4:>14.1f}'.format(
+                driver, count, ok, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
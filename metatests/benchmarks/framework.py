@@ -0,0 +1,176 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Measure the overhead containercafe itself adds, by running the
+        clients, behaviors and factory against a simulated LXC host.
+        Reports lifecycle ops/sec, framework time per host command (wall
+        time minus simulated host latency) and memory per client.
+
+    python -m metatests.benchmarks.framework [--sizes 1 10 100 1000]
+                                             [--latency 0.0]
+
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+from containercafe.common.behaviors import ContainerBehavior
+from containercafe.common.clients.host import HostContainerClient
+from containercafe.lxc.client import LxcClient
+
+from .simulated_host import SimulatedLxcHost, SimulatedSetupConfig
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Lifecycle operations performed per container by each workload
+LIFECYCLE_OPS = 7   # create, wait, start, wait, stop, wait, destroy
+
+
+def _lxc_client(host, index):
+    client = LxcClient(name='bench-{0}'.format(index),
+                       connection=host.connect())
+    client.poll_interval = SimulatedSetupConfig.lxc_poll_interval
+    return client
+
+
+def bench_lxc_client(host, count):
+    clients = [_lxc_client(host, index) for index in range(count)]
+    for client in clients:
+        client.create()
+        client.wait(client.STOPPED)
+        client.start()
+        client.wait(client.RUNNING)
+        client.stop()
+        client.wait(client.STOPPED)
+        client.destroy()
+        client.clean()
+    return count * LIFECYCLE_OPS
+
+
+def bench_container_behavior(host, count):
+    for index in range(count):
+        with ContainerBehavior(_lxc_client(host, index)):
+            pass
+    return count * LIFECYCLE_OPS
+
+
+def bench_host_client(host, count):
+    clients = [HostContainerClient(name='bench-{0}'.format(index),
+                                   connection=host.connect())
+               for index in range(count)]
+    for client in clients:
+        client.execute('uname -a')
+        client.clean()
+    return count
+
+
+def bench_factory(host, count):
+    # The factory needs the cafe SSH client to be importable
+    from containercafe.common.connectors.pool import ConnectionPool
+    from containercafe.common.factories.container import BuildContainerClient
+
+    BuildContainerClient.CONNECTION_POOL = ConnectionPool(
+        connect=host.connect, max_size=SimulatedSetupConfig.ssh_pool_size)
+    factory = BuildContainerClient(
+        container_type=BuildContainerClient.LXC,
+        test_ref_point=BuildContainerClient.HOST, test_config=None,
+        container_config=SimulatedSetupConfig(), container_name='bench')
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        for _ in range(count):
+            factory.get_client().clean()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return count
+
+
+WORKLOADS = (('LxcClient', bench_lxc_client),
+             ('ContainerBehavior', bench_container_behavior),
+             ('HostContainerClient', bench_host_client),
+             ('BuildContainerClient', bench_factory))
+
+
+def measure(workload, count, latency):
+    host = SimulatedLxcHost(latency=latency)
+    gc.collect()
+    started = time.time()
+    ops = workload(host, count)
+    elapsed = time.time() - started
+    overhead = (elapsed - host.simulated_time) / max(host.commands, 1)
+    return {'ops_per_sec': ops / elapsed if elapsed else float('inf'),
+            'overhead_ms': overhead * 1000,
+            'commands': host.commands}
+
+
+def memory_per_client(count):
+    """ Bytes allocated per idle LxcClient (needs tracemalloc) """
+    if tracemalloc is None:
+        return None
+    host = SimulatedLxcHost()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        clients = [_lxc_client(host, index) for index in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    for client in clients:
+        client.clean()
+    return (after - before) / float(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark containercafe against a simulated LXC host')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1, 10, 100, 1000])
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated seconds per host command')
+    args = parser.parse_args()
+
+    print('{0:<22}{1:>7}{2:>10}{3:>14}{4:>16}'.format(
+        'workload', 'N', 'commands', 'ops/sec', 'overhead ms/cmd'))
+    for name, workload in WORKLOADS:
+        for count in args.sizes:
+            try:
+                stats = measure(workload, count, args.latency)
+            except (ImportError, SyntaxError) as err:
+                # The factory needs cafe's SSH client (and Python 2)
+                print('{0:<22}skipped ({1})'.format(name, err))
+                break
+            print('{0:<22}{1:>7}{2:>10}{3:>14.1f}{4:>16.4f}'.format(
+                name, count, stats['commands'], stats['ops_per_sec'],
+                stats['overhead_ms']))
+
+    print('')
+    print('{0:<22}{1:>7}{2:>18}'.format('memory', 'N', 'bytes/LxcClient'))
+    for count in args.sizes:
+        per_client = memory_per_client(count)
+        print('{0:<22}{1:>7}{2:>18}'.format(
+            'LxcClient', count,
+            'n/a' if per_client is None else '{0:.0f}'.format(per_client)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Import-time budget. Imports each module in a fresh interpreter
+        (best of --repeat runs) and fails (exit status 1) when one takes
+        longer than --budget milliseconds, when it drags in a module that
+        should only be imported on first use (the SSH stack, NumPy, cafe and
+        setuptools, asyncio, container backends), or when it can't be
+        imported at all. metatests/common/test_import_time.py runs the same
+        check as part of the test suite.
+
+    python -m metatests.benchmarks.import_time [--budget 100]
+                                               [--repeat 5]
+                                               [--module containercafe]
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# The children import the package from this checkout
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+MODULES = ('containercafe', 'containercafe.common.factories.container')
+
+# Milliseconds allowed per module import
+BUDGET = 100.0
+
+# Imported by the registry / factory methods when first needed
+LAZY = ('paramiko', 'numpy', 'pkg_resources', 'cafe', 'asyncio',
+        'containercafe.common.config', 'containercafe.lxc.client',
+        'containercafe.common.connectors.jump')
+
+# The standard library modules the package uses are imported before the
+# clock starts: the budget is for containercafe's own modules (interpreter
+# start-up and stdlib import speed vary too much between machines)
+STDLIB = ('atexit', 'codecs', 'collections', 'errno', 'hashlib', 'importlib',
+          'json', 'logging', 're', 'select', 'shlex', 'signal', 'subprocess',
+          'tempfile', 'threading', 'time', 'uuid')
+
+CHILD = r'''
+import json, sys, time, traceback
+for name in {stdlib!r}:
+    __import__(name)
+started = time.time()
+try:
+    __import__({module!r})
+except Exception:
+    print(json.dumps({{"error": traceback.format_exc()}}))
+    sys.exit()
+elapsed = time.time() - started
+lazy = [name for name in sys.modules if sys.modules[name] is not None and
+        any(name == prefix or name.startswith(prefix + '.')
+            for prefix in {lazy!r})]
+print(json.dumps({{"seconds": elapsed, "lazy": sorted(lazy)}}))
+'''
+
+
+class ImportFailed(Exception):
+    def __init__(self, module, error, **kwargs):
+        super(ImportFailed, self).__init__(**kwargs)
+        self.message = 'Unable to import {module}:\n{error}'.format(
+            module=module, error=error)
+
+    def __str__(self):
+        return self.message
+
+
+def measure(module, repeat):
+    """ (best seconds, eagerly imported lazy modules); ImportFailed if
+    module can't be imported """
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             CHILD.format(module=module, lazy=LAZY, stdlib=STDLIB)],
+            cwd=ROOT)
+        result = json.loads(output.decode('utf-8'))
+        if 'error' in result:
+            raise ImportFailed(module=module, error=result['error'])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best['seconds'], best['lazy']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check module import times against a budget')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help='milliseconds allowed per module import')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='fresh interpreters per module (best is kept)')
+    parser.add_argument('--module', action='append', dest='modules',
+                        help='module to import (repeatable; default: '
+                             'containercafe and the container factory)')
+    args = parser.parse_args()
+
+    failed = False
+    print('{0:<45}{1:>10}  {2}'.format('module', 'ms', 'eager imports'))
+    for module in args.modules or MODULES:
+        try:
+            seconds, lazy = measure(module, args.repeat)
+        except ImportFailed as err:
+            failed = True
+            print('{0:<45}{1:>10}\n{2}'.format(module, 'FAILED', err))
+            continue
+        over = seconds * 1000 > args.budget
+        failed = failed or over or bool(lazy)
+        print('{0:<45}{1:>10.1f}  {2}{3}'.format(
+            module, seconds * 1000, ', '.join(lazy) or '-',
+            '  OVER BUDGET' if over else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
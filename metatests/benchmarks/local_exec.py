@@ -0,0 +1,73 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Spawn latency of short local commands: through a shell (the old
+        commands module, Command.run_command) versus LocalExecutor's direct
+        argv spawning (subprocess and posix_spawn).
+
+    python -m metatests.benchmarks.local_exec [--count 2000]
+                                              [--cmd "true"]
+
+"""
+
+import argparse
+import time
+
+from containercafe.common.connectors.localhost import LocalExecutor
+from containercafe.common.connectors.process import Command, CommandError
+
+try:
+    from commands import getoutput
+except ImportError:
+    from subprocess import getoutput
+
+
+def _run_command(cmd):
+    try:
+        return Command.run_command(cmd)
+    except CommandError as err:
+        return err.result
+
+
+def runners():
+    runners = [('shell: commands.getoutput', getoutput),
+               ('shell: Command.run_command', _run_command),
+               ('argv: subprocess', LocalExecutor(use_posix_spawn=False).run)]
+    spawn = LocalExecutor()
+    if spawn.use_posix_spawn:
+        runners.append(('argv: posix_spawn', spawn.run))
+    return runners
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Spawn latency of short local commands')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--cmd', default='true')
+    args = parser.parse_args()
+
+    print('{0:<30}{1:>10}{2:>14}'.format('executor', 'commands', 'us/command'))
+    for name, run in runners():
+        run(args.cmd)   # warm up (path lookups, imports)
+        started = time.time()
+        for _ in range(args.count):
+            run(args.cmd)
+        elapsed = time.time() - started
+        print('{0:<30}{1:>10}{2:>14.1f}'.format(
+            name, args.count, elapsed / args.count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
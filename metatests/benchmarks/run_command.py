@@ -0,0 +1,94 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Compare Command.run_command against the original poll()/readline()
+        loop on multi-MB outputs.
+
+    python -m metatests.benchmarks.run_command [--sizes-mb 1 8 32]
+
+"""
+
+import argparse
+import subprocess
+import time
+
+from containercafe.common.connectors.process import Command
+
+
+def legacy_run_command(cmd):
+    """ The original line-at-a-time loop (drops output buffered at exit) """
+    output = bytearray()
+    proc = subprocess.Popen(cmd, shell=True,
+                            stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT,
+                            close_fds=True)
+
+    while proc.poll() is None:
+        line = proc.stdout.readline()
+        if line is None:
+            break
+        output.extend(line)
+    proc.stdout.close()
+    return output
+
+
+def chunked_run_command(cmd):
+    return Command.run_command(cmd).output
+
+
+def bench(func, cmd, repeat):
+    best = None
+    captured = 0
+    for _ in range(repeat):
+        started = time.time()
+        captured = len(func(cmd))
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, captured
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark Command.run_command output collection')
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workloads = (
+        ('lines', 'head -c {size} /dev/zero | tr "\\0" "x" | fold -w 79'),
+        ('no-newline', 'head -c {size} /dev/zero | tr "\\0" "x"'))
+
+    print('{0:<12}{1:>8}{2:>12}{3:>12}{4:>14}{5:>14}'.format(
+        'workload', 'MB', 'legacy s', 'chunked s', 'legacy MB/s',
+        'chunked MB/s'))
+    for name, template in workloads:
+        for size_mb in args.sizes_mb:
+            cmd = template.format(size=size_mb * 1024 * 1024)
+            legacy, legacy_bytes = bench(legacy_run_command, cmd, args.repeat)
+            chunked, chunked_bytes = bench(
+                chunked_run_command, cmd, args.repeat)
+            print('{0:<12}{1:>8}{2:>12.3f}{3:>12.3f}{4:>14.1f}{5:>14.1f}'
+                  '{6}'.format(
+                      name, size_mb, legacy, chunked,
+                      legacy_bytes / legacy / 2 ** 20,
+                      chunked_bytes / chunked / 2 ** 20,
+                      '' if legacy_bytes == chunked_bytes else
+                      '  (legacy lost {0} bytes)'.format(
+                          chunked_bytes - legacy_bytes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: Bring a fleet of containers up and down through
+        BuildContainerClient, spread over several simulated hosts of
+        different capacity and speed, once per placement policy. Reports
+        the containers placed on each host and the fleet's wall time.
+
+    python -m metatests.benchmarks.scheduler [--count 60]
+                                             [--latency 0.002]
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from containercafe.common.connectors.pool import ConnectionPool
+from containercafe.common.factories.scheduler import HostScheduler
+from containercafe.common.fleet import ContainerFleet
+
+from .simulated_host import SimulatedLxcHost, SimulatedSetupConfig
+
+# name, capacity, relative command latency (bigger hosts are faster)
+HOSTS = (('sim-a', 10, 4.0), ('sim-b', 20, 2.0), ('sim-c', 40, 1.0))
+
+
+def run(policy, count, latency):
+    # The factory needs the cafe SSH client to be importable
+    from containercafe.common.factories.container import BuildContainerClient
+
+    hosts = dict((name, SimulatedLxcHost(name=name, latency=latency * slow))
+                 for name, _, slow in HOSTS)
+
+    class Config(SimulatedSetupConfig):
+        container_hosts = tuple('{0}@{1}'.format(name, capacity)
+                                for name, capacity, _ in HOSTS)
+        placement_policy = policy
+
+    BuildContainerClient.CONNECTION_POOL = ConnectionPool(
+        connect=lambda ip, *args: hosts[ip].connect(), max_size=count)
+    BuildContainerClient.SCHEDULER = None
+    factory = BuildContainerClient(
+        container_type=BuildContainerClient.LXC,
+        test_ref_point=BuildContainerClient.HOST_TO_CONTAINER,
+        test_config=None, container_config=Config(), container_name='bench')
+
+    def client_factory(name, preset_cfg=None):
+        client = factory.get_client(container_name=name)
+        client.poll_interval = Config.lxc_poll_interval
+        return client
+
+    fleet = ContainerFleet(client_factory=client_factory, max_workers=count,
+                           per_host_limit=SimulatedSetupConfig.ssh_pool_size)
+    names = ['bench-{0}'.format(index) for index in range(count)]
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        started = time.time()
+        results = fleet.up(names)
+        placed = BuildContainerClient.SCHEDULER.counts
+        results = fleet.down(results.clients)
+        elapsed = time.time() - started
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    left = sum(BuildContainerClient.SCHEDULER.counts.values())
+    return placed, elapsed, len(results.failed), left
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare container placement policies')
+    parser.add_argument('--count', type=int, default=60,
+                        help='containers (at most the total capacity, 70)')
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='simulated seconds per command on the '
+                             'fastest host')
+    args = parser.parse_args()
+
+    labels = ['{0}:22'.format(name) for name, _, _ in HOSTS]
+    print('{0:<20}{1}{2:>10}{3:>8}{4:>6}'.format(
+        'policy', ''.join('{0:>10}'.format(name) for name, _, _ in HOSTS),
+        'seconds', 'failed', 'live'))
+    for policy in HostScheduler.POLICIES:
+        try:
+            placed, elapsed, failed, left = run(
+                policy, args.count, args.latency)
+        except (ImportError, SyntaxError) as err:
+            # The factory needs cafe's SSH client (and Python 2)
+            print('{0:<20}skipped ({1})'.format(policy, err))
+            continue
+        print('{0:<20}{1}{2:>10.2f}{3:>8}{4:>6}'.format(
+            policy, ''.join('{0:>10}'.format(placed[label])
+                            for label in labels),
+            elapsed, failed, left))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Purpose: An in-process stand-in for an LXC host. SimulatedConnection looks
+        like the connections handed to the clients (execute(cmd) returning a
+        CommandResult) and interprets the lxc-* commands against an
+        in-memory container table, with configurable per-command latency.
+
+"""
+
+import shlex
+import threading
+import time
+
+from containercafe.common.connectors.process import CommandResult
+
+
+class SimulatedLxcHost(object):
+    """ Container table shared by every connection to one simulated host """
+
+    def __init__(self, name='simulated', latency=0.0, latencies=None):
+        """ latency is added to every command (e.g. the SSH round trip);
+        latencies maps a command name (lxc-create, ...) to extra seconds. """
+        self.name = name
+        self.latency = latency
+        self.latencies = latencies or dict()
+        self.containers = dict()
+        self.commands = 0
+        self.simulated_time = 0.0
+        self._lock = threading.Lock()
+
+    def connect(self, *args, **kwargs):
+        """ Usable as a ConnectionPool connect function """
+        return SimulatedConnection(self)
+
+    def run(self, cmd):
+        delay = self.delay(cmd)
+        if delay:
+            time.sleep(delay)
+        return self.apply(cmd, delay)
+
+    def delay(self, cmd):
+        """ Simulated seconds cmd takes """
+        program = cmd.split(None, 1)[0] if cmd.strip() else ''
+        return self.latency + self.latencies.get(program, 0.0)
+
+    def apply(self, cmd, delay=0.0):
+        """ Run cmd against the container table (without waiting) """
+        # Only lxc-* commands are interpreted: don't tokenize the rest
+        # (file uploads carry large payloads)
+        program = cmd.split(None, 1)[0] if cmd.strip() else ''
+        argv = shlex.split(cmd) if program.startswith('lxc-') else [program]
+        with self._lock:
+            self.commands += 1
+            self.simulated_time += delay
+            handler = getattr(
+                self, '_' + program.replace('-', '_'), self._other)
+            return handler(self._option(argv, '-n'), argv)
+
+    # lxc-* commands
+    # ----------------------------------------------------
+    def _lxc_create(self, name, argv):
+        if name in self.containers:
+            return CommandResult(1, '{0} already exists\n'.format(name))
+        self.containers[name] = 'STOPPED'
+        return CommandResult(0, '')
+
+    def _lxc_start(self, name, argv):
+        if name not in self.containers:
+            self.containers[name] = 'STOPPED'
+        self.containers[name] = 'RUNNING'
+        return CommandResult(0, '')
+
+    def _lxc_stop(self, name, argv):
+        if self.containers.get(name) != 'RUNNING':
+            return CommandResult(2, '{0} is not running\n'.format(name))
+        self.containers[name] = 'STOPPED'
+        return CommandResult(0, '')
+
+    def _lxc_destroy(self, name, argv):
+        if self.containers.get(name) != 'STOPPED':
+            return CommandResult(1, 'Unable to destroy {0}\n'.format(name))
+        del self.containers[name]
+        return CommandResult(0, '')
+
+    def _lxc_info(self, name, argv):
+        if name not in self.containers:
+            return CommandResult(1, '{0} doesn\'t exist\n'.format(name))
+        return CommandResult(0, 'State:          {0}\n'.format(
+            self.containers[name]))
+
+    def _lxc_wait(self, name, argv):
+        wanted = self._option(argv, '-s')
+        state = self.containers.get(name)
+        return CommandResult(0 if state == wanted else 1, '')
+
+    def _lxc_ls(self, name, argv):
+        lines = ['NAME STATE']
+        lines.extend('{0} {1}'.format(container, state)
+                     for container, state in sorted(self.containers.items()))
+        return CommandResult(0, '\n'.join(lines) + '\n')
+
+    def _lxc_execute(self, name, argv):
+        return CommandResult(0, '')
+
+    def _lxc_snapshot(self, name, argv):
+        return CommandResult(0 if name in self.containers else 1, '')
+
+    def _other(self, name, argv):
+        return CommandResult(0, '')
+
+    @classmethod
+    def _option(cls, argv, flag):
+        if flag in argv and argv.index(flag) + 1 < len(argv):
+            return argv[argv.index(flag) + 1]
+        return None
+
+
+class SimulatedConnection(object):
+    """ Connection to a SimulatedLxcHost """
+
+    def __init__(self, host):
+        self.simulated_host = host
+        self.host = host.name
+
+    def execute(self, cmd, **kwargs):
+        return self.simulated_host.run(cmd)
+
+    def close(self):
+        pass
+
+
+class SimulatedSetupConfig(object):
+    """ ContainersSetupConfig values pointing at a simulated host """
+
+    container_type = 'lxc'
+    default_container_name = 'bench'
+    host_ip = 'simulated'
+    host_port = 22
+    container_hosts = ()
+    placement_policy = 'least_loaded'
+    host_username = 'bench'
+    host_password = 'bench'
+    container_ip = 'simulated-container'
+    container_username = 'bench'
+    container_password = 'bench'
+    lxc_cmd_delay = 0.0
+    lxc_verify_completion = True
+    lxc_poll_timeout = 5.0
+    lxc_poll_interval = 0.001
+    lxc_state_ttl = 2.0
+    ssh_pool_size = 8
+    ssh_pool_idle_ttl = 300.0
+    metrics_enabled = False
+    metrics_dir = '.'
+    sweep_prefixes = ()
+    probe_cache_ttl = 0.0
+    probe_cache_size = 256
+    no_cleanup = False
+    show_configs = False
+    primary_flavor = None
+    secondary_flavor = None
+    primary_image = None
+    secondary_image = None
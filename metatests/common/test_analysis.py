@@ -0,0 +1,57 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+KB = 1024
+
+# Seconds, and memory use peaking over the 100KB limit once
+TIMES = [0, 1, 2, 3]
+WITHIN_TOLERANCE = [50 * KB, 105 * KB, 60 * KB, 60 * KB]
+OVER_TOLERANCE = [50 * KB, 115 * KB, 60 * KB, 60 * KB]
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class MemoryLimitCheckTest(unittest.TestCase):
+
+    def run_check(self, values, **kwargs):
+        from containercafe.common.analysis import MemoryLimitCheck
+        return MemoryLimitCheck(100, 10, **kwargs).run(
+            {'web01': (TIMES, values)})['web01']
+
+    def test_within_tolerance_passes(self):
+        verdict = self.run_check(WITHIN_TOLERANCE)
+        self.assertEqual(verdict.violations, 0)
+        self.assertEqual(verdict.windows, 1)
+        self.assertTrue(verdict.ok)
+
+    def test_over_tolerance_fails(self):
+        verdict = self.run_check(OVER_TOLERANCE)
+        self.assertEqual(verdict.violations, 1)
+        self.assertFalse(verdict.ok)
+
+    def test_sustained_window_fails_when_asked_for(self):
+        self.assertFalse(self.run_check(WITHIN_TOLERANCE, sustain=1.0).ok)
+        self.assertTrue(self.run_check(WITHIN_TOLERANCE, sustain=2.0).ok)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+import unittest
+
+from containercafe.common.behaviors import ContainerFleetBehavior
+from containercafe.common.fleet import ContainerFleet, LifecycleError
+from containercafe.lxc.client import LxcClient
+
+from ..benchmarks.simulated_host import SimulatedLxcHost
+
+
+class ConcurrencyTrackingHost(SimulatedLxcHost):
+    """ SimulatedLxcHost recording how many commands ran at once """
+
+    def __init__(self, *args, **kwargs):
+        super(ConcurrencyTrackingHost, self).__init__(*args, **kwargs)
+        self.active = 0
+        self.peak = 0
+        self._active_lock = threading.Lock()
+
+    def run(self, cmd):
+        with self._active_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return super(ConcurrencyTrackingHost, self).run(cmd)
+        finally:
+            with self._active_lock:
+                self.active -= 1
+
+
+class ContainerFleetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = dict(
+            (name, ConcurrencyTrackingHost(name=name, latency=0.005))
+            for name in ('host-a', 'host-b'))
+        self.broken = set()
+
+    def client_factory(self, name, preset_cfg):
+        if name in self.broken:
+            raise RuntimeError('no connection for {0}'.format(name))
+        host = self.hosts['host-a' if name.startswith('a') else 'host-b']
+        client = LxcClient(name=name, connection=host.connect())
+        client.poll_interval = 0.001
+        return client
+
+    def test_per_host_limit(self):
+        fleet = ContainerFleet(self.client_factory, per_host_limit=2)
+        names = ['a{0}'.format(index) for index in range(6)] + \
+            ['b{0}'.format(index) for index in range(6)]
+
+        results = fleet.up(names)
+
+        self.assertEqual(len(results.succeeded), len(names))
+        for host in self.hosts.values():
+            self.assertEqual(host.peak, 2)
+            self.assertEqual(len(host.containers), 6)
+
+    def test_fleet_limit(self):
+        fleet = ContainerFleet(
+            self.client_factory, max_workers=1, per_host_limit=4)
+
+        fleet.up(['a0', 'a1', 'b0', 'b1'])
+
+        self.assertEqual(max(host.peak for host in self.hosts.values()), 1)
+
+    def test_failure_does_not_block_others(self):
+        # a1 already exists on the host, so lxc-create fails for it
+        self.hosts['host-a'].containers['a1'] = 'RUNNING'
+        fleet = ContainerFleet(self.client_factory, per_host_limit=1)
+
+        results = fleet.up(['a0', 'a1', 'a2'])
+
+        self.assertEqual([result.name for result in results],
+                         ['a0', 'a1', 'a2'])
+        self.assertEqual([result.name for result in results.succeeded],
+                         ['a0', 'a2'])
+        self.assertIsInstance(results[1].error, LifecycleError)
+        self.assertIn('create', str(results[1].error))
+        self.assertEqual(self.hosts['host-a'].containers['a2'], 'RUNNING')
+
+    def test_result_errors(self):
+        self.broken.add('b1')
+        fleet = ContainerFleet(self.client_factory)
+
+        results = fleet.up(['a0', 'b1'])
+
+        self.assertEqual([result.name for result in results.failed], ['b1'])
+        self.assertIsNone(results[1].client)
+        self.assertEqual(results.clients, [results[0].client])
+        self.assertEqual(results[1].to_dict['error'], 'no connection for b1')
+        self.assertFalse(results[1].to_dict['ok'])
+        self.assertTrue(results[0].to_dict['ok'])
+
+    def test_down(self):
+        fleet = ContainerFleet(self.client_factory)
+        results = fleet.up(['a0', 'b0'])
+
+        down = fleet.down(results.clients)
+
+        self.assertEqual(len(down.succeeded), 2)
+        for host in self.hosts.values():
+            self.assertEqual(host.containers, dict())
+
+
+class ContainerFleetBehaviorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = SimulatedLxcHost()
+
+    def client_factory(self, name, preset_cfg):
+        client = LxcClient(name=name, connection=self.host.connect())
+        client.poll_interval = 0.001
+        return client
+
+    def test_teardown_on_exception(self):
+        fleet = ContainerFleet(self.client_factory)
+        behavior = ContainerFleetBehavior(fleet, ['c0', 'c1', 'c2'])
+
+        def _run():
+            with behavior as results:
+                self.assertEqual(len(results.succeeded), 3)
+                self.assertEqual(len(self.host.containers), 3)
+                raise RuntimeError('test failed')
+
+        self.assertRaises(RuntimeError, _run)
+        self.assertEqual(self.host.containers, dict())
+
+    def test_teardown_of_partial_fleet(self):
+        self.host.containers['c1'] = 'RUNNING'
+        fleet = ContainerFleet(self.client_factory)
+
+        with ContainerFleetBehavior(fleet, ['c0', 'c2']) as results:
+            self.assertEqual(len(results.succeeded), 2)
+
+        self.assertEqual(self.host.containers, {'c1': 'RUNNING'})
@@ -0,0 +1,45 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+from ..benchmarks.import_time import (
+    BUDGET, ImportFailed, MODULES, measure)
+
+
+class ImportTimeTest(unittest.TestCase):
+    """ Importing the package (and the factory) stays cheap: no module that
+    should be imported on first use, and within the budget """
+
+    REPEAT = 3
+
+    def assertWithinBudget(self, module):
+        # An import error fails the test (ImportFailed), it isn't skipped
+        seconds, lazy = measure(module, self.REPEAT)
+        self.assertEqual(lazy, [], '{0} imported {1} eagerly'.format(
+            module, ', '.join(lazy)))
+        self.assertLess(seconds * 1000, BUDGET, '{0} took {1:.1f}ms'.format(
+            module, seconds * 1000))
+
+    def test_package(self):
+        self.assertWithinBudget(MODULES[0])
+
+    def test_factory(self):
+        self.assertWithinBudget(MODULES[1])
+
+    def test_import_error_fails(self):
+        self.assertRaises(ImportFailed, measure,
+                          'containercafe.no_such_module', 1)
@@ -0,0 +1,82 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import errno
+import os
+import time
+import unittest
+
+from containercafe.common.connectors.localhost import (
+    LocalExecutor, LocalHostClient)
+from containercafe.common.connectors.process import CommandTimeout
+
+
+class PopenExecutorTest(unittest.TestCase):
+
+    use_posix_spawn = False
+
+    def setUp(self):
+        self.executor = LocalExecutor(use_posix_spawn=self.use_posix_spawn)
+
+    def assertReaped(self, pid):
+        try:
+            os.waitpid(pid, os.WNOHANG)
+        except OSError as err:
+            self.assertEqual(err.errno, errno.ECHILD)
+        else:
+            self.fail('pid {0} was not reaped'.format(pid))
+
+    def test_exit_code(self):
+        result = self.executor.run('exit 3')
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(self.executor.run(['true']).returncode, 0)
+
+    def test_killed_by_signal(self):
+        result = self.executor.run('kill -TERM $$')
+        self.assertEqual(result.returncode, -15)
+
+    def test_output(self):
+        result = self.executor.run(['echo', 'a b'])
+        self.assertEqual(result.text, 'a b\n')
+        result = self.executor.run('echo out; echo err >&2',
+                                   merge_stderr=False)
+        self.assertEqual((result.text, result.stderr), ('out\n', b'err\n'))
+
+    def test_timeout(self):
+        started = time.time()
+        with self.assertRaises(CommandTimeout) as context:
+            self.executor.run('echo $$; sleep 30', timeout=0.3)
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(context.exception.result.returncode, -9)
+        self.assertReaped(int(context.exception.result.text))
+
+    def test_command_not_found(self):
+        result = self.executor.run(['containercafe-no-such-binary'])
+        self.assertEqual(result.returncode, 127)
+
+
+@unittest.skipUnless(hasattr(os, 'posix_spawn'), 'needs os.posix_spawn')
+class PosixSpawnExecutorTest(PopenExecutorTest):
+
+    use_posix_spawn = True
+
+
+class LocalHostClientTest(unittest.TestCase):
+
+    def test_status_execute(self):
+        client = LocalHostClient()
+        self.assertEqual(client.status_execute('printf "a\\n"; exit 1'),
+                         (1, 'a'))
@@ -0,0 +1,70 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+from containercafe.common.connectors.pool import (
+    ConnectionPool, ConnectionReleased)
+from containercafe.common.connectors.transfer import transfer_for
+from containercafe.lxc.client import LxcClient
+
+from ..benchmarks.simulated_host import SimulatedLxcHost
+
+
+class PooledConnectionReuseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = SimulatedLxcHost()
+        self.pool = ConnectionPool(connect=self.host.connect)
+
+    def lease(self):
+        return self.pool.acquire('simulated', 22, 'root')
+
+    def test_transfer_outlives_lease(self):
+        first = self.lease()
+        transfer = transfer_for(first)
+        first.close()
+
+        second = self.lease()
+        self.assertIs(transfer_for(second), transfer)
+        self.assertEqual(transfer.put_data({'/tmp/cfg': 'a'}), ['/tmp/cfg'])
+        self.assertRaises(ConnectionReleased, getattr, first, 'execute')
+
+    def test_lease_state_stays_on_lease(self):
+        first = self.lease()
+        first.marker = 'first'
+        connection = first.connection
+        first.close()
+
+        second = self.lease()
+        self.assertIs(second.connection, connection)
+        self.assertFalse(hasattr(connection, 'marker'))
+        self.assertFalse(hasattr(second, 'marker'))
+
+    def test_lease_same_connection_twice(self):
+        for name in ('first', 'second'):
+            client = LxcClient(name=name, connection=self.lease())
+            client.poll_interval = 0
+            client.create()
+            client.clean()
+
+        self.assertEqual(self.pool.stats()['misses'], 1)
+        self.assertEqual(self.pool.stats()['hits'], 1)
+        self.assertEqual(self.host.containers, dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
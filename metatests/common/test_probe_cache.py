@@ -0,0 +1,129 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+from containercafe.common.clients.cache import ProbeCache
+from containercafe.common.connectors.process import CommandResult
+from containercafe.lxc.client import LxcClient
+
+from ..benchmarks.simulated_host import SimulatedLxcHost
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ProbeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ProbeCache(ttl=10, max_entries=2, clock=self.clock)
+
+    def test_expires_after_ttl(self):
+        result = CommandResult(0, 'Linux')
+        self.cache.put('host', 'uname', result)
+        self.clock.now += 10
+        self.assertIs(self.cache.get('host', 'uname'), result)
+
+        self.clock.now += 0.5
+        self.assertIsNone(self.cache.get('host', 'uname'))
+        self.assertEqual(self.cache.stats,
+                         {'entries': 0, 'hits': 1, 'misses': 1})
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('host', 'a', CommandResult(0, 'a'))
+        self.cache.put('host', 'b', CommandResult(0, 'b'))
+        self.cache.get('host', 'a')
+        self.cache.put('host', 'c', CommandResult(0, 'c'))
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('host', 'b'))
+        self.assertEqual(self.cache.get('host', 'a').output, 'a')
+        self.assertEqual(self.cache.get('host', 'c').output, 'c')
+
+    def test_put_refreshes_age(self):
+        self.cache.put('host', 'a', CommandResult(0, 'old'))
+        self.clock.now += 8
+        self.cache.put('host', 'a', CommandResult(0, 'new'))
+        self.clock.now += 8
+        self.assertEqual(self.cache.get('host', 'a').output, 'new')
+
+    def test_failures_not_cached(self):
+        self.cache.put('host', 'a', CommandResult(1, 'error'))
+        self.assertIsNone(self.cache.get('host', 'a'))
+
+    def test_invalidate(self):
+        self.cache.put('one', 'a', CommandResult(0, 'a'))
+        self.cache.put('two', 'a', CommandResult(0, 'a'))
+        self.cache.invalidate('one')
+        self.assertIsNone(self.cache.get('one', 'a'))
+        self.assertIsNotNone(self.cache.get('two', 'a'))
+
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+
+
+class CountingHost(SimulatedLxcHost):
+    """ SimulatedLxcHost counting lxc-execute runs per container """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingHost, self).__init__(*args, **kwargs)
+        self.executes = dict()
+
+    def _lxc_execute(self, name, argv):
+        self.executes[name] = self.executes.get(name, 0) + 1
+        return CommandResult(0, 'probed {0}\n'.format(name))
+
+
+class ClientProbeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = CountingHost()
+        self.cache = ProbeCache(ttl=60)
+
+    def client(self, name):
+        client = LxcClient(name=name, connection=self.host.connect())
+        client.poll_interval = 0.001
+        client.probe_cache = self.cache
+        return client
+
+    def test_only_pure_commands_cached(self):
+        client = self.client('probe')
+        for _ in range(3):
+            self.assertEqual(client.execute('uname -a', pure=True).text,
+                             'probed probe\n')
+            client.execute('date')
+        self.assertEqual(self.host.executes['probe'], 4)
+
+    def test_lifecycle_commands_invalidate(self):
+        client = self.client('probe')
+        neighbour = self.client('neighbour')
+        client.execute('uname -a', pure=True)
+        neighbour.execute('uname -a', pure=True)
+
+        client.create()
+        client.wait(client.STOPPED)
+        client.execute('uname -a', pure=True)
+        neighbour.execute('uname -a', pure=True)
+
+        self.assertEqual(self.host.executes, {'probe': 2, 'neighbour': 1})
+        client.destroy()
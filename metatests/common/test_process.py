@@ -0,0 +1,134 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import errno
+import os
+import sys
+import time
+import unittest
+
+from containercafe.common.connectors.process import (
+    Command, CommandError, CommandResult, CommandTimeout, OutputBuffer)
+
+
+def _alive(pid):
+    """ True while pid runs (a zombie waiting for init counts as dead) """
+    try:
+        with open('/proc/{0}/stat'.format(pid)) as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno != errno.ESRCH
+    return True
+
+
+class RunCommandTest(unittest.TestCase):
+
+    def test_timeout_kills_process_group(self):
+        started = time.time()
+        with self.assertRaises(CommandTimeout) as context:
+            Command.run_command('sleep 30 & echo $!; wait', timeout=0.5)
+        self.assertLess(time.time() - started, 10)
+
+        pid = int(context.exception.result.text.strip())
+        deadline = time.time() + 5
+        while _alive(pid) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(_alive(pid))
+
+    def test_timeout_with_output_held_open(self):
+        # The shell exits at once, a background child keeps stdout open
+        started = time.time()
+        self.assertRaises(CommandTimeout, Command.run_command,
+                          'sleep 30 & echo started', timeout=0.5)
+        self.assertLess(time.time() - started, 10)
+
+    def test_merged_stderr(self):
+        result = Command.run_command('echo out; echo err >&2')
+        self.assertEqual(sorted(result.text.split()), ['err', 'out'])
+        self.assertIsNone(result.stderr)
+
+    def test_separate_stderr(self):
+        result = Command.run_command(
+            'echo out; echo err >&2', merge_stderr=False)
+        self.assertEqual(result.text, 'out\n')
+        self.assertEqual(result.stderr, b'err\n')
+
+    def test_drains_output_after_exit(self):
+        # Written in one go right before exiting, without a newline
+        chunks = list()
+        script = 'import sys; sys.stdout.write("x" * 300000)'
+        result = Command.run_command(
+            '"{0}" -c \'{1}\''.format(sys.executable, script),
+            on_chunk=lambda stream, data: chunks.append(len(data)))
+        self.assertEqual(result.size, 300000)
+        self.assertEqual(sum(chunks), 300000)
+        self.assertEqual(Command.run_command('printf abc').output, b'abc')
+
+    def test_spills_past_max_memory(self):
+        result = Command.run_command('seq 1 20000', max_memory=1024)
+        self.assertTrue(result._output_data.spilled)
+        self.assertEqual(result.head(2), ['1', '2'])
+        self.assertEqual(result.tail(1), ['20000'])
+        result.close()
+
+    def test_error_carries_result(self):
+        with self.assertRaises(CommandError) as context:
+            Command.run_command('echo failed; exit 3')
+        self.assertEqual(context.exception.result.returncode, 3)
+        self.assertEqual(context.exception.result.text, 'failed\n')
+
+
+class UnreadableBuffer(OutputBuffer):
+    """ OutputBuffer whose whole value must not be read back """
+
+    __slots__ = ()
+
+    def getvalue(self):
+        raise AssertionError('whole output read back')
+
+
+class CommandResultTest(unittest.TestCase):
+
+    def test_str_previews_large_output(self):
+        buf = UnreadableBuffer(max_memory=1024)
+        buf.write(b'first\n' + b'x' * 1024 * 1024 + b'\nlast')
+        result = CommandResult(0, buf)
+
+        preview = result.to_dict['output']
+        self.assertEqual(result.to_dict['size'], len(buf))
+        self.assertTrue(preview.startswith('first\n'))
+        self.assertTrue(preview.endswith('\nlast'))
+        self.assertLess(len(preview), 4 * CommandResult.PREVIEW_SIZE)
+        self.assertIn('bytes not shown', str(result))
+        result.close()
+
+    def test_str_keeps_small_output(self):
+        result = CommandResult(1, b'short\n')
+        self.assertEqual(result.to_dict,
+                         {'returncode': 1, 'size': 6, 'output': 'short\n'})
+        self.assertEqual(CommandResult(0, None).to_dict['output'], None)
+
+    def test_buffer_read_spans_spill(self):
+        buf = OutputBuffer(max_memory=4)
+        buf.write(b'0123456789')
+        self.assertEqual(buf.read(2, 5), b'23456')
+        self.assertEqual(buf.read(7, 10), b'789')
+        self.assertEqual(buf.read(0, 3), b'012')
+        buf.close()
@@ -0,0 +1,171 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+from containercafe.common.connectors.pool import ConnectionPool
+from containercafe.common.factories.container import BuildContainerClient
+from containercafe.common.factories.scheduler import (
+    ContainerHost, HostScheduler, InvalidHostSpec, NoHostAvailable,
+    UnknownPlacementPolicy)
+
+from ..benchmarks.simulated_host import SimulatedLxcHost, SimulatedSetupConfig
+
+
+def _hosts(*capacities):
+    return [ContainerHost(ip='10.0.0.{0}'.format(index), capacity=capacity)
+            for index, capacity in enumerate(capacities, 1)]
+
+
+def _placed_on(scheduler, count):
+    return [scheduler.place().host.ip for _ in range(count)]
+
+
+class ContainerHostParseTest(unittest.TestCase):
+
+    def test_parse(self):
+        host = ContainerHost.parse('10.0.0.1')
+        self.assertEqual((host.ip, host.port, host.capacity),
+                         ('10.0.0.1', 22, None))
+        host = ContainerHost.parse(' 10.0.0.1:2222@4 ')
+        self.assertEqual((host.ip, host.port, host.capacity),
+                         ('10.0.0.1', 2222, 4))
+        host = ContainerHost.parse('10.0.0.1@2', default_port=2200)
+        self.assertEqual((host.ip, host.port, host.capacity),
+                         ('10.0.0.1', 2200, 2))
+
+    def test_parse_invalid(self):
+        for spec in ('', ':22', '10.0.0.1:ssh', '10.0.0.1@0',
+                     '10.0.0.1@many'):
+            self.assertRaises(InvalidHostSpec, ContainerHost.parse, spec)
+
+
+class HostSchedulerTest(unittest.TestCase):
+
+    def test_least_loaded(self):
+        scheduler = HostScheduler(_hosts(None, None, None))
+        placements = [scheduler.place() for _ in range(3)]
+        self.assertEqual([placement.host.ip for placement in placements],
+                         ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+        placements[1].release()
+        self.assertEqual(_placed_on(scheduler, 1), ['10.0.0.2'])
+        self.assertEqual(scheduler.counts, {
+            '10.0.0.1:22': 1, '10.0.0.2:22': 1, '10.0.0.3:22': 1})
+
+    def test_round_robin_ignores_load(self):
+        scheduler = HostScheduler(_hosts(None, None),
+                                  policy=HostScheduler.ROUND_ROBIN)
+        scheduler.place()
+        scheduler.place().release()
+        self.assertEqual(_placed_on(scheduler, 3),
+                         ['10.0.0.1', '10.0.0.2', '10.0.0.1'])
+
+    def test_capacity_weighted(self):
+        scheduler = HostScheduler(_hosts(2, 6),
+                                  policy=HostScheduler.CAPACITY_WEIGHTED)
+        placed = _placed_on(scheduler, 8)
+        self.assertEqual(placed.count('10.0.0.1'), 2)
+        self.assertEqual(placed.count('10.0.0.2'), 6)
+
+    def test_full_hosts_skipped(self):
+        for policy in HostScheduler.POLICIES:
+            scheduler = HostScheduler(_hosts(1, 2), policy=policy)
+            self.assertEqual(sorted(_placed_on(scheduler, 3)),
+                             ['10.0.0.1', '10.0.0.2', '10.0.0.2'])
+            self.assertRaises(NoHostAvailable, scheduler.place)
+
+    def test_release_once(self):
+        scheduler = HostScheduler(_hosts(1))
+        placement = scheduler.place()
+        placement.release()
+        placement.release()
+        self.assertEqual(scheduler.hosts[0].live, 0)
+        self.assertEqual(scheduler.hosts[0].placed, 1)
+        scheduler.place()
+        self.assertRaises(NoHostAvailable, scheduler.place)
+
+    def test_unknown_policy(self):
+        self.assertRaises(UnknownPlacementPolicy, HostScheduler,
+                          _hosts(None), policy='random')
+        self.assertRaises(ValueError, HostScheduler, [])
+
+
+class SchedulerConfig(SimulatedSetupConfig):
+    container_hosts = ('host-a@1', 'host-b:2222@1')
+
+
+class FactoryPlacementTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = dict(
+            (name, SimulatedLxcHost(name=name))
+            for name in ('simulated', 'host-a', 'host-b'))
+        self.connected = list()
+        BuildContainerClient.CONNECTION_POOL = ConnectionPool(
+            connect=self.connect)
+        BuildContainerClient.SCHEDULER = None
+
+    def tearDown(self):
+        BuildContainerClient.CONNECTION_POOL = None
+        BuildContainerClient.SCHEDULER = None
+
+    def connect(self, ip, port, username, password=None):
+        self.connected.append((ip, port))
+        return self.hosts[ip].connect()
+
+    def factory(self, test_ref_point):
+        return BuildContainerClient(
+            container_type=BuildContainerClient.LXC,
+            test_ref_point=test_ref_point, test_config=None,
+            container_config=SchedulerConfig(), container_name='placed')
+
+    def test_containers_placed_and_released_on_clean(self):
+        factory = self.factory(BuildContainerClient.HOST_TO_CONTAINER)
+        first = factory.get_client()
+        second = factory.get_client()
+
+        self.assertEqual([first.placement.host.ip, second.placement.host.ip],
+                         ['host-a', 'host-b'])
+        self.assertEqual(self.connected, [('host-a', 22), ('host-b', 2222)])
+        self.assertRaises(NoHostAvailable, factory.get_client)
+
+        second.clean()
+        self.assertEqual(BuildContainerClient.SCHEDULER.counts,
+                         {'host-a:22': 1, 'host-b:2222': 0})
+        self.assertEqual(factory.get_client().placement.host.ip, 'host-b')
+
+    def test_host_clients_take_no_slot(self):
+        factory = self.factory(BuildContainerClient.HOST)
+        client = factory.get_client()
+
+        self.assertIsNone(client.placement)
+        self.assertEqual(self.connected, [('simulated', 22)])
+        self.assertIsNone(BuildContainerClient.SCHEDULER)
+
+    def test_host_client_on_host_of(self):
+        container = self.factory(
+            BuildContainerClient.HOST_TO_CONTAINER).get_client()
+        container = self.factory(
+            BuildContainerClient.HOST_TO_CONTAINER).get_client()
+        host_client = self.factory(BuildContainerClient.HOST).get_client(
+            on_host_of=container)
+
+        self.assertEqual(container.placement.host.ip, 'host-b')
+        self.assertIsNone(host_client.placement)
+        self.assertEqual(self.connected[-1], ('host-b', 2222))
+        self.assertEqual(BuildContainerClient.SCHEDULER.counts,
+                         {'host-a:22': 1, 'host-b:2222': 1})
@@ -0,0 +1,114 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import re
+import unittest
+from collections import deque
+
+from containercafe.common.connectors.session import (
+    SentinelSession, SessionClosed, SessionTimeout)
+
+
+class ScriptedChannel(object):
+    """ Channel answering each command with scripted output, delivered in
+    the chunks split_at cuts it into (e.g. in the middle of the marker) """
+
+    MARKER = re.compile(br"printf '\\n(__cc_\w+__):%d\\n'")
+
+    def __init__(self, output, returncode=0, split_at=None, newline=b'\n',
+                 close_after=False):
+        self.output = output
+        self.returncode = returncode
+        self.split_at = split_at
+        self.newline = newline
+        self.close_after = close_after
+        self.alive = True
+        self.chunks = deque()
+
+    def send(self, data):
+        marker = self.MARKER.search(data).group(1)
+        reply = self.output
+        if not self.close_after:
+            reply += self.newline.join(
+                [b'', marker + ':{0}'.format(
+                    self.returncode).encode('ascii'), b''])
+        positions = [0] + list(self.split_at(reply)) + [len(reply)]
+        for start, end in zip(positions, positions[1:]):
+            self.chunks.append(reply[start:end])
+        if self.close_after:
+            self.chunks.append(b'')
+
+    def recv(self, timeout=None):
+        return self.chunks.popleft() if self.chunks else None
+
+    def close(self):
+        self.alive = False
+
+
+def _every(size):
+    return lambda reply: range(size, len(reply), size)
+
+
+class SentinelSessionTest(unittest.TestCase):
+
+    def execute(self, channel, cmd='true', timeout=5):
+        return SentinelSession(open_channel=lambda: channel).execute(
+            cmd, timeout=timeout)
+
+    def test_byte_at_a_time(self):
+        result = self.execute(ScriptedChannel(
+            b'hello\nworld', returncode=3, split_at=_every(1)))
+        self.assertEqual((result.returncode, result.text),
+                         (3, 'hello\nworld'))
+
+    def test_marker_split_anywhere(self):
+        output = b'line one\nline two\n'
+        # Past the output: every position in the marker line as well
+        for split in range(1, len(output) + 48):
+            result = self.execute(ScriptedChannel(
+                output, split_at=lambda reply: (min(split, len(reply) - 1),)))
+            self.assertEqual((result.returncode, result.output),
+                             (0, output), 'split at {0}'.format(split))
+
+    def test_crlf_marker_split_across_chunks(self):
+        # A pty without -onlcr ends lines with \r\n: split on the \r
+        result = self.execute(ScriptedChannel(
+            b'out', returncode=1, newline=b'\r\n',
+            split_at=lambda reply: (4,)))
+        self.assertEqual((result.returncode, result.output), (1, b'out'))
+
+    def test_large_output_in_odd_chunks(self):
+        output = b''.join(b'%06d\n' % index for index in range(50000))
+        result = self.execute(ScriptedChannel(output, split_at=_every(4093)))
+        self.assertEqual(result.size, len(output))
+        self.assertEqual(result.tail(1), ['049999'])
+
+    def test_other_marker_in_output(self):
+        output = b'\n__cc_0_1__:5\nstill running'
+        result = self.execute(ScriptedChannel(output, split_at=_every(3)))
+        self.assertEqual((result.returncode, result.output), (0, output))
+
+    def test_closed_before_marker(self):
+        with self.assertRaises(SessionClosed) as context:
+            self.execute(ScriptedChannel(
+                b'partial', close_after=True, split_at=_every(2)))
+        self.assertEqual(context.exception.output, 'partial')
+
+    def test_timeout(self):
+        channel = ScriptedChannel(b'slow', split_at=lambda reply: ())
+        channel.send = lambda data: None
+        with self.assertRaises(SessionTimeout):
+            self.execute(channel, timeout=0.05)
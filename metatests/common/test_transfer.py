@@ -0,0 +1,79 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from containercafe.common.connectors.localhost import LocalHostClient
+from containercafe.common.connectors.transfer import FileTransfer
+
+
+class CountingConnection(LocalHostClient):
+    """ Local shell connection recording the commands it ran """
+
+    def __init__(self):
+        super(CountingConnection, self).__init__()
+        self.cmds = list()
+
+    def execute(self, cmd, timeout=None, **kwargs):
+        self.cmds.append(cmd)
+        return super(CountingConnection, self).execute(cmd, timeout=timeout)
+
+
+class FileTransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.connection = CountingConnection()
+        self.transfer = FileTransfer(self.connection)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as remote_file:
+            return remote_file.read()
+
+    def test_small_files_in_one_round_trip(self):
+        sent = self.transfer.put_data({self.path('a'): b'one',
+                                       self.path('sub/b'): b'two'})
+        self.assertEqual(sorted(sent), [self.path('a'), self.path('sub/b')])
+        self.assertEqual(len(self.connection.cmds), 1)
+        self.assertEqual(self.read('sub/b'), b'two')
+
+    def test_large_payload_in_bounded_commands(self):
+        data = os.urandom(300 * 1024)
+        self.transfer.put_data({self.path('payload'): data})
+        self.assertEqual(self.read('payload'), data)
+        self.assertTrue(len(self.connection.cmds) > 1)
+        longest = max(len(cmd) for cmd in self.connection.cmds)
+        self.assertTrue(longest < 2 * FileTransfer.CHUNK_SIZE)
+        self.assertTrue(all(len(line) < 1024 for cmd in self.connection.cmds
+                            for line in cmd.splitlines()))
+
+    def test_unchanged_files_not_resent(self):
+        self.transfer.put_data({self.path('a'): b'one'})
+        self.assertEqual(self.transfer.put_data({self.path('a'): b'one'}), [])
+        self.assertEqual(len(self.connection.cmds), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from containercafe.common.connectors.localhost import LocalHostClient
+from containercafe.lxc.client import LxcClient
+
+
+class LocalExecuteConnection(LocalHostClient):
+    """ Local shell connection running lxc-execute's command directly """
+
+    def __init__(self):
+        super(LocalExecuteConnection, self).__init__()
+        self.executes = 0
+
+    def execute(self, cmd, timeout=None, **kwargs):
+        if cmd.startswith(LxcClient.EXECUTE_CMD + ' '):
+            self.executes += 1
+            cmd = cmd.split(' -- ', 1)[1]
+        return super(LocalExecuteConnection, self).execute(
+            cmd, timeout=timeout)
+
+
+class ExecuteManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.connection = LocalExecuteConnection()
+        self.client = LxcClient(name='batch', connection=self.connection)
+        self.client.TMPDIR_ROOT = self.dir
+
+    def tearDown(self):
+        self.client.clean()
+        shutil.rmtree(self.dir)
+
+    def test_one_result_per_command(self):
+        results = self.client.execute_many(
+            ['echo one', 'printf two', 'echo three >&2; exit 3', 'true'])
+
+        self.assertEqual(self.connection.executes, 1)
+        self.assertEqual([result.returncode for result in results],
+                         [0, 0, 3, 0])
+        self.assertEqual([result.text for result in results],
+                         ['one\n', 'two', 'three\n', ''])
+
+    def test_lookalike_sentinel_in_output(self):
+        results = self.client.execute_many(
+            ["printf '\\ncontainercafe-0:7\\n'", 'exit 1'])
+
+        self.assertEqual([result.returncode for result in results], [0, 1])
+        self.assertEqual(results[0].text, '\ncontainercafe-0:7\n')
+
+    def test_stop_on_failure(self):
+        marker = os.path.join(self.dir, 'ran')
+        results = self.client.execute_many(
+            ['echo ok', 'exit 2', 'touch {0}'.format(marker)],
+            stop_on_failure=True)
+
+        self.assertEqual([result.returncode for result in results], [0, 2])
+        self.assertFalse(os.path.exists(marker))
+
+    def test_keep_going_on_failure(self):
+        marker = os.path.join(self.dir, 'ran')
+        results = self.client.execute_many(
+            ['exit 2', 'touch {0}'.format(marker)])
+
+        self.assertEqual([result.returncode for result in results], [2, 0])
+        self.assertTrue(os.path.exists(marker))
+
+
+class SplitBatchTest(unittest.TestCase):
+
+    def test_split_crlf_output(self):
+        # A pty turns the sentinel lines' newlines into \r\n
+        output = 'a\r\n\r\nsent:0\r\n\r\nsent:-1\r\ntrailing'
+        results = LxcClient._split_batch(output, 'sent')
+
+        self.assertEqual([(result.returncode, result.output)
+                          for result in results], [(0, 'a\r\n'), (-1, '')])
+
+    def test_split_escapes_sentinel(self):
+        output = 'x\nsen.:0\ny\nsent:4\n'
+        results = LxcClient._split_batch(output, 'sent')
+
+        self.assertEqual([(result.returncode, result.output)
+                          for result in results], [(4, 'x\nsen.:0\ny')])
@@ -0,0 +1,118 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+import unittest
+
+from containercafe.common.connectors.process import CommandResult
+from containercafe.lxc.hoststate import HostStateCache
+
+from ..benchmarks.simulated_host import SimulatedLxcHost
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class HostStateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.host = SimulatedLxcHost(latency=0.05)
+        self.host.containers.update(web01='RUNNING', db01='STOPPED')
+        self.connection = self.host.connect()
+        self.cache = HostStateCache(clock=self.clock)
+
+    def test_concurrent_callers_share_one_refresh(self):
+        snapshots = list()
+
+        def _caller():
+            snapshots.append(self.cache.states(self.connection, max_age=1))
+
+        callers = [threading.Thread(target=_caller) for _ in range(8)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual(self.cache.refreshes, 1)
+        self.assertEqual(self.host.commands, 1)
+        self.assertEqual(snapshots, [{'web01': 'RUNNING',
+                                      'db01': 'STOPPED'}] * 8)
+
+    def test_max_age(self):
+        self.cache.states(self.connection, max_age=2)
+        self.clock.now += 2
+        self.cache.states(self.connection, max_age=2)
+        self.assertEqual(self.cache.refreshes, 1)
+
+        self.clock.now += 0.5
+        self.assertTrue(self.cache.stale(max_age=2))
+        self.cache.states(self.connection, max_age=2)
+        self.assertEqual(self.cache.refreshes, 2)
+
+    def test_since(self):
+        taken = self.clock.now
+        self.cache.states(self.connection)
+
+        # A change made after the snapshot was taken forces a refresh
+        self.host.containers['web01'] = 'STOPPED'
+        self.assertEqual(self.cache.state_of(
+            self.connection, 'web01', since=taken), 'RUNNING')
+        self.clock.now += 1
+        self.assertEqual(self.cache.state_of(
+            self.connection, 'web01', since=self.clock.now), 'STOPPED')
+        self.assertEqual(self.cache.refreshes, 2)
+
+    def test_no_age_limit_keeps_snapshot(self):
+        self.cache.states(self.connection)
+        self.clock.now += 3600
+        self.cache.states(self.connection)
+        self.assertEqual(self.cache.refreshes, 1)
+
+        self.cache.invalidate()
+        self.cache.states(self.connection)
+        self.assertEqual(self.cache.refreshes, 2)
+
+    def test_store_result_from_elsewhere(self):
+        self.cache.store(self.clock.now, CommandResult(0, 'NAME STATE\n'
+                                                          'web01 running\n'))
+        self.assertFalse(self.cache.stale(since=self.clock.now))
+        self.assertEqual(self.cache.cached_state('web01'), 'RUNNING')
+        self.assertEqual(self.host.commands, 0)
+
+    def test_unavailable_after_failure(self):
+        self.cache.store(self.clock.now, CommandResult(1, 'unknown option'))
+        self.clock.now += 10
+
+        self.assertIsNone(self.cache.states(self.connection, max_age=1))
+        self.assertFalse(self.cache.available)
+        self.assertFalse(self.cache.stale(max_age=1))
+        self.assertEqual(self.host.commands, 0)
+
+    def test_parse_fancy_output(self):
+        output = ('NAME   STATE\n'
+                  '-----  -------\n'
+                  'web01  RUNNING\n'
+                  '\n'
+                  'db01   stopped\n')
+        self.assertEqual(HostStateCache._parse(output),
+                         {'web01': 'RUNNING', 'db01': 'STOPPED'})
@@ -0,0 +1,66 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from containercafe.common.connectors.localhost import LocalHostClient
+from containercafe.lxc.seccomp import SeccompPolicyCache, render_policy
+
+
+class SeccompPolicyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # A space in the path: removal must quote it
+        self.policy_dir = os.path.join(self.dir, 'seccomp policies')
+        self.connection = LocalHostClient()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_policy_written_once(self):
+        cache = SeccompPolicyCache(policy_dir=self.policy_dir, validate=False)
+        path = cache.policy(self.connection, ['write', 'read', 'read'])
+
+        self.assertEqual(cache.policy(self.connection, ['read', 'write']),
+                         path)
+        with open(path) as policy:
+            self.assertEqual(policy.read(), render_policy(['read', 'write']))
+
+    def test_evicts_by_size(self):
+        size = len(render_policy(['read']))
+        cache = SeccompPolicyCache(policy_dir=self.policy_dir,
+                                   max_bytes=2 * size, validate=False)
+        paths = [cache.policy(self.connection, [syscall])
+                 for syscall in ('read', 'open', 'stat')]
+
+        self.assertEqual(cache.total_bytes, 2 * size)
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(all(os.path.exists(path) for path in paths[1:]))
+
+    def test_evicts_by_count(self):
+        cache = SeccompPolicyCache(policy_dir=self.policy_dir,
+                                   max_entries=1, validate=False)
+        first = cache.policy(self.connection, ['read'])
+        second = cache.policy(self.connection, ['read', 'write'])
+
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+        self.assertEqual(cache.total_bytes,
+                         len(render_policy(['read', 'write'])))
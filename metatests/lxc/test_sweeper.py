@@ -0,0 +1,107 @@
+"""
+Copyright 2014 Rackspace
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import unittest
+
+from containercafe.common.connectors.pool import ConnectionPool
+from containercafe.common.factories.container import BuildContainerClient
+from containercafe.lxc.sweeper import ContainerSweeper
+
+from ..benchmarks.simulated_host import SimulatedLxcHost, SimulatedSetupConfig
+
+
+class SweepConfig(SimulatedSetupConfig):
+    container_hosts = ('simulated', 'unreachable')
+    sweep_prefixes = ('suite-',)
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = list()
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class ContainerSweeperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = SimulatedLxcHost()
+        self.host.containers.update({
+            'suite-1': 'RUNNING', 'suite-2': 'STOPPED', 'other-1': 'RUNNING'})
+
+    def test_sweeps_matching_containers_only(self):
+        report = ContainerSweeper(connect=self.host.connect).sweep('suite-')
+
+        self.assertTrue(report.ok)
+        self.assertEqual(sorted(report.destroyed), ['suite-1', 'suite-2'])
+        self.assertEqual(self.host.containers, {'other-1': 'RUNNING'})
+
+
+class FactorySweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = SimulatedLxcHost()
+        self.host.containers.update({
+            'suite-1': 'RUNNING', 'other-1': 'RUNNING'})
+        BuildContainerClient.CONNECTION_POOL = ConnectionPool(
+            connect=self.connect)
+        BuildContainerClient.SCHEDULER = None
+
+        self.handler = RecordingHandler()
+        self.log = logging.getLogger(
+            'containercafe.common.factories.container')
+        self.log.addHandler(self.handler)
+        self.propagate, self.log.propagate = self.log.propagate, False
+
+    def tearDown(self):
+        self.log.removeHandler(self.handler)
+        self.log.propagate = self.propagate
+        BuildContainerClient.CONNECTION_POOL = None
+        BuildContainerClient.SCHEDULER = None
+
+    def connect(self, ip, port, username, password=None):
+        if ip != self.host.name:
+            raise IOError('No route to host {0}'.format(ip))
+        return self.host.connect()
+
+    def test_no_sweep_on_construction(self):
+        BuildContainerClient(
+            container_type=BuildContainerClient.LXC,
+            test_ref_point=BuildContainerClient.HOST_TO_CONTAINER,
+            test_config=None, container_config=SweepConfig(),
+            container_name='suite-3')
+
+        self.assertEqual(self.host.commands, 0)
+        self.assertIn('suite-1', self.host.containers)
+
+    def test_sweep_skips_unreachable_hosts(self):
+        reports = BuildContainerClient.sweep(SweepConfig())
+
+        self.assertEqual([report.destroyed for report in reports],
+                         [['suite-1']])
+        self.assertEqual(self.host.containers, {'other-1': 'RUNNING'})
+        self.assertEqual([record.levelno for record in self.handler.records],
+                         [logging.ERROR])
+        self.assertIn('unreachable', self.handler.records[0].getMessage())
+
+    def test_sweep_given_prefixes(self):
+        BuildContainerClient.sweep(SweepConfig(), prefixes=['other-'])
+
+        self.assertEqual(self.host.containers, {'suite-1': 'RUNNING'})
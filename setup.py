@@ -94,4 +94,14 @@ setup(
         'Programming Language :: Python',
         'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',),
+    entry_points={
+        'console_scripts': [
+            'containercafe-sweep = containercafe.lxc.sweeper:main'],
+        'containercafe.container_types': [
+            'lxc = containercafe.lxc.client:LxcClient'],
+        'containercafe.connectors': [
+            'ssh = cafe.engine.ssh.client:BaseSSHClient',
+            'jump = containercafe.common.connectors.jump:JumpHost',
+            'local = containercafe.common.connectors.localhost:'
+            'LocalHostClient']},
     cmdclass={'install': install})